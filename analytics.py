@@ -0,0 +1,214 @@
+# Revenue and occupancy analytics over the whole reservation history. Rows are
+# streamed from SQLite in fixed-size batches, converted to NumPy columns and
+# folded into running aggregates, so memory stays bounded by the batch size
+# (and the number of lots/users/hours covered) rather than the table size.
+import time
+from datetime import datetime, timezone
+
+from models import both_tiers
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Rough per-row cost of a fetched batch: the sqlite3 tuple plus its column
+# objects, the float64 matrix and the derived int64 columns
+BYTES_PER_ROW = 320
+
+COLUMNS = ('lot_id', 'user_id', 'start', 'end', 'cost', 'completed')
+
+class Bins:
+    # Dense counters over an integer key range that grows as new keys show up
+    def __init__(self):
+        self.base = None
+        self.values = np.zeros(0)
+
+    def add(self, keys, weights=None):
+        if not len(keys):
+            return
+        lo, hi = int(keys.min()), int(keys.max())
+        if self.base is None:
+            self.base = lo
+        if lo < self.base:
+            self.values = np.concatenate([np.zeros(self.base - lo), self.values])
+            self.base = lo
+        size = hi - self.base + 1
+        if size > len(self.values):
+            self.values = np.concatenate([self.values, np.zeros(size - len(self.values))])
+        counts = np.bincount(keys - self.base, weights=weights)
+        self.values[:len(counts)] += counts
+
+    def items(self):
+        if self.base is None:
+            return []
+        keys = np.nonzero(self.values)[0]
+        return [(int(k) + self.base, float(self.values[k])) for k in keys]
+
+    def get(self, key):
+        if self.base is None or not 0 <= key - self.base < len(self.values):
+            return 0.0
+        return float(self.values[key - self.base])
+
+class ReservationAnalytics:
+    def __init__(self, db, memory_mb=64):
+        self.db = db
+        self.batch_rows = max(1000, memory_mb * 1024 * 1024 // BYTES_PER_ROW)
+
+    @staticmethod
+    def available():
+        return np is not None
+
+    def iter_batches(self, since=None, until=None, lot_id=None):
+        # One read transaction for the whole scan, so every batch comes from
+        # the same snapshot. Active reservations are treated as ending now.
+        conditions = []
+        params = []
+        if since:
+            conditions.append('r.parking_timestamp >= ?')
+            params.append(since)
+        if until:
+            conditions.append('r.parking_timestamp < ?')
+            params.append(until)
+        if lot_id:
+            conditions.append('ps.lot_id = ?')
+            params.append(lot_id)
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+
+        # Archived reservations are included, read in the same snapshot
+        sql, params = both_tiers(self.db, f'''
+            SELECT ps.lot_id, r.user_id,
+                   CAST(strftime('%s', r.parking_timestamp) AS INTEGER),
+                   CAST(COALESCE(strftime('%s', r.leaving_timestamp), strftime('%s', 'now')) AS INTEGER),
+                   COALESCE(r.parking_cost, 0),
+                   r.status = 'completed'
+            FROM {{reservations}} r
+            JOIN parking_spots ps ON r.spot_id = ps.id
+            {where}
+        ''', params)
+
+        conn = self.db.get_read_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN')
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(self.batch_rows)
+                if not rows:
+                    break
+                matrix = np.array(rows, dtype=np.float64)
+                del rows
+                batch = {name: matrix[:, i] for i, name in enumerate(COLUMNS)}
+                for name in ('lot_id', 'user_id', 'start', 'end'):
+                    batch[name] = batch[name].astype(np.int64)
+                batch['completed'] = batch['completed'].astype(bool)
+                yield batch
+        finally:
+            conn.close()
+
+    def summarize(self, since=None, until=None, lot_id=None, top_users=20):
+        started = time.perf_counter()
+        revenue_lot, revenue_day, revenue_hour = Bins(), Bins(), Bins()
+        dwell_lot, completed_lot = Bins(), Bins()
+        spend_user = Bins()
+        presence = Bins()
+        rows = batches = 0
+
+        for batch in self.iter_batches(since, until, lot_id):
+            rows += len(batch['lot_id'])
+            batches += 1
+            done = batch['completed']
+            lots, cost, end = batch['lot_id'][done], batch['cost'][done], batch['end'][done]
+
+            # Revenue is booked when the car leaves
+            revenue_lot.add(lots, cost)
+            revenue_day.add(end // 86400, cost)
+            revenue_hour.add(end // 3600 % 24, cost)
+            spend_user.add(batch['user_id'][done], cost)
+
+            dwell = (end - batch['start'][done]).astype(np.float64)
+            dwell_lot.add(lots, np.maximum(dwell, 0))
+            completed_lot.add(lots)
+
+            # A car counts as present in every hour it overlaps: +1 in the
+            # hour it arrives, -1 in the hour after it leaves
+            start_hours = batch['start'] // 3600
+            end_hours = np.maximum(batch['end'] // 3600, start_hours) + 1
+            presence.add(start_hours)
+            presence.add(end_hours, -np.ones(len(end_hours)))
+
+        completed = sum(count for _, count in completed_lot.items())
+        total_dwell = sum(seconds for _, seconds in dwell_lot.items())
+        return {
+            'rows': rows,
+            'batches': batches,
+            'batch_rows': self.batch_rows,
+            'revenue_total': round(sum(value for _, value in revenue_lot.items()), 2),
+            'revenue_by_lot': [{
+                'lot_id': lot, 'revenue': round(value, 2)
+            } for lot, value in revenue_lot.items()],
+            'revenue_by_day': [{
+                'day': datetime.fromtimestamp(day * 86400, timezone.utc).strftime('%Y-%m-%d'),
+                'revenue': round(value, 2)
+            } for day, value in revenue_day.items()],
+            'revenue_by_hour': [round(revenue_hour.get(hour), 2) for hour in range(24)],
+            'dwell': {
+                'completed': int(completed),
+                'average_minutes': round(total_dwell / completed / 60, 1) if completed else 0.0,
+                'by_lot': [{
+                    'lot_id': lot,
+                    'average_minutes': round(dwell_lot.get(lot) / count / 60, 1)
+                } for lot, count in completed_lot.items()]
+            },
+            'occupancy': self._occupancy(presence),
+            'top_users': self._top_users(spend_user, top_users),
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+
+    def _occupancy(self, presence):
+        if presence.base is None:
+            return {'peak': None, 'by_hour_of_day': []}
+
+        # Running sum of arrivals/departures gives cars present per hour
+        cars = np.cumsum(presence.values)
+        hours = np.arange(presence.base, presence.base + len(cars))
+        hour_of_day = hours % 24
+        counts = np.bincount(hour_of_day, minlength=24)
+        means = np.bincount(hour_of_day, weights=cars, minlength=24) / np.maximum(counts, 1)
+        maxima = np.zeros(24)
+        np.maximum.at(maxima, hour_of_day, cars)
+
+        peak = int(np.argmax(cars))
+        return {
+            'peak': {
+                'hour': datetime.fromtimestamp(int(hours[peak]) * 3600, timezone.utc).strftime('%Y-%m-%d %H:00'),
+                'cars': int(cars[peak])
+            },
+            'by_hour_of_day': [{
+                'hour': hour, 'average': round(float(means[hour]), 2), 'max': int(maxima[hour])
+            } for hour in range(24)]
+        }
+
+    def _top_users(self, spend_user, limit):
+        if spend_user.base is None or not limit:
+            return []
+        values = spend_user.values
+        top = np.argsort(values)[::-1][:limit]
+        top = top[values[top] > 0]
+        user_ids = [int(index) + spend_user.base for index in top]
+
+        conn = self.db.get_read_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT id, username FROM users WHERE id IN ({','.join('?' * len(user_ids))})
+            ''', user_ids)
+            names = dict(cursor.fetchall())
+        finally:
+            conn.close()
+
+        return [{
+            'user_id': user_id,
+            'username': names.get(user_id),
+            'spend': round(float(values[user_id - spend_user.base]), 2)
+        } for user_id in user_ids]
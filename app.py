@@ -1,17 +1,160 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-from models import Database, User, ParkingLot, ParkingSpot, Reservation
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response
+from models import Database, User, ParkingLot, ParkingSpot, Reservation, SlotBooking, optional_float
 from config import Config
+from cache import LocalCache, SQLiteCache, LOT_STATS_KEY, analytics_key
+from events import EventBus, format_sse
+from security import PasswordHasher, LoginThrottle
+from metrics import Metrics, install_metrics
+from analytics import ReservationAnalytics
+from geo import LotIndex
+from slots import SlotIndex
+from occupancy import OccupancyIndex
+from export import FORMATS, export_chunks, export_filename
+from fragments import FragmentCache
+from jobs import JobScheduler
+from pricing import OccupancyForecaster, PricingRules, DynamicPricing
+from sessions import ServerSessionInterface, UserState, create_store
+from jinja2 import FileSystemBytecodeCache
+from datetime import datetime, timezone
+import base64
+import click
+import csv
+import hmac
+import json
 import os
+import queue
+import time
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# Compiled templates are kept on disk so a fresh worker skips Jinja's
+# parse/compile step; `flask compile-templates` fills the cache ahead of time
+if app.config['JINJA_BYTECODE_CACHE']:
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR'] or None)
+
 # Initialize database and models
-db = Database()
-user_model = User(db)
-parking_lot_model = ParkingLot(db)
-parking_spot_model = ParkingSpot(db)
+db = Database(app.config['DATABASE_PATH'],
+              backend=app.config['DATABASE_BACKEND'],
+              replicas=app.config['DATABASE_REPLICAS'],
+              pool_size=app.config['DB_POOL_SIZE'],
+              cache_size_kb=app.config['DB_CACHE_SIZE_KB'],
+              mmap_size=app.config['DB_MMAP_SIZE'],
+              archive_path=app.config['ARCHIVE_DATABASE_PATH'] or None)
+scheduler = JobScheduler(db, workers=app.config['JOBS_WORKERS'],
+                         poll_interval=app.config['JOBS_POLL_SECONDS'],
+                         lease=app.config['JOBS_LEASE_SECONDS'],
+                         max_attempts=app.config['JOBS_MAX_ATTEMPTS'])
+# Sessions and per-user state shared by every worker using the same store
+state_store = create_store(app.config['STATE_STORE'], path=app.config['STATE_STORE_PATH'],
+                           url=app.config['STATE_STORE_URL'], max_entries=app.config['STATE_STORE_SIZE'])
+if app.config['SESSION_BACKEND'] == 'server':
+    app.session_interface = ServerSessionInterface(state_store)
+lot_cache = create_store(app.config['LOT_CACHE_BACKEND'], path=app.config['LOT_CACHE_PATH'],
+                         url=app.config['LOT_CACHE_URL'] or app.config['STATE_STORE_URL'],
+                         max_entries=app.config['LOT_CACHE_SIZE'], default_ttl=app.config['LOT_CACHE_TTL'],
+                         prefix='parkeasy:lots:')
+fragment_cache = FragmentCache(LocalCache(max_entries=app.config['FRAGMENT_CACHE_SIZE'],
+                                          default_ttl=app.config['FRAGMENT_CACHE_TTL']))
+app.jinja_env.globals['fragment'] = fragment_cache.render
+event_bus = EventBus()
+lot_index = LotIndex(cell_km=app.config['LOT_INDEX_CELL_KM'])
+slot_index = SlotIndex()
+occupancy_index = OccupancyIndex()
+forecaster = OccupancyForecaster(db, history_weeks=app.config['FORECAST_HISTORY_WEEKS'],
+                                 decay_hours=app.config['FORECAST_DECAY_HOURS'],
+                                 refresh=app.config['FORECAST_REFRESH_SECONDS'])
+pricing_rules = PricingRules.parse(app.config['PRICING_RULES'])
+pricing = DynamicPricing(forecaster, pricing_rules, horizon_hours=app.config['PRICING_HORIZON_HOURS']) if pricing_rules else None
+password_hasher = PasswordHasher(method=app.config['PASSWORD_HASH_METHOD'],
+                                 salt_length=app.config['PASSWORD_SALT_LENGTH'],
+                                 workers=app.config['PASSWORD_HASH_WORKERS'])
+login_throttle = LoginThrottle(max_user_failures=app.config['LOGIN_MAX_USER_FAILURES'],
+                               max_ip_failures=app.config['LOGIN_MAX_IP_FAILURES'],
+                               window=app.config['LOGIN_THROTTLE_WINDOW'])
+user_model = User(db, hasher=password_hasher)
 reservation_model = Reservation(db)
+user_state = None
+if app.config['USER_STATE_TTL'] > 0:
+    user_state = UserState(state_store, reservation_model.get_user_state, ttl=app.config['USER_STATE_TTL'])
+parking_lot_model = ParkingLot(db, cache=lot_cache, events=event_bus, index=lot_index)
+parking_spot_model = ParkingSpot(db, cache=lot_cache, events=event_bus, slots=slot_index,
+                                 walkin_buffer=app.config['SLOT_WALKIN_BUFFER_MINUTES'] * 60,
+                                 occupancy=occupancy_index,
+                                 jobs=scheduler if app.config['RECEIPT_DIR'] else None,
+                                 pricing=pricing, user_state=user_state)
+slot_model = SlotBooking(db, index=slot_index, cache=lot_cache, events=event_bus,
+                         walkin_buffer=app.config['SLOT_WALKIN_BUFFER_MINUTES'] * 60, user_state=user_state)
+slot_index.load(slot_model.load_upcoming())
+analytics = ReservationAnalytics(db, memory_mb=app.config['ANALYTICS_MEMORY_MB'])
+
+# Nearby-lot index: built once from the table, then kept current by ParkingLot
+# writes and the occupancy events published on bookings and releases
+lot_index.load(parking_lot_model.get_all_lots())
+event_bus.add_listener(lot_index.on_event)
+event_bus.add_listener(occupancy_index.on_event)
+
+# Opt-in instrumentation; when disabled nothing is wrapped and /metrics is absent
+metrics = None
+if app.config['METRICS_ENABLED']:
+    metrics = Metrics()
+    install_metrics(app, db, [user_model, parking_lot_model, parking_spot_model, reservation_model, slot_model], metrics,
+                    profile_dir=app.config['METRICS_PROFILE_DIR'],
+                    profile_sample_rate=app.config['METRICS_PROFILE_SAMPLE_RATE'],
+                    slow_request_ms=app.config['METRICS_SLOW_REQUEST_MS'])
+
+# Background jobs: maintenance, precomputed dashboard counts and receipts run
+# on the scheduler's worker threads (or `flask run-jobs`) instead of in requests
+def dashboard_counts():
+    return {
+        'total_users': user_model.count_users(role='user'),
+        'active_reservations': reservation_model.count_reservations(status='active')
+    }
+
+def archive_reservations(older_than_days=None, batch_size=None, max_batches=None):
+    return reservation_model.archive_completed(
+        older_than_days=older_than_days if older_than_days is not None else app.config['ARCHIVE_AFTER_DAYS'],
+        batch_size=batch_size or app.config['ARCHIVE_BATCH_ROWS'],
+        pause=app.config['ARCHIVE_BATCH_PAUSE_MS'] / 1000,
+        max_batches=max_batches)
+
+def roll_up_occupancy():
+    hours = forecaster.update_rollups()
+    forecaster.invalidate()
+    return hours
+
+def write_receipt(reservation_id):
+    receipt = reservation_model.get_receipt(reservation_id)
+    if receipt is None:
+        return None
+    # Written whole and renamed into place, so a rerun just replaces it
+    path = os.path.join(app.config['RECEIPT_DIR'], f'receipt-{reservation_id}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(receipt, f, indent=2)
+    os.replace(path + '.tmp', path)
+    return path
+
+scheduler.every('dashboard-stats', app.config['DASHBOARD_STATS_SECONDS'], dashboard_counts, delay=0)
+scheduler.every('archive-reservations', app.config['ARCHIVE_INTERVAL_HOURS'] * 3600, archive_reservations)
+scheduler.every('analyze', app.config['ANALYZE_INTERVAL_HOURS'] * 3600, db.analyze)
+scheduler.every('vacuum', app.config['VACUUM_INTERVAL_HOURS'] * 3600, db.vacuum)
+scheduler.every('occupancy-rollup', app.config['FORECAST_ROLLUP_SECONDS'], roll_up_occupancy, delay=0)
+scheduler.every('prune-jobs', 3600, lambda: scheduler.prune(app.config['JOBS_KEEP_HOURS'] * 3600))
+if db.replica_pools:
+    scheduler.every('sync-replicas', app.config['REPLICA_SYNC_SECONDS'], db.sync_replicas, delay=0)
+if isinstance(state_store, SQLiteCache):
+    scheduler.every('purge-state', 3600, state_store.purge)
+if isinstance(lot_cache, SQLiteCache):
+    scheduler.every('purge-lot-cache', 3600, lot_cache.purge)
+if app.config['RECEIPT_DIR']:
+    os.makedirs(app.config['RECEIPT_DIR'], exist_ok=True)
+    scheduler.task('receipt', write_receipt)
+
+# Workers start with the first request a server handles, so importing the app
+# (CLI commands, scripts) never runs jobs alongside them
+@app.before_request
+def start_jobs():
+    scheduler.start()
 
 @app.route('/')
 def index():
@@ -28,9 +171,16 @@ def login():
         username = request.form['username']
         password = request.form['password']
         
+        # Refuse throttled attempts before spending CPU on password hashing
+        retry_after = login_throttle.check(username, request.remote_addr)
+        if retry_after:
+            flash(f'Too many login attempts. Please try again in {retry_after} seconds.', 'danger')
+            return render_template('login.html'), 429, {'Retry-After': str(retry_after)}
+        
         user = user_model.get_user_by_username(username)
         
         if user and user_model.verify_password(user, password):
+            login_throttle.success(username)
             session['user_id'] = user['id']
             session['username'] = user['username']
             session['role'] = user['role']
@@ -41,6 +191,7 @@ def login():
             else:
                 return redirect(url_for('user_dashboard'))
         else:
+            login_throttle.failure(username, request.remote_addr)
             flash('Invalid username or password!', 'danger')
     
     return render_template('login.html')
@@ -75,23 +226,21 @@ def admin_dashboard():
         return redirect(url_for('index'))
     
     lots = parking_lot_model.get_all_lots()
-    users = user_model.get_all_users()
-    reservations = reservation_model.get_all_reservations()
+    users, _ = user_model.get_users_page(limit=5, role='user')
+    reservations, _ = reservation_model.get_reservations_page(limit=10)
     
     # Statistics
     total_lots = len(lots)
     total_spots = sum(lot['total_spots'] or 0 for lot in lots)
     occupied_spots = sum(lot['occupied_spots'] or 0 for lot in lots)
-    total_users = len([u for u in users if u['role'] == 'user'])
     
     stats = {
         'total_lots': total_lots,
         'total_spots': total_spots,
         'occupied_spots': occupied_spots,
-        'available_spots': total_spots - occupied_spots,
-        'total_users': total_users,
-        'active_reservations': len([r for r in reservations if r['status'] == 'active'])
+        'available_spots': total_spots - occupied_spots
     }
+    stats.update(dashboard_counts_payload())
     
     return render_template('admin/dashboard.html', 
                          lots=lots, 
@@ -111,8 +260,10 @@ def admin_create_lot():
         pin_code = request.form['pin_code']
         price_per_hour = float(request.form['price_per_hour'])
         max_spots = int(request.form['max_spots'])
+        latitude = optional_float(request.form.get('latitude'))
+        longitude = optional_float(request.form.get('longitude'))
         
-        lot_id = parking_lot_model.create_lot(name, address, pin_code, price_per_hour, max_spots)
+        lot_id = parking_lot_model.create_lot(name, address, pin_code, price_per_hour, max_spots, latitude, longitude)
         
         if lot_id:
             flash('Parking lot created successfully!', 'success')
@@ -139,8 +290,10 @@ def admin_edit_lot(lot_id):
         pin_code = request.form['pin_code']
         price_per_hour = float(request.form['price_per_hour'])
         max_spots = int(request.form['max_spots'])
+        latitude = optional_float(request.form.get('latitude'))
+        longitude = optional_float(request.form.get('longitude'))
         
-        if parking_lot_model.update_lot(lot_id, name, address, pin_code, price_per_hour, max_spots):
+        if parking_lot_model.update_lot(lot_id, name, address, pin_code, price_per_hour, max_spots, latitude, longitude):
             flash('Parking lot updated successfully!', 'success')
             return redirect(url_for('admin_dashboard'))
         else:
@@ -168,9 +321,14 @@ def admin_view_spots(lot_id):
         return redirect(url_for('index'))
     
     lot = parking_lot_model.get_lot_by_id(lot_id)
-    spots = parking_spot_model.get_spots_by_lot(lot_id)
+    if lot is None:
+        flash('Parking lot not found!', 'danger')
+        return redirect(url_for('admin_dashboard'))
     
-    return render_template('admin/view_spots.html', lot=lot, spots=spots)
+    # Spot rows are only loaded when this lot version isn't rendered yet
+    spots_html = fragment_cache.render('admin/_spots.html', lot,
+                                       load=lambda: {'spots': parking_spot_model.get_spots_by_lot(lot_id)})
+    return render_template('admin/view_spots.html', lot=lot, spots_html=spots_html)
 
 @app.route('/user/dashboard')
 def user_dashboard():
@@ -179,40 +337,116 @@ def user_dashboard():
         return redirect(url_for('index'))
     
     user_id = session.get('user_id')
+    state = user_state_for(user_id)
+    if state is None or state['role'] != 'user':
+        # The account is gone or no longer a user account
+        session.clear()
+        flash('Access denied!', 'danger')
+        return redirect(url_for('index'))
+    
     lots = parking_lot_model.get_all_lots()
-    reservations = reservation_model.get_user_reservations(user_id)
-    active_reservation = reservation_model.get_active_reservation(user_id)
+    active_reservation = state['active_reservation']
+    totals = reservation_model.get_user_totals(user_id)
+    reservations = reservation_model.iter_user_reservations(user_id)
     
     return render_template('user/dashboard.html', 
                          lots=lots, 
                          reservations=reservations,
+                         totals=totals,
                          active_reservation=active_reservation)
 
+# Booking, release and stats logic shared by the Flask views and the async
+# handlers in asgi.py. Each returns plain data and never touches the request.
+def user_state_for(user_id):
+    # Role and active reservation, from the shared user state when enabled
+    if user_state is None:
+        return reservation_model.get_user_state(user_id)
+    return user_state.get(user_id)
+
+def book_for_user(user_id, lot_id):
+    # Check if user already has an active reservation. A cached "not
+    # parked" skips the query, since the booking transaction checks again;
+    # a cached reservation may be stale and is confirmed first.
+    state = user_state.peek(user_id) if user_state is not None else None
+    if state is None or state['active_reservation'] is not None:
+        if reservation_model.get_active_reservation(user_id):
+            return 'You already have an active parking reservation!', 'warning'
+    
+    # Claim the first free spot and create the reservation atomically
+    spot = parking_spot_model.allocate_spot(lot_id, user_id)
+    
+    if spot and spot['hourly_rate'] is not None:
+        return f"Parking spot booked at ${spot['hourly_rate']:.2f}/hour!", 'success'
+    elif spot:
+        return 'Parking spot booked successfully!', 'success'
+    elif spot is None:
+        # Skipped pre-check: refused because the user parked after all?
+        if state is not None and reservation_model.get_active_reservation(user_id):
+            return 'You already have an active parking reservation!', 'warning'
+        return 'No available spots in this parking lot!', 'warning'
+    return 'Error booking parking spot!', 'danger'
+
+def release_for_user(user_id, spot_id):
+    cost = parking_spot_model.release_spot(spot_id, user_id)
+    
+    if cost:
+        return f'Parking spot released! Total cost: ${cost:.2f}', 'success'
+    return 'Error releasing parking spot!', 'danger'
+
+def admin_stats_payload():
+    payload = lot_cache.get(LOT_STATS_KEY)
+    if payload is None:
+        lots = parking_lot_model.get_all_lots()
+        
+        # Prepare data for charts
+        payload = {
+            'lot_ids': [lot['id'] for lot in lots],
+            'lot_names': [lot['prime_location_name'] for lot in lots],
+            'lot_occupancy': [lot['occupied_spots'] or 0 for lot in lots],
+            'lot_capacity': [lot['total_spots'] or 0 for lot in lots]
+        }
+        lot_cache.set(LOT_STATS_KEY, payload)
+    return payload
+
+def dashboard_counts_payload():
+    # User and active reservation counts from the dashboard-stats job, or
+    # counted here when it hasn't run lately
+    interval = app.config['DASHBOARD_STATS_SECONDS']
+    counts = scheduler.last_result('dashboard-stats', max_age=3 * interval) if interval > 0 else None
+    return counts or dashboard_counts()
+
+def user_stats_payload(user_id):
+    return reservation_model.get_user_totals(user_id)
+
+ANALYTICS_SECTIONS = ('revenue_by_lot', 'revenue_by_day', 'revenue_by_hour', 'dwell', 'occupancy', 'top_users')
+
+def analytics_payload(since=None, until=None, lot_id=None):
+    key = analytics_key(since, until, lot_id)
+    payload = lot_cache.get(key)
+    if payload is None:
+        payload = analytics.summarize(since=since, until=until, lot_id=lot_id)
+        
+        names = {lot['id']: lot['prime_location_name'] for lot in parking_lot_model.get_all_lots()}
+        for row in payload['revenue_by_lot'] + payload['dwell']['by_lot']:
+            row['name'] = names.get(row['lot_id'])
+        lot_cache.set(key, payload, ttl=app.config['ANALYTICS_CACHE_TTL'])
+    return payload
+
+def occupancy_snapshot():
+    return [{
+        'lot_id': lot['id'],
+        'total_spots': lot['total_spots'],
+        'available_spots': lot['available_spots'],
+        'occupied_spots': lot['occupied_spots']
+    } for lot in parking_lot_model.get_all_lots()]
+
 @app.route('/user/book/<int:lot_id>')
 def user_book_spot(lot_id):
     if session.get('role') != 'user':
         flash('Access denied!', 'danger')
         return redirect(url_for('index'))
     
-    user_id = session.get('user_id')
-    
-    # Check if user already has an active reservation
-    active_reservation = reservation_model.get_active_reservation(user_id)
-    if active_reservation:
-        flash('You already have an active parking reservation!', 'warning')
-        return redirect(url_for('user_dashboard'))
-    
-    # Find available spot
-    available_spot = parking_spot_model.get_available_spot(lot_id)
-    
-    if available_spot:
-        if parking_spot_model.book_spot(available_spot['id'], user_id):
-            flash('Parking spot booked successfully!', 'success')
-        else:
-            flash('Error booking parking spot!', 'danger')
-    else:
-        flash('No available spots in this parking lot!', 'warning')
-    
+    flash(*book_for_user(session.get('user_id'), lot_id))
     return redirect(url_for('user_dashboard'))
 
 @app.route('/user/release/<int:spot_id>')
@@ -221,53 +455,479 @@ def user_release_spot(spot_id):
         flash('Access denied!', 'danger')
         return redirect(url_for('index'))
     
-    user_id = session.get('user_id')
-    cost = parking_spot_model.release_spot(spot_id, user_id)
-    
-    if cost:
-        flash(f'Parking spot released! Total cost: ${cost:.2f}', 'success')
-    else:
-        flash('Error releasing parking spot!', 'danger')
-    
+    flash(*release_for_user(session.get('user_id'), spot_id))
     return redirect(url_for('user_dashboard'))
 
+# Keyset pagination cursors are passed to the client as "<timestamp>,<id>"
+def encode_cursor(after):
+    if not after:
+        return None
+    return f'{after[0]},{after[1]}'
+
+def decode_cursor(value):
+    if not value:
+        return None
+    timestamp, _, row_id = value.rpartition(',')
+    try:
+        return (timestamp, int(row_id))
+    except ValueError:
+        return None
+
+def page_limit(default=50, maximum=500):
+    try:
+        limit = int(request.args.get('limit', default))
+    except ValueError:
+        limit = default
+    return max(1, min(limit, maximum))
+
 # API endpoints for charts data
 @app.route('/api/admin/stats')
 def api_admin_stats():
     if session.get('role') != 'admin':
         return jsonify({'error': 'Access denied'}), 403
     
-    lots = parking_lot_model.get_all_lots()
+    return jsonify(admin_stats_payload())
+
+@app.route('/api/admin/reservations')
+def api_admin_reservations():
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
     
-    # Prepare data for charts
-    lot_names = [lot['prime_location_name'] for lot in lots]
-    lot_occupancy = [lot['occupied_spots'] or 0 for lot in lots]
-    lot_capacity = [lot['total_spots'] or 0 for lot in lots]
+    reservations, after = reservation_model.get_reservations_page(
+        limit=page_limit(),
+        after=decode_cursor(request.args.get('cursor')),
+        status=request.args.get('status'))
     
     return jsonify({
-        'lot_names': lot_names,
-        'lot_occupancy': lot_occupancy,
-        'lot_capacity': lot_capacity
+        'items': [dict(r) for r in reservations],
+        'next_cursor': encode_cursor(after)
     })
 
-@app.route('/api/user/stats')
-def api_user_stats():
+@app.route('/api/admin/reservations/export')
+def api_admin_reservations_export():
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({'error': 'Unknown export format'}), 400
+    
+    # since/until bound the reservation start time, e.g. 2024-01-01
+    since = request.args.get('since')
+    until = request.args.get('until')
+    lot_id = request.args.get('lot_id', type=int)
+    compress = request.args.get('gzip') == '1'
+    
+    batches = reservation_model.iter_reservations(since=since, until=until, lot_id=lot_id,
+                                                  batch_size=app.config['EXPORT_BATCH_ROWS'])
+    filename = export_filename(fmt, compress, since, until, lot_id)
+    return Response(export_chunks(batches, fmt, compress, app.config['EXPORT_GZIP_LEVEL']),
+                    mimetype='application/gzip' if compress else FORMATS[fmt][0],
+                    headers={
+                        'Content-Disposition': f'attachment; filename="{filename}"',
+                        'Cache-Control': 'no-store',
+                        'X-Accel-Buffering': 'no'
+                    })
+
+@app.route('/api/admin/users')
+def api_admin_users():
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    users, after = user_model.get_users_page(
+        limit=page_limit(),
+        after=decode_cursor(request.args.get('cursor')),
+        role=request.args.get('role'))
+    
+    return jsonify({
+        'items': [dict(u) for u in users],
+        'next_cursor': encode_cursor(after)
+    })
+
+@app.route('/api/admin/analytics')
+@app.route('/api/admin/analytics/<section>')
+def api_admin_analytics(section=None):
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    if not analytics.available():
+        return jsonify({'error': 'Analytics requires numpy'}), 503
+    if section is not None and section not in ANALYTICS_SECTIONS:
+        return jsonify({'error': 'Unknown analytics section'}), 404
+    
+    # since/until are reservation start times, e.g. 2024-01-01 or 2024-01-01 08:00:00
+    payload = analytics_payload(since=request.args.get('since'),
+                                until=request.args.get('until'),
+                                lot_id=request.args.get('lot_id', type=int))
+    if section:
+        return jsonify({section: payload[section]})
+    return jsonify(payload)
+
+@app.route('/api/lots/nearby')
+def api_lots_nearby():
+    if not session.get('user_id'):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    pin = request.args.get('pin')
+    k = max(1, min(request.args.get('k', 5, type=int), 50))
+    min_available = request.args.get('min_available', 1, type=int)
+    
+    if lat is not None and lon is not None:
+        lots = lot_index.nearest(lat, lon, k=k,
+                                 radius_km=request.args.get('radius_km', type=float),
+                                 min_available=min_available,
+                                 pin_prefix=pin)
+    elif pin:
+        lots = lot_index.by_pin_prefix(pin, k=k, min_available=min_available)
+    else:
+        return jsonify({'error': 'lat and lon, or pin, are required'}), 400
+    
+    return jsonify({'items': lots})
+
+# Advance (time-slot) bookings. Times are ISO 8601; naive values are UTC.
+def parse_slot_time(value):
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+def to_iso(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+def slot_window(args):
+    # Returns (start, end, error)
+    start = parse_slot_time(args.get('start'))
+    end = parse_slot_time(args.get('end'))
+    if start is None or end is None:
+        return None, None, 'start and end must be ISO 8601 times'
+    now = datetime.now(timezone.utc).timestamp()
+    if end <= start:
+        return None, None, 'end must be after start'
+    if end <= now:
+        return None, None, 'window is in the past'
+    if end - start > app.config['SLOT_MAX_HOURS'] * 3600:
+        return None, None, f"windows are limited to {app.config['SLOT_MAX_HOURS']:g} hours"
+    if start > now + app.config['SLOT_MAX_DAYS_AHEAD'] * 86400:
+        return None, None, f"bookings open {app.config['SLOT_MAX_DAYS_AHEAD']} days ahead"
+    return start, end, None
+
+@app.route('/api/lots/<int:lot_id>/availability')
+def api_lot_availability(lot_id):
+    if not session.get('user_id'):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    start, end, error = slot_window(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    return jsonify({
+        'lot_id': lot_id,
+        'start': to_iso(start),
+        'end': to_iso(end),
+        'available_spots': slot_model.count_available(lot_id, start, end)
+    })
+
+@app.route('/api/lots/<int:lot_id>/bitmap')
+def api_lot_bitmap(lot_id):
+    # Spot states packed one bit per spot number (spot 1 is the high bit of
+    # the first byte, 1 = taken or no such spot), so clients can draw a large
+    # lot from a few hundred bytes. The ETag is the lot's occupancy version.
+    if not session.get('user_id'):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    if parking_lot_model.get_lot_by_id(lot_id) is None:
+        return jsonify({'error': 'Parking lot not found'}), 404
+    
+    bitmap = parking_spot_model.get_bitmap(lot_id)
+    if bitmap is None:
+        return jsonify({'error': 'Spot numbers in this lot are not unique'}), 409
+    
+    response = jsonify({
+        'lot_id': lot_id,
+        'version': bitmap.version,
+        'spots': len(bitmap),
+        'available_spots': bitmap.available(),
+        'bitmap': base64.b64encode(bitmap.packed()).decode('ascii')
+    })
+    response.set_etag(str(bitmap.version))
+    return response.make_conditional(request)
+
+@app.route('/api/lots/<int:lot_id>/forecast')
+def api_lot_forecast(lot_id):
+    # Expected occupancy for each of the next `hours` hours and the hourly
+    # rate a walk-in would be quoted now
+    if not session.get('user_id'):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    lot = parking_lot_model.get_lot_by_id(lot_id)
+    if lot is None:
+        return jsonify({'error': 'Parking lot not found'}), 404
+    
+    hours = min(max(request.args.get('hours', 6, type=int), 1), 24)
+    now = time.time()
+    current = lot['occupied_spots'] / lot['total_spots'] if lot['total_spots'] else 0.0
+    quote = pricing.quote(lot_id, lot, now) if pricing is not None else {'hourly_rate': lot['price_per_hour']}
+    return jsonify(dict(quote, lot_id=lot_id, price_per_hour=lot['price_per_hour'], occupancy=round(current, 4),
+                        forecast=[{
+                            'at': to_iso(now + hour * 3600),
+                            'occupancy': round(forecaster.forecast(lot_id, current, hour, now), 4)
+                        } for hour in range(hours)]))
+
+@app.route('/api/slots', methods=['GET', 'POST'])
+def api_slots():
     if session.get('role') != 'user':
         return jsonify({'error': 'Access denied'}), 403
     
     user_id = session.get('user_id')
-    reservations = reservation_model.get_user_reservations(user_id)
+    if request.method == 'GET':
+        return jsonify({'items': [dict(b) for b in slot_model.get_user_bookings(user_id)]})
     
-    # Calculate statistics
-    total_reservations = len(reservations)
-    total_cost = sum(r['parking_cost'] or 0 for r in reservations)
-    active_count = len([r for r in reservations if r['status'] == 'active'])
+    data = request.get_json(silent=True) or request.form
+    start, end, error = slot_window(data)
+    if error:
+        return jsonify({'error': error}), 400
+    try:
+        lot_id = int(data.get('lot_id'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'lot_id is required'}), 400
     
-    return jsonify({
-        'total_reservations': total_reservations,
-        'total_cost': total_cost,
-        'active_reservations': active_count
+    if slot_model.user_has_overlap(user_id, start, end):
+        return jsonify({'error': 'You already have a booking in this window'}), 409
+    
+    booking = slot_model.book_slot(lot_id, user_id, start, end)
+    if booking:
+        return jsonify(dict(booking)), 201
+    elif booking is None:
+        return jsonify({'error': 'No spot is free for the whole window'}), 409
+    return jsonify({'error': 'Error booking time slot'}), 503
+
+@app.route('/api/slots/<int:booking_id>/cancel', methods=['POST'])
+def api_slot_cancel(booking_id):
+    if session.get('role') != 'user':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    if slot_model.cancel_slot(booking_id, session.get('user_id')):
+        return jsonify({'cancelled': booking_id})
+    return jsonify({'error': 'Booking not found'}), 404
+
+@app.route('/api/slots/<int:booking_id>/check-in', methods=['POST'])
+def api_slot_check_in(booking_id):
+    if session.get('role') != 'user':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    booking = slot_model.check_in(booking_id, session.get('user_id'),
+                                  early=app.config['SLOT_CHECKIN_EARLY_MINUTES'] * 60)
+    if booking:
+        return jsonify({'checked_in': booking_id, 'spot_id': booking['spot_id']})
+    elif booking is None:
+        return jsonify({'error': 'Booking cannot be checked in now'}), 409
+    return jsonify({'error': 'Error checking in'}), 503
+
+# Entry/exit gate hardware posts buffered events in bulk. Callers are either
+# an admin session or a gate presenting GATE_API_TOKEN as a bearer token.
+def gate_authorized():
+    if session.get('role') == 'admin':
+        return True
+    token = app.config['GATE_API_TOKEN']
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+
+def parse_gate_operation(raw):
+    # Returns (operation, None) or (None, reason)
+    if not isinstance(raw, dict) or raw.get('op') not in ('book', 'release'):
+        return None, 'invalid_op'
+    target = 'lot_id' if raw['op'] == 'book' else 'spot_id'
+    if not all(isinstance(raw.get(field), int) and not isinstance(raw.get(field), bool)
+               for field in ('user_id', target)):
+        return None, 'invalid_fields'
+    key = raw.get('key')
+    if key is not None and (not isinstance(key, str) or not 0 < len(key) <= 128):
+        return None, 'invalid_key'
+    return {'op': raw['op'], 'user_id': raw['user_id'], target: raw[target], 'key': key}, None
+
+@app.route('/api/gate/batch', methods=['POST'])
+def api_gate_batch():
+    if not gate_authorized():
+        return jsonify({'error': 'Access denied'}), 403
+    
+    body = request.get_json(silent=True)
+    raw_operations = body.get('operations') if isinstance(body, dict) else None
+    if not isinstance(raw_operations, list):
+        return jsonify({'error': 'Expected {"operations": [...]}'}), 400
+    if len(raw_operations) > app.config['GATE_BATCH_MAX_OPS']:
+        return jsonify({'error': f"At most {app.config['GATE_BATCH_MAX_OPS']} operations per batch"}), 413
+    
+    results = [None] * len(raw_operations)
+    valid = []
+    for i, raw in enumerate(raw_operations):
+        operation, reason = parse_gate_operation(raw)
+        if operation is None:
+            results[i] = {'key': raw.get('key') if isinstance(raw, dict) else None,
+                          'status': 'rejected', 'reason': reason}
+        else:
+            valid.append((i, operation))
+    
+    applied = parking_spot_model.apply_batch([operation for _, operation in valid],
+                                             key_ttl=app.config['GATE_IDEMPOTENCY_TTL_HOURS'] * 3600)
+    for (i, _), result in zip(valid, applied):
+        results[i] = result
+    
+    summary = {'ok': 0, 'rejected': 0, 'error': 0, 'replayed': 0}
+    for result in results:
+        summary[result['status']] += 1
+        summary['replayed'] += bool(result.get('replayed'))
+    return jsonify({'results': results, 'summary': summary})
+
+@app.route('/api/admin/db')
+def api_admin_db():
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    return jsonify(db.pool_stats())
+
+@app.route('/api/admin/cache')
+def api_admin_cache():
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    return jsonify(dict(lot_cache.stats(), fragments=fragment_cache.stats(), occupancy=occupancy_index.stats(),
+                        state=state_store.stats()))
+
+@app.route('/api/admin/jobs')
+def api_admin_jobs():
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    return jsonify(scheduler.stats())
+
+@app.route('/api/stream/occupancy')
+def api_stream_occupancy():
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    heartbeat = app.config['SSE_HEARTBEAT_SECONDS']
+    
+    def stream():
+        # Subscribe before the snapshot so no update can fall between them
+        events = event_bus.subscribe()
+        try:
+            yield format_sse('snapshot', occupancy_snapshot())
+            while True:
+                try:
+                    event, data = events.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                
+                if event == 'resync':
+                    yield format_sse('snapshot', occupancy_snapshot())
+                else:
+                    yield format_sse(event, data)
+        finally:
+            event_bus.unsubscribe(events)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
     })
 
+@app.route('/api/user/stats')
+def api_user_stats():
+    if session.get('role') != 'user':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    return jsonify(user_stats_payload(session.get('user_id')))
+
+@app.cli.command('check-counters')
+@click.option('--repair', is_flag=True, help='Rewrite drifted counters from parking_spots.')
+def check_counters_command(repair):
+    drift = parking_lot_model.check_counters(repair=repair)
+    for lot in drift:
+        click.echo(f"lot {lot['id']}: total {lot['total_spots']}->{lot['actual_total']}, "
+                   f"available {lot['available_spots']}->{lot['actual_available']}, "
+                   f"occupied {lot['occupied_spots']}->{lot['actual_occupied']}")
+    click.echo(f"{len(drift)} lot(s) {'repaired' if repair else 'drifted'}")
+
+@app.cli.command('import-lots')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def import_lots_command(path):
+    # CSV with a header row, or a JSON list of objects, using the columns
+    # name, address, pin_code, price_per_hour, max_spots and optionally
+    # latitude, longitude
+    with open(path, newline='') as f:
+        if path.lower().endswith('.json'):
+            lots = json.load(f)
+        else:
+            lots = list(csv.DictReader(f))
+    
+    lot_ids = parking_lot_model.bulk_create_lots(lots)
+    if lot_ids is None:
+        raise click.ClickException('Import failed, no lots were created')
+    
+    total_spots = sum(int(lot['max_spots']) for lot in lots)
+    click.echo(f'Imported {len(lot_ids)} lot(s) with {total_spots} spot(s)')
+
+@app.cli.command('compile-templates')
+def compile_templates_command():
+    # Load every template once so its bytecode lands in the cache directory
+    if app.jinja_env.bytecode_cache is None:
+        raise click.ClickException('JINJA_BYTECODE_CACHE is disabled')
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    click.echo(f'Compiled {len(names)} template(s)')
+
+@app.cli.command('export-reservations')
+@click.option('--format', 'fmt', type=click.Choice(sorted(FORMATS)), default='csv')
+@click.option('--since', help='Only reservations starting at or after this time, e.g. 2024-01-01.')
+@click.option('--until', help='Only reservations starting before this time.')
+@click.option('--lot-id', type=int, help='Only reservations in this lot.')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output while writing it.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True),
+              help='Write to this file instead of stdout.')
+def export_reservations_command(fmt, since, until, lot_id, compress, output):
+    batches = reservation_model.iter_reservations(since=since, until=until, lot_id=lot_id,
+                                                  batch_size=app.config['EXPORT_BATCH_ROWS'])
+    chunks = export_chunks(batches, fmt, compress, app.config['EXPORT_GZIP_LEVEL'])
+    with click.open_file(output or '-', 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+
+@app.cli.command('archive-reservations')
+@click.option('--older-than-days', type=int, help='Archive completed reservations that ended this long ago.')
+@click.option('--batch-size', type=int, help='Rows moved per write transaction.')
+@click.option('--max-batches', type=int, help='Stop after this many batches.')
+def archive_reservations_command(older_than_days, batch_size, max_batches):
+    moved = archive_reservations(older_than_days, batch_size, max_batches)
+    if moved is None:
+        raise click.ClickException('Archiving failed; batches already moved stay archived')
+    
+    tiers = reservation_model.tier_counts()
+    click.echo(f"Archived {moved} reservation(s); {tiers['live']} live, {tiers['archived']} archived")
+
+@app.cli.command('sync-replicas')
+def sync_replicas_command():
+    # Refresh local replica files from the primary (the two-file stand-in
+    # for a replicated deployment)
+    if not db.replica_pools:
+        raise click.ClickException('No DATABASE_REPLICAS configured')
+    click.echo(f'Synced {db.sync_replicas()} replica(s)')
+
+@app.cli.command('run-jobs')
+@click.option('--trigger', 'names', multiple=True, help='Make this periodic job due now (repeatable).')
+def run_jobs_command(names):
+    # Run every due job in this process, e.g. from cron with JOBS_WORKERS=0
+    for name in names:
+        if not scheduler.trigger(name):
+            raise click.ClickException(f'No pending periodic job {name!r}')
+    succeeded, failed = scheduler.run_pending()
+    click.echo(f'{succeeded} job(s) ran, {failed} failed')
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
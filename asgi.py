@@ -0,0 +1,338 @@
+# Async serving mode. Run with an ASGI server, e.g.
+#
+#   uvicorn asgi:application --workers 2
+#
+# The hot endpoints (booking, release, stats APIs and the occupancy stream)
+# are handled natively on the event loop with their SQLite work pushed onto a
+# bounded thread pool, so idle SSE clients and slow queries never pin a worker
+# thread. Every other route falls through to the regular Flask app.
+import asyncio
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.cookies import SimpleCookie
+from io import BytesIO
+
+from flask import url_for
+from itsdangerous import BadSignature
+
+import app as parkeasy
+from events import format_sse
+from sessions import ServerSessionInterface
+
+flask_app = parkeasy.app
+db_executor = ThreadPoolExecutor(max_workers=flask_app.config['ASYNC_DB_WORKERS'],
+                                 thread_name_prefix='parkeasy-db')
+wsgi_executor = ThreadPoolExecutor(max_workers=flask_app.config['ASYNC_WSGI_WORKERS'],
+                                   thread_name_prefix='parkeasy-wsgi')
+
+# Server-side sessions live in the state store, which may be a file or a
+# network cache, so they are loaded and saved on the database pool
+SERVER_SESSIONS = isinstance(flask_app.session_interface, ServerSessionInterface)
+
+with flask_app.test_request_context():
+    INDEX_URL = url_for('index')
+    USER_DASHBOARD_URL = url_for('user_dashboard')
+
+async def run_db(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, partial(fn, *args))
+
+# The Flask session (signed cookie or server-side), read and written outside
+# a request context
+
+def load_session(scope):
+    cookies = SimpleCookie()
+    for name, value in scope['headers']:
+        if name == b'cookie':
+            cookies.load(value.decode('latin-1'))
+
+    morsel = cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if SERVER_SESSIONS:
+        return flask_app.session_interface.load(flask_app, morsel.value if morsel else None)
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    if morsel is None or serializer is None:
+        return {}
+
+    max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+    try:
+        return serializer.loads(morsel.value, max_age=max_age)
+    except BadSignature:
+        return {}
+
+def session_cookie_header(session):
+    # None when the cookie doesn't need to change
+    if SERVER_SESSIONS:
+        value = flask_app.session_interface.save(flask_app, session)
+        if value is None:
+            return None
+    else:
+        value = flask_app.session_interface.get_signing_serializer(flask_app).dumps(dict(session))
+    parts = [f"{flask_app.config['SESSION_COOKIE_NAME']}={value}", 'Path=/']
+    if value == '':
+        parts.append('Max-Age=0')
+    if flask_app.config['SESSION_COOKIE_HTTPONLY']:
+        parts.append('HttpOnly')
+    if flask_app.config['SESSION_COOKIE_SECURE']:
+        parts.append('Secure')
+    if flask_app.config['SESSION_COOKIE_SAMESITE']:
+        parts.append(f"SameSite={flask_app.config['SESSION_COOKIE_SAMESITE']}")
+    return '; '.join(parts).encode('latin-1')
+
+def flash(session, message, category):
+    # Assigned rather than appended in place, so the session sees the change
+    session['_flashes'] = session.get('_flashes', []) + [(category, message)]
+
+# Response helpers
+
+async def send_json(send, payload, status=200):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode('ascii'))]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_redirect(send, location, session):
+    headers = [(b'location', location.encode('latin-1')), (b'content-length', b'0')]
+    cookie = await run_db(session_cookie_header, session) if SERVER_SESSIONS else session_cookie_header(session)
+    if cookie is not None:
+        headers.append((b'set-cookie', cookie))
+    await send({
+        'type': 'http.response.start',
+        'status': 302,
+        'headers': headers
+    })
+    await send({'type': 'http.response.body', 'body': b''})
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+# Everything without an async variant runs through Flask on a bounded thread
+# pool. The response iterable is pulled one chunk at a time on that pool, so
+# streamed responses (exports) go out as they are produced.
+
+def build_environ(scope, body):
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'SERVER_NAME': scope['server'][0] if scope.get('server') else 'localhost',
+        'SERVER_PORT': str(scope['server'][1]) if scope.get('server') else '80',
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': BytesIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin1')
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+def start_wsgi(environ):
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin1'), value.encode('latin1'))
+                               for name, value in headers]
+
+    result = flask_app(environ, start_response)
+    return response['status'], response['headers'], result
+
+def close_wsgi(result):
+    if hasattr(result, 'close'):
+        result.close()
+
+async def wsgi_fallback(scope, receive, send):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+
+    loop = asyncio.get_running_loop()
+    status, headers, result = await loop.run_in_executor(
+        wsgi_executor, start_wsgi, build_environ(scope, b''.join(chunks)))
+    iterator = iter(result)
+    # Stop pulling chunks once the client has gone, so an abandoned export
+    # releases its database connection
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        while not disconnected.done():
+            chunk = await loop.run_in_executor(wsgi_executor, next, iterator, None)
+            if chunk is None:
+                await send({'type': 'http.response.body', 'body': b''})
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    finally:
+        disconnected.cancel()
+        await loop.run_in_executor(wsgi_executor, close_wsgi, result)
+
+# Fan-out of EventBus events onto the event loop: one listener for the whole
+# process, one asyncio queue per connected stream
+
+class OccupancyBroadcaster:
+    def __init__(self, bus, max_queue=256):
+        self.bus = bus
+        self.max_queue = max_queue
+        self.loop = None
+        self.queues = set()
+
+    def subscribe(self):
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+            self.bus.add_listener(self._on_event)
+        q = asyncio.Queue(maxsize=self.max_queue)
+        self.queues.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        self.queues.discard(q)
+
+    def close(self):
+        if self.loop is not None:
+            self.bus.remove_listener(self._on_event)
+            self.loop = None
+
+    def _on_event(self, event, data):
+        self.loop.call_soon_threadsafe(self._fan_out, event, data)
+
+    def _fan_out(self, event, data):
+        for q in self.queues:
+            if q.full():
+                # Slow client: drop its backlog and make it reload a snapshot
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait(('resync', None))
+            else:
+                q.put_nowait((event, data))
+
+broadcaster = OccupancyBroadcaster(parkeasy.event_bus)
+
+# Async variants of the hot routes
+
+async def user_book_spot(scope, receive, send, session, lot_id):
+    if session.get('role') != 'user':
+        flash(session, 'Access denied!', 'danger')
+        return await send_redirect(send, INDEX_URL, session)
+
+    flash(session, *await run_db(parkeasy.book_for_user, session.get('user_id'), int(lot_id)))
+    await send_redirect(send, USER_DASHBOARD_URL, session)
+
+async def user_release_spot(scope, receive, send, session, spot_id):
+    if session.get('role') != 'user':
+        flash(session, 'Access denied!', 'danger')
+        return await send_redirect(send, INDEX_URL, session)
+
+    flash(session, *await run_db(parkeasy.release_for_user, session.get('user_id'), int(spot_id)))
+    await send_redirect(send, USER_DASHBOARD_URL, session)
+
+async def api_admin_stats(scope, receive, send, session):
+    if session.get('role') != 'admin':
+        return await send_json(send, {'error': 'Access denied'}, 403)
+
+    await send_json(send, await run_db(parkeasy.admin_stats_payload))
+
+async def api_user_stats(scope, receive, send, session):
+    if session.get('role') != 'user':
+        return await send_json(send, {'error': 'Access denied'}, 403)
+
+    await send_json(send, await run_db(parkeasy.user_stats_payload, session.get('user_id')))
+
+async def api_stream_occupancy(scope, receive, send, session):
+    if session.get('role') != 'admin':
+        return await send_json(send, {'error': 'Access denied'}, 403)
+
+    heartbeat = flask_app.config['SSE_HEARTBEAT_SECONDS']
+
+    async def send_event(text):
+        await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+    # Subscribe before the snapshot so no update can fall between them
+    events = broadcaster.subscribe()
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', b'text/event-stream; charset=utf-8'),
+                        (b'cache-control', b'no-cache'),
+                        (b'x-accel-buffering', b'no')]
+        })
+        await send_event(format_sse('snapshot', await run_db(parkeasy.occupancy_snapshot)))
+
+        while not disconnected.done():
+            getter = asyncio.ensure_future(events.get())
+            done, _ = await asyncio.wait({getter, disconnected}, timeout=heartbeat,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                if not disconnected.done():
+                    await send_event(': keepalive\n\n')
+                continue
+
+            event, data = getter.result()
+            if event == 'resync':
+                event, data = 'snapshot', await run_db(parkeasy.occupancy_snapshot)
+            await send_event(format_sse(event, data))
+    finally:
+        disconnected.cancel()
+        broadcaster.unsubscribe(events)
+
+ROUTES = [
+    (re.compile(r'^/user/book/(\d+)$'), user_book_spot),
+    (re.compile(r'^/user/release/(\d+)$'), user_release_spot),
+    (re.compile(r'^/api/admin/stats$'), api_admin_stats),
+    (re.compile(r'^/api/user/stats$'), api_user_stats),
+    (re.compile(r'^/api/stream/occupancy$'), api_stream_occupancy),
+]
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await run_db(parkeasy.scheduler.start)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            broadcaster.close()
+            await run_db(parkeasy.scheduler.stop)
+            db_executor.shutdown(wait=True)
+            wsgi_executor.shutdown(wait=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        for pattern, handler in ROUTES:
+            match = pattern.match(scope['path'])
+            if match:
+                session = await run_db(load_session, scope) if SERVER_SESSIONS else load_session(scope)
+                return await handler(scope, receive, send, session, *match.groups())
+
+    await wsgi_fallback(scope, receive, send)
@@ -0,0 +1,105 @@
+# Occupancy bitmap benchmark on one large, mostly full lot: free-spot lookups
+# and book/release cycles with and without the per-lot bitmap, with and
+# without advance bookings that make walk-ins skip the first free spots, and
+# the size of the /api/lots/<id>/bitmap payload next to the spot rows it
+# replaces.
+#
+#   python benchmarks/bitmap.py --spots 5000 --occupancy 0.9 --reserved 200
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import datagen
+from models import Database, ParkingSpot
+from occupancy import OccupancyIndex
+from slots import SlotIndex
+
+def timed(fn, iterations):
+    samples = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 3)
+    }
+
+def run(db, lot_id, user_ids, slots, occupancy, iterations):
+    spots = ParkingSpot(db, slots=slots, occupancy=occupancy)
+
+    def cycle(i):
+        user_id = user_ids[i % len(user_ids)]
+        spot = spots.allocate_spot(lot_id, user_id)
+        spots.release_spot(spot['id'], user_id)
+
+    # First call loads the bitmap; it isn't part of the steady state
+    spots.get_available_spot(lot_id)
+    return {
+        'get_available_spot': timed(lambda i: spots.get_available_spot(lot_id), iterations),
+        'book_release_cycle': timed(cycle, iterations)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Occupancy bitmap benchmark')
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--reserved', type=int, default=200,
+                        help='free spots held by an advance booking, skipped by walk-ins')
+    datagen.add_arguments(parser)
+    parser.set_defaults(lots=1, spots=5000, occupancy=0.9, users=6000, reservations=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        dataset = datagen.generate(db, args.lots, args.spots, args.users,
+                                   args.reservations, args.occupancy, args.seed)
+        conn = db.get_connection()
+        lot_id = conn.execute('SELECT id FROM parking_lots ORDER BY id LIMIT 1').fetchone()[0]
+        user_ids = [row[0] for row in conn.execute('''
+            SELECT id FROM users WHERE role = 'user'
+            AND id NOT IN (SELECT user_id FROM reservations WHERE status = 'active')
+        ''').fetchall()]
+        free_ids = [row[0] for row in conn.execute('''
+            SELECT id FROM parking_spots WHERE lot_id = ? AND status = 'A' ORDER BY spot_number
+        ''', (lot_id,)).fetchall()]
+        conn.close()
+
+        slots = SlotIndex()
+        now = int(time.time())
+        for booking_id, spot_id in enumerate(free_ids[:args.reserved], 1):
+            slots.add(spot_id, now + 600, now + 7200, booking_id)
+
+        report = {'dataset': dataset, 'reserved_spots': min(args.reserved, len(free_ids))}
+        for name, slot_index in (('walk_in', None), ('walk_in_with_advance_bookings', slots)):
+            report[name] = {
+                'sql': run(db, lot_id, user_ids, slot_index, None, args.iterations),
+                'bitmap': run(db, lot_id, user_ids, slot_index, OccupancyIndex(), args.iterations)
+            }
+
+        spots = ParkingSpot(db, occupancy=OccupancyIndex())
+        bitmap = spots.get_bitmap(lot_id)
+        rows = [dict(row) for row in spots.get_spots_by_lot(lot_id)]
+        report['payload_bytes'] = {
+            'spot_rows_json': len(json.dumps(rows)),
+            'bitmap_json': len(json.dumps({
+                'lot_id': lot_id,
+                'version': bitmap.version,
+                'spots': len(bitmap),
+                'available_spots': bitmap.available(),
+                'bitmap': base64.b64encode(bitmap.packed()).decode('ascii')
+            }))
+        }
+        db.pool.close_all()
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
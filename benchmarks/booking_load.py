@@ -0,0 +1,123 @@
+# Concurrent booking load test: many threads race ParkingSpot.allocate_spot
+# against the same lot, then the reservations table is checked for
+# double-allocated spots and users holding more than one active booking.
+#
+#   python benchmarks/booking_load.py --bookers 64 --spots 48 --rounds 20 [--backend sqlalchemy]
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from models import Database, ParkingLot, ParkingSpot
+
+def setup(db, bookers, spots):
+    lot_id = ParkingLot(db).create_lot('Load Test Lot', 'Bench Road', '000000', 10.0, spots)
+    
+    conn = db.get_connection()
+    conn.executemany('''
+        INSERT INTO users (username, email, password_hash, role)
+        VALUES (?, ?, 'x', 'user')
+    ''', [(f'booker{i}', f'booker{i}@bench.local') for i in range(bookers)])
+    conn.commit()
+    cursor = conn.execute("SELECT id FROM users WHERE username LIKE 'booker%' ORDER BY id")
+    user_ids = [row['id'] for row in cursor.fetchall()]
+    conn.close()
+    return lot_id, user_ids
+
+def run_round(spot_model, lot_id, user_ids):
+    barrier = threading.Barrier(len(user_ids))
+    results = [None] * len(user_ids)
+    
+    def book(index, user_id):
+        barrier.wait()
+        results[index] = spot_model.allocate_spot(lot_id, user_id)
+    
+    threads = [threading.Thread(target=book, args=(i, uid)) for i, uid in enumerate(user_ids)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - start
+
+def check_integrity(db):
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT COUNT(*) FROM (
+            SELECT spot_id FROM reservations WHERE status = 'active'
+            GROUP BY spot_id HAVING COUNT(*) > 1
+        )
+    ''')
+    double_spots = cursor.fetchone()[0]
+    cursor.execute('''
+        SELECT COUNT(*) FROM (
+            SELECT user_id FROM reservations WHERE status = 'active'
+            GROUP BY user_id HAVING COUNT(*) > 1
+        )
+    ''')
+    double_users = cursor.fetchone()[0]
+    cursor.execute('''
+        SELECT COUNT(*) FROM parking_spots ps
+        WHERE (ps.status = 'O') != EXISTS (
+            SELECT 1 FROM reservations r WHERE r.spot_id = ps.id AND r.status = 'active'
+        )
+    ''')
+    mismatched = cursor.fetchone()[0]
+    conn.close()
+    return double_spots, double_users, mismatched
+
+def release_all(db):
+    conn = db.get_connection()
+    conn.execute("UPDATE reservations SET status = 'completed' WHERE status = 'active'")
+    conn.execute("UPDATE parking_spots SET status = 'A' WHERE status = 'O'")
+    conn.commit()
+    conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent booking load test')
+    parser.add_argument('--bookers', type=int, default=64)
+    parser.add_argument('--spots', type=int, default=48)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--pool-size', type=int, default=8)
+    parser.add_argument('--backend', choices=['sqlite', 'sqlalchemy'], default='sqlite')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'), pool_size=args.pool_size, backend=args.backend)
+        spot_model = ParkingSpot(db)
+        lot_id, user_ids = setup(db, args.bookers, args.spots)
+        
+        booked = full = errors = violations = 0
+        elapsed = 0.0
+        for _ in range(args.rounds):
+            results, seconds = run_round(spot_model, lot_id, user_ids)
+            elapsed += seconds
+            booked += sum(1 for r in results if r)
+            full += sum(1 for r in results if r is None)
+            errors += sum(1 for r in results if r is False)
+            violations += sum(check_integrity(db))
+            release_all(db)
+        
+        print(json.dumps({
+            'bookers': args.bookers,
+            'spots': args.spots,
+            'rounds': args.rounds,
+            'bookings': booked,
+            'rejected_full': full,
+            'errors': errors,
+            'integrity_violations': violations,
+            'bookings_per_second': round(booked / elapsed, 1) if elapsed else 0,
+            'pool': db.pool_stats()
+        }, indent=2))
+        db.pool.close_all()
+    
+    return 1 if violations or errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+# Seeded synthetic data for benchmarks: N lots of M spots, U users, R completed
+# historical reservations and a share of currently occupied spots. The same
+# seed and sizes always produce the same database contents, so numbers taken
+# on different commits are comparable.
+#
+#   python benchmarks/datagen.py bench.db --lots 50 --spots 100 --users 2000 --reservations 50000
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from models import Database, ParkingLot
+
+# Fixed reference point so generated timestamps don't depend on the wall clock
+EPOCH = datetime(2024, 1, 1)
+PIN_PREFIXES = ['110', '400', '560', '600', '700', '500']
+STREETS = ['MG Road', 'Park Street', 'Ring Road', 'Station Road', 'Market Lane', 'Lake View']
+# Lots are scattered over a ~40 km square around this point
+CENTER = (12.9716, 77.5946)
+SPREAD_DEG = 0.18
+
+def stamp(dt):
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+def generate_lots(db, rng, lots, spots, seed):
+    rows = [{
+        'name': f'Bench Lot {i + 1}',
+        'address': f'{rng.randint(1, 400)} {rng.choice(STREETS)}',
+        'pin_code': rng.choice(PIN_PREFIXES) + f'{rng.randint(0, 999):03d}',
+        'price_per_hour': float(rng.randrange(10, 105, 5)),
+        'max_spots': spots
+    } for i in range(lots)]
+    # Coordinates come from their own stream so adding them left the rest of
+    # the generated data unchanged
+    geo_rng = random.Random(f'{seed}:coordinates')
+    for row in rows:
+        row['latitude'] = CENTER[0] + geo_rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+        row['longitude'] = CENTER[1] + geo_rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+    return ParkingLot(db).bulk_create_lots(rows)
+
+def generate_users(db, rng, users, password_hash):
+    conn = db.get_connection()
+    conn.executemany('''
+        INSERT INTO users (username, email, password_hash, role, created_at)
+        VALUES (?, ?, ?, 'user', ?)
+    ''', [(f'bench{i}', f'bench{i}@bench.local', password_hash,
+           stamp(EPOCH - timedelta(minutes=rng.randint(0, 525600))))
+          for i in range(users)])
+    conn.commit()
+    user_ids = [row[0] for row in conn.execute(
+        "SELECT id FROM users WHERE username LIKE 'bench%' ORDER BY id").fetchall()]
+    conn.close()
+    return user_ids
+
+def load_spots(db):
+    conn = db.get_connection()
+    spots = conn.execute('''
+        SELECT ps.id, pl.price_per_hour FROM parking_spots ps
+        JOIN parking_lots pl ON ps.lot_id = pl.id
+        ORDER BY ps.id
+    ''').fetchall()
+    conn.close()
+    return [(row[0], row[1]) for row in spots]
+
+def generate_history(db, rng, spots, user_ids, reservations, batch=10000):
+    conn = db.get_connection()
+    for start in range(0, reservations, batch):
+        rows = []
+        for _ in range(min(batch, reservations - start)):
+            spot_id, price = rng.choice(spots)
+            parked = EPOCH - timedelta(minutes=rng.randint(60, 525600))
+            hours = rng.uniform(0.25, 10)
+            rows.append((spot_id, rng.choice(user_ids), stamp(parked),
+                         stamp(parked + timedelta(hours=hours)), round(max(1, hours) * price, 2)))
+        conn.executemany('''
+            INSERT INTO reservations (spot_id, user_id, parking_timestamp, leaving_timestamp, parking_cost, status)
+            VALUES (?, ?, ?, ?, ?, 'completed')
+        ''', rows)
+        conn.commit()
+    conn.close()
+
+def generate_active(db, rng, spots, user_ids, occupancy):
+    # One active reservation per occupied spot, each held by a distinct user
+    count = min(int(len(spots) * occupancy), len(user_ids))
+    taken = rng.sample(spots, count)
+    holders = rng.sample(user_ids, count)
+    conn = db.get_connection()
+    conn.executemany('UPDATE parking_spots SET status = "O" WHERE id = ?',
+                     [(spot_id,) for spot_id, _ in taken])
+    conn.executemany('''
+        INSERT INTO reservations (spot_id, user_id, status)
+        VALUES (?, ?, 'active')
+    ''', [(spot_id, user_id) for (spot_id, _), user_id in zip(taken, holders)])
+    conn.commit()
+    conn.close()
+    return count
+
+def generate(db, lots=20, spots=50, users=500, reservations=5000, occupancy=0.3, seed=42,
+             password_hash='x'):
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    lot_ids = generate_lots(db, rng, lots, spots, seed)
+    user_ids = generate_users(db, rng, users, password_hash)
+    spot_rows = load_spots(db)
+    generate_history(db, rng, spot_rows, user_ids, reservations)
+    active = generate_active(db, rng, spot_rows, user_ids, occupancy)
+    return {
+        'seed': seed,
+        'lots': len(lot_ids),
+        'spots': len(spot_rows),
+        'users': len(user_ids),
+        'historical_reservations': reservations,
+        'active_reservations': active,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+def add_arguments(parser):
+    parser.add_argument('--lots', type=int, default=20)
+    parser.add_argument('--spots', type=int, default=50, help='spots per lot')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--reservations', type=int, default=5000, help='completed historical reservations')
+    parser.add_argument('--occupancy', type=float, default=0.3, help='share of spots occupied at start')
+    parser.add_argument('--seed', type=int, default=42)
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a seeded benchmark database')
+    parser.add_argument('database')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if os.path.exists(args.database):
+        parser.error(f'{args.database} already exists')
+
+    db = Database(args.database)
+    summary = generate(db, args.lots, args.spots, args.users, args.reservations,
+                       args.occupancy, args.seed)
+    db.pool.close_all()
+    print(json.dumps(summary, indent=2))
+
+if __name__ == '__main__':
+    main()
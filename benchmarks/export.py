@@ -0,0 +1,58 @@
+# Reservation export memory check: seeds a database, then drains the
+# streaming exporter in every format and compares its traced peak memory
+# with materialising the same rows via get_all_reservations.
+#
+#   python benchmarks/export.py --reservations 200000
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import datagen
+from export import export_chunks
+from models import Database, Reservation
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = fn()
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'bytes_out': size, 'seconds': round(seconds, 3), 'peak_mb': round(peak / 1024 / 1024, 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming export memory benchmark')
+    parser.add_argument('--batch-rows', type=int, default=1000)
+    datagen.add_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        dataset = datagen.generate(db, args.lots, args.spots, args.users,
+                                   args.reservations, args.occupancy, args.seed)
+        reservations = Reservation(db)
+
+        def drain(fmt, compress):
+            batches = reservations.iter_reservations(batch_size=args.batch_rows)
+            return lambda: sum(len(chunk) for chunk in export_chunks(batches, fmt, compress))
+
+        report = {
+            'dataset': dataset,
+            'batch_rows': args.batch_rows,
+            'csv': measure(drain('csv', False)),
+            'csv_gzip': measure(drain('csv', True)),
+            'ndjson': measure(drain('ndjson', False)),
+            'fetchall': measure(lambda: len(reservations.get_all_reservations()))
+        }
+        db.pool.close_all()
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# Gate throughput benchmark: the same seeded stream of entries and exits is
+# replayed once as single calls to /user/book and /user/release (one request
+# and one transaction per car) and once through /api/gate/batch, both via the
+# Flask test client. Only the requests themselves are timed.
+#
+#   python benchmarks/gate_batch.py --cars 2000 --batch-size 200
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import datagen
+
+TOKEN = 'bench-gate-token'
+
+def car_stream(user_ids, lot_ids, cars, seed):
+    # Each car enters a random lot, then leaves; entries and exits interleave
+    rng = random.Random(seed)
+    users = rng.sample(user_ids, min(cars, len(user_ids)))
+    return [(user_id, rng.choice(lot_ids)) for user_id in users]
+
+def run_single(parkeasy, stream):
+    client = parkeasy.app.test_client()
+    elapsed = 0.0
+    spots = {}
+    for user_id, lot_id in stream:
+        with client.session_transaction() as sess:
+            sess.update(user_id=user_id, username=f'bench-user-{user_id}', role='user')
+        started = time.perf_counter()
+        client.get(f'/user/book/{lot_id}')
+        elapsed += time.perf_counter() - started
+        active = parkeasy.reservation_model.get_active_reservation(user_id)
+        if active:
+            spots[user_id] = active['spot_id']
+    for user_id, spot_id in spots.items():
+        with client.session_transaction() as sess:
+            sess.update(user_id=user_id, username=f'bench-user-{user_id}', role='user')
+        started = time.perf_counter()
+        client.get(f'/user/release/{spot_id}')
+        elapsed += time.perf_counter() - started
+    return {'operations': len(stream) + len(spots), 'booked': len(spots), 'seconds': round(elapsed, 3)}
+
+def post_batches(client, operations, batch_size):
+    results = []
+    elapsed = 0.0
+    for start in range(0, len(operations), batch_size):
+        started = time.perf_counter()
+        response = client.post('/api/gate/batch', json={'operations': operations[start:start + batch_size]},
+                               headers={'Authorization': f'Bearer {TOKEN}'})
+        elapsed += time.perf_counter() - started
+        results.extend(response.get_json()['results'])
+    return results, elapsed
+
+def run_batched(parkeasy, stream, batch_size, tag):
+    client = parkeasy.app.test_client()
+    books = [{'op': 'book', 'user_id': user_id, 'lot_id': lot_id, 'key': f'{tag}-in-{user_id}'}
+             for user_id, lot_id in stream]
+    results, elapsed = post_batches(client, books, batch_size)
+    releases = [{'op': 'release', 'user_id': result['user_id'], 'spot_id': result['spot_id'],
+                 'key': f'{tag}-out-{result["user_id"]}'} for result in results if result['status'] == 'ok']
+    _, release_elapsed = post_batches(client, releases, batch_size)
+
+    # Replaying the entries must not book anything twice
+    replayed, _ = post_batches(client, books, batch_size)
+    return {
+        'operations': len(books) + len(releases),
+        'booked': len(releases),
+        'seconds': round(elapsed + release_elapsed, 3),
+        'replay_all_replayed': all(result.get('replayed') for result in replayed)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Single-call vs batched gate throughput')
+    parser.add_argument('--cars', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=200)
+    datagen.add_arguments(parser)
+    parser.set_defaults(users=5000, occupancy=0.0, reservations=0)
+    args = parser.parse_args()
+    cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # app.py opens parking_system.db in the working directory on import
+        os.chdir(tmp)
+        os.environ['GATE_API_TOKEN'] = TOKEN
+        import app as parkeasy
+
+        datagen.generate(parkeasy.db, args.lots, args.spots, args.users,
+                         args.reservations, args.occupancy, args.seed)
+        conn = parkeasy.db.get_connection()
+        lot_ids = [row[0] for row in conn.execute('SELECT id FROM parking_lots ORDER BY id').fetchall()]
+        user_ids = [row[0] for row in conn.execute("SELECT id FROM users WHERE role = 'user' ORDER BY id").fetchall()]
+        conn.close()
+
+        stream = car_stream(user_ids, lot_ids, args.cars, args.seed)
+        single = run_single(parkeasy, stream)
+        batched = run_batched(parkeasy, stream, args.batch_size, tag=str(args.seed))
+        parkeasy.db.pool.close_all()
+        os.chdir(cwd)
+
+    for result in (single, batched):
+        result['ops_per_second'] = round(result['operations'] / result['seconds'], 1) if result['seconds'] else 0
+    print(json.dumps({
+        'cars': len(stream),
+        'batch_size': args.batch_size,
+        'single': single,
+        'batched': batched,
+        'speedup': round(batched['ops_per_second'] / single['ops_per_second'], 1) if single['ops_per_second'] else None
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+# Background job benchmark: opening an up-to-date database at process start
+# (the schema-version check against replaying the DDL and migrations, alone
+# and while another process holds the write lock), the admin dashboard counts
+# computed in the request against the dashboard-stats job's stored result,
+# release_spot with and without queueing a receipt job, and the queue's own
+# cost per one-shot job.
+#
+#   python benchmarks/jobs.py --users 50000 --reservations 500000 --iterations 200
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import datagen
+from models import Database
+
+class ReplayDatabase(Database):
+    # init_db as it was: DDL, admin seeding check and migrations every time
+    def init_db(self):
+        self.create_schema()
+
+def open_database(database_class, path, busy_ms=0):
+    # Milliseconds for one process start's Database(): a new pool and
+    # connection, optionally while another connection holds the write lock
+    # for busy_ms
+    if busy_ms:
+        writer = sqlite3.connect(path, check_same_thread=False)
+        writer.execute('BEGIN IMMEDIATE')
+        release = threading.Timer(busy_ms / 1000, writer.rollback)
+        release.start()
+    started = time.perf_counter()
+    database = database_class(path)
+    seconds = time.perf_counter() - started
+    if busy_ms:
+        release.join()
+        writer.close()
+    database.pool.close_all()
+    return seconds * 1000
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 3)
+    }
+
+def timed(fn, iterations):
+    samples = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description='Background job benchmark')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--busy-ms', type=int, default=50, help='how long the other writer holds the lock')
+    datagen.add_arguments(parser)
+    parser.set_defaults(lots=50, spots=200, users=50000, reservations=500000, occupancy=0.3)
+    args = parser.parse_args()
+    cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # app.py opens parking_system.db in the working directory on import;
+        # no worker threads, so only the measured calls touch the database
+        os.chdir(tmp)
+        os.environ['JOBS_WORKERS'] = '0'
+        os.environ['RECEIPT_DIR'] = os.path.join(tmp, 'receipts')
+        import app as parkeasy
+        from models import ParkingSpot
+
+        db = parkeasy.db
+        scheduler = parkeasy.scheduler
+        dataset = datagen.generate(db, args.lots, args.spots, args.users,
+                                   args.reservations, args.occupancy, args.seed)
+        conn = db.get_connection()
+        lot_id = conn.execute('SELECT id FROM parking_lots ORDER BY id LIMIT 1').fetchone()[0]
+        user_ids = [row[0] for row in conn.execute('''
+            SELECT id FROM users WHERE role = 'user'
+            AND id NOT IN (SELECT user_id FROM reservations WHERE status = 'active') LIMIT ?
+        ''', (args.iterations,)).fetchall()]
+        conn.close()
+
+        report = {'dataset': dataset}
+        path = os.path.join(tmp, 'parking_system.db')
+        busy_iterations = max(1, args.iterations // 10)
+        report['startup'] = {
+            'replay_schema': summarize(open_database(ReplayDatabase, path) for _ in range(args.iterations)),
+            'version_check': summarize(open_database(Database, path) for _ in range(args.iterations)),
+            f'replay_schema_writer_busy_{args.busy_ms}ms': summarize(
+                open_database(ReplayDatabase, path, args.busy_ms) for _ in range(busy_iterations)),
+            f'version_check_writer_busy_{args.busy_ms}ms': summarize(
+                open_database(Database, path, args.busy_ms) for _ in range(busy_iterations))
+        }
+
+        scheduler.trigger('dashboard-stats')
+        scheduler.run_pending()
+        report['dashboard_counts'] = {
+            'in_request': timed(lambda i: parkeasy.dashboard_counts(), args.iterations),
+            'precomputed': timed(lambda i: parkeasy.dashboard_counts_payload(), args.iterations)
+        }
+
+        report['release_spot'] = {}
+        for name, jobs in (('plain', None), ('with_receipt_job', scheduler)):
+            spots = ParkingSpot(db, jobs=jobs)
+
+            def cycle(i, spots=spots):
+                user_id = user_ids[i % len(user_ids)]
+                spot = spots.allocate_spot(lot_id, user_id)
+                started = time.perf_counter()
+                spots.release_spot(spot['id'], user_id)
+                return time.perf_counter() - started
+
+            report['release_spot'][name] = summarize(cycle(i) * 1000 for i in range(args.iterations))
+
+        # The receipts queued above, then empty jobs: claim, run and finish
+        started = time.perf_counter()
+        receipts, _ = scheduler.run_pending()
+        receipt_seconds = time.perf_counter() - started
+        scheduler.task('noop', lambda: None)
+        for _ in range(args.iterations):
+            scheduler.defer('noop')
+        started = time.perf_counter()
+        noops, _ = scheduler.run_pending()
+        noop_seconds = time.perf_counter() - started
+        report['queue'] = {
+            'receipt_jobs': receipts,
+            'receipt_ms_per_job': round(receipt_seconds * 1000 / max(receipts, 1), 3),
+            'noop_jobs': noops,
+            'noop_ms_per_job': round(noop_seconds * 1000 / max(noops, 1), 3)
+        }
+        db.pool.close_all()
+        os.chdir(cwd)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
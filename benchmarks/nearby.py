@@ -0,0 +1,86 @@
+# Nearby-lot search benchmark: builds the in-memory LotIndex over a seeded
+# dataset, checks k-nearest answers against a brute-force scan, then times
+# nearest and pin-prefix queries.
+#
+#   python benchmarks/nearby.py --lots 5000 --queries 5000 --k 5
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import datagen
+from geo import LotIndex, haversine_km
+from models import Database, ParkingLot
+
+def brute_force(lots, lat, lon, k):
+    ranked = sorted((haversine_km(lat, lon, lot['latitude'], lot['longitude']), lot['id'])
+                    for lot in lots if lot['available_spots'] >= 1)
+    return [lot_id for _, lot_id in ranked[:k]]
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def time_queries(fn, queries):
+    latencies = []
+    for args in queries:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - start)
+    return {
+        'p50_us': round(percentile(latencies, 50) * 1e6, 1),
+        'p99_us': round(percentile(latencies, 99) * 1e6, 1),
+        'max_us': round(max(latencies) * 1e6, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Nearby-lot index benchmark')
+    parser.add_argument('--lots', type=int, default=5000)
+    parser.add_argument('--spots', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--cell-km', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        datagen.generate(db, lots=args.lots, spots=args.spots, users=100, reservations=0,
+                         occupancy=0.3, seed=args.seed)
+        index = LotIndex(cell_km=args.cell_km)
+        started = time.perf_counter()
+        lots = ParkingLot(db).get_all_lots()
+        index.load(lots)
+        build_seconds = time.perf_counter() - started
+        db.pool.close_all()
+
+    rng = random.Random(args.seed)
+    lat0, lon0 = datagen.CENTER
+    spread = datagen.SPREAD_DEG
+    points = [(lat0 + rng.uniform(-spread, spread), lon0 + rng.uniform(-spread, spread))
+              for _ in range(args.queries)]
+
+    mismatches = sum(1 for lat, lon in points[:200]
+                     if [lot['lot_id'] for lot in index.nearest(lat, lon, k=args.k)]
+                     != brute_force(lots, lat, lon, args.k))
+
+    prefixes = [rng.choice(datagen.PIN_PREFIXES) + str(rng.randint(0, 9)) for _ in range(args.queries)]
+    print(json.dumps({
+        'lots': args.lots,
+        'k': args.k,
+        'index': index.stats(),
+        'build_ms': round(build_seconds * 1000, 1),
+        'mismatches_vs_brute_force': mismatches,
+        'nearest': time_queries(lambda lat, lon: index.nearest(lat, lon, k=args.k), points),
+        'pin_prefix': time_queries(lambda prefix: index.by_pin_prefix(prefix, k=args.k),
+                                   [(prefix,) for prefix in prefixes])
+    }, indent=2))
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
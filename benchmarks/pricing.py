@@ -0,0 +1,156 @@
+# Dynamic pricing benchmark: builds recent reservation history with a weekday
+# business-hours peak, then times the first occupancy rollup, an incremental
+# rollup over the last few minutes, a forecast from the rollups next to the
+# history scan it replaces, and walk-in bookings with and without pricing.
+#
+#   python benchmarks/pricing.py --lots 50 --spots 40 --history 200000 --weeks 8
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import datagen
+from models import Database, ParkingSpot, to_timestamp
+from pricing import OccupancyForecaster, DynamicPricing, PricingRules, split_by_hour, hour_of_week
+
+RULES = '0.9:1.5,0.75:1.25,0.3:1.0,0:0.85'
+
+def generate_recent(db, rng, count, weeks, now):
+    # Completed reservations over the last `weeks` weeks: arrivals mostly on
+    # weekdays between 08:00 and 18:00 UTC, stays of 30 minutes to 6 hours
+    conn = db.get_connection()
+    spots = [row[0] for row in conn.execute('SELECT id FROM parking_spots').fetchall()]
+    user_ids = [row[0] for row in conn.execute("SELECT id FROM users WHERE role = 'user'").fetchall()]
+    start = now - int(weeks * 7 * 86400)
+    rows = []
+    for _ in range(count):
+        day = start // 86400 + rng.randrange(int(weeks * 7))
+        weekday = (day + 3) % 7
+        busy = weekday < 5 and rng.random() < 0.8
+        hour = rng.uniform(8, 18) if busy else rng.uniform(0, 24)
+        parked = int(day * 86400 + hour * 3600)
+        left = min(parked + int(rng.uniform(0.5, 6) * 3600), now - 3600)
+        if left <= parked:
+            continue
+        rows.append((rng.choice(spots), rng.choice(user_ids), to_timestamp(parked), to_timestamp(left), 0))
+    conn.executemany('''
+        INSERT INTO reservations (spot_id, user_id, parking_timestamp, leaving_timestamp, parking_cost, status)
+        VALUES (?, ?, ?, ?, ?, 'completed')
+    ''', rows)
+    # The lots opened before the generated history
+    conn.execute('UPDATE parking_lots SET created_at = ?', (to_timestamp(start - 86400),))
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+def scan_forecast(db, lot_id, since, now):
+    # What a forecast costs without rollups: read the lot's history and
+    # bucket it for the coming hour's hour-of-week
+    bucket = hour_of_week(now + 3600)
+    conn = db.get_connection()
+    rows = conn.execute('''
+        SELECT CAST(strftime('%s', r.parking_timestamp) AS INTEGER), CAST(strftime('%s', r.leaving_timestamp) AS INTEGER)
+        FROM reservations r JOIN parking_spots ps ON r.spot_id = ps.id
+        WHERE ps.lot_id = ? AND r.leaving_timestamp > ?
+    ''', (lot_id, to_timestamp(since))).fetchall()
+    conn.close()
+    return sum(length for parked, left in rows for how, length in split_by_hour(parked, left) if how == bucket)
+
+def timed(fn, iterations):
+    samples = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Occupancy forecast and dynamic pricing benchmark')
+    parser.add_argument('--history', type=int, default=200000, help='recent completed reservations')
+    parser.add_argument('--weeks', type=float, default=8)
+    parser.add_argument('--iterations', type=int, default=300)
+    datagen.add_arguments(parser)
+    parser.set_defaults(lots=50, spots=40, users=20000, reservations=0, occupancy=0.5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        dataset = datagen.generate(db, args.lots, args.spots, args.users,
+                                   args.reservations, args.occupancy, args.seed)
+        now = int(time.time())
+        dataset['recent_reservations'] = generate_recent(db, random.Random(args.seed), args.history, args.weeks, now)
+        conn = db.get_connection()
+        lot_ids = [row[0] for row in conn.execute('SELECT id FROM parking_lots ORDER BY id').fetchall()]
+        user_ids = [row[0] for row in conn.execute('''
+            SELECT id FROM users WHERE role = 'user'
+            AND id NOT IN (SELECT user_id FROM reservations WHERE status = 'active')
+        ''').fetchall()]
+        conn.close()
+
+        forecaster = OccupancyForecaster(db, history_weeks=args.weeks, lag=0)
+        report = {'dataset': dataset}
+
+        started = time.perf_counter()
+        hours = forecaster.update_rollups()
+        report['first_rollup'] = {'hours': hours, 'seconds': round(time.perf_counter() - started, 3)}
+        time.sleep(1)
+        started = time.perf_counter()
+        forecaster.update_rollups()
+        report['incremental_rollup_ms'] = round((time.perf_counter() - started) * 1000, 3)
+
+        # Current occupancy as of now; the forecast for the coming hours
+        pricing = DynamicPricing(forecaster, PricingRules.parse(RULES))
+        lot = {'price_per_hour': 20.0, 'total_spots': args.spots, 'occupied_spots': args.spots // 2}
+        forecaster.rates(lot_ids[0])
+        since = now - int(args.weeks * 7 * 86400)
+        report['forecast'] = {
+            'rollups': timed(lambda i: pricing.quote(lot_ids[i % len(lot_ids)], lot), args.iterations),
+            'history_scan': timed(lambda i: scan_forecast(db, lot_ids[i % len(lot_ids)], since, now),
+                                  max(1, args.iterations // 10))
+        }
+        # A Wednesday this week at a few hours, arriving to a nearly empty,
+        # half full and nearly full lot
+        wednesday = (now - now % 3600) - hour_of_week(now) * 3600 + 2 * 86400
+        report['quotes'] = {
+            f'{hour:02d}:00 UTC Wed': {
+                f'{occupied * 100 // args.spots}% occupied': pricing.quote(
+                    lot_ids[0], dict(lot, occupied_spots=occupied), now=wednesday + hour * 3600)
+                for occupied in (args.spots // 10, args.spots // 2, args.spots * 9 // 10)
+            }
+            for hour in (3, 9, 13, 20)
+        }
+
+        report['allocate_spot'] = {}
+        for name, spot_pricing in (('static', None), ('dynamic', pricing)):
+            spots = ParkingSpot(db, pricing=spot_pricing)
+
+            def cycle(i, spots=spots):
+                user_id = user_ids[i % len(user_ids)]
+                lot_id = lot_ids[i % len(lot_ids)]
+                started = time.perf_counter()
+                spot = spots.allocate_spot(lot_id, user_id)
+                seconds = time.perf_counter() - started
+                spots.release_spot(spot['id'], user_id)
+                return seconds * 1000
+
+            samples = sorted(cycle(i) for i in range(args.iterations))
+            report['allocate_spot'][name] = {
+                'p50_ms': round(statistics.median(samples), 3),
+                'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 3)
+            }
+        db.pool.close_all()
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# Spot provisioning benchmark: the old one-INSERT-per-spot loop against the
+# recursive CTE path used by ParkingLot.create_lot / bulk_create_lots.
+#
+#   python benchmarks/provisioning.py --spots 5000 --lots 20
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from models import Database, ParkingLot
+
+def create_lot_row_by_row(db, name, max_spots):
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO parking_lots (prime_location_name, address, pin_code, price_per_hour, maximum_number_of_spots)
+        VALUES (?, 'Bench Road', '000000', 10.0, ?)
+    ''', (name, max_spots))
+    lot_id = cursor.lastrowid
+    for i in range(1, max_spots + 1):
+        cursor.execute('''
+            INSERT INTO parking_spots (lot_id, spot_number, status)
+            VALUES (?, ?, 'A')
+        ''', (lot_id, i))
+    conn.commit()
+    conn.close()
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Spot provisioning benchmark')
+    parser.add_argument('--spots', type=int, default=5000)
+    parser.add_argument('--lots', type=int, default=20)
+    args = parser.parse_args()
+    
+    total = args.spots * args.lots
+    lots = [{'name': f'Garage {i}', 'address': 'Bench Road', 'pin_code': '000000',
+             'price_per_hour': 10.0, 'max_spots': args.spots} for i in range(args.lots)]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'loop.db'))
+        loop = timed(lambda: [create_lot_row_by_row(db, lot['name'], args.spots) for lot in lots])
+        db.pool.close_all()
+        
+        db = Database(os.path.join(tmp, 'single.db'))
+        model = ParkingLot(db)
+        single = timed(lambda: [model.create_lot(lot['name'], lot['address'], lot['pin_code'],
+                                                 lot['price_per_hour'], lot['max_spots']) for lot in lots])
+        db.pool.close_all()
+        
+        db = Database(os.path.join(tmp, 'bulk.db'))
+        bulk = timed(lambda: ParkingLot(db).bulk_create_lots(lots))
+        db.pool.close_all()
+    
+    print(json.dumps({
+        'lots': args.lots,
+        'spots_per_lot': args.spots,
+        'row_by_row_spots_per_second': round(total / loop),
+        'create_lot_spots_per_second': round(total / single),
+        'bulk_create_lots_spots_per_second': round(total / bulk)
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+# EXPLAIN QUERY PLAN check for the hot model queries. Fails if any of them
+# falls back to a full SCAN of parking_spots or reservations.
+#
+#   python benchmarks/query_plans.py
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from models import Database
+from records import LOT_COLUMNS
+
+HOT_QUERIES = {
+    'get_available_spot': ('''
+        SELECT * FROM parking_spots 
+        WHERE lot_id = ? AND status = 'A' 
+        ORDER BY spot_number LIMIT 1
+    ''', (1,)),
+    'get_spots_by_lot': ('''
+        SELECT ps.id, ps.spot_number, ps.status, r.user_id, u.username, r.parking_timestamp
+        FROM parking_spots ps
+        LEFT JOIN reservations r ON ps.id = r.spot_id AND r.status = 'active'
+        LEFT JOIN users u ON r.user_id = u.id
+        WHERE ps.lot_id = ?
+        ORDER BY ps.spot_number
+    ''', (1,)),
+    'get_active_reservation': ('''
+        SELECT r.*, ps.spot_number, pl.prime_location_name, pl.address, pl.price_per_hour
+        FROM reservations r
+        JOIN parking_spots ps ON r.spot_id = ps.id
+        JOIN parking_lots pl ON ps.lot_id = pl.id
+        WHERE r.user_id = ? AND r.status = 'active'
+    ''', (1,)),
+    'get_user_state': ('''
+        SELECT u.role AS user_role, r.*, ps.spot_number, pl.prime_location_name, pl.address, pl.price_per_hour
+        FROM users u
+        LEFT JOIN reservations r ON r.user_id = u.id AND r.status = 'active'
+        LEFT JOIN parking_spots ps ON r.spot_id = ps.id
+        LEFT JOIN parking_lots pl ON ps.lot_id = pl.id
+        WHERE u.id = ?
+    ''', (1,)),
+    'get_user_reservations': ('''
+        SELECT r.id, r.spot_id, ps.spot_number, pl.prime_location_name, pl.address,
+               r.parking_timestamp, r.leaving_timestamp, r.parking_cost, r.status
+        FROM reservations r
+        JOIN parking_spots ps ON r.spot_id = ps.id
+        JOIN parking_lots pl ON ps.lot_id = pl.id
+        WHERE r.user_id = ?
+        ORDER BY r.parking_timestamp DESC
+    ''', (1,)),
+    'release_spot': ('''
+        SELECT r.*, ps.lot_id, ps.spot_number, pl.price_per_hour, pl.total_spots, pl.occupied_spots
+        FROM reservations r
+        JOIN parking_spots ps ON r.spot_id = ps.id
+        JOIN parking_lots pl ON ps.lot_id = pl.id
+        WHERE r.spot_id = ? AND r.user_id = ? AND r.status = 'active'
+    ''', (1, 1)),
+    'get_all_lots': (f'SELECT {LOT_COLUMNS} FROM parking_lots ORDER BY created_at DESC', ()),
+    'get_reservations_page': ('''
+        SELECT r.*, ps.spot_number, pl.prime_location_name, u.username
+        FROM reservations r
+        JOIN parking_spots ps ON r.spot_id = ps.id
+        JOIN parking_lots pl ON ps.lot_id = pl.id
+        JOIN users u ON r.user_id = u.id
+        WHERE (r.parking_timestamp, r.id) < (?, ?)
+        ORDER BY r.parking_timestamp DESC, r.id DESC
+        LIMIT ?
+    ''', ('2024-01-01 00:00:00', 1, 51)),
+    'get_users_page': ('''
+        SELECT id, username, email, role, created_at FROM users
+        WHERE role = ? AND (created_at, id) < (?, ?)
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    ''', ('user', '2024-01-01 00:00:00', 1, 51)),
+    'count_active_reservations': ("SELECT COUNT(*) FROM reservations WHERE status = ?", ('active',)),
+    'delete_lot': ('''
+        SELECT COUNT(*) as occupied_count 
+        FROM parking_spots 
+        WHERE lot_id = ? AND status = 'O'
+    ''', (1,)),
+    'occupancy_rollup_window': ('''
+        SELECT ps.lot_id, CAST(strftime('%s', r.parking_timestamp) AS INTEGER) as parked,
+               CAST(strftime('%s', r.leaving_timestamp) AS INTEGER) as left_at
+        FROM reservations r JOIN parking_spots ps ON r.spot_id = ps.id
+        WHERE (r.leaving_timestamp IS NULL OR r.leaving_timestamp > ?) AND +r.parking_timestamp < ?
+    ''', ('2024-01-01 00:00:00', '2024-01-01 00:15:00')),
+    'walkin_spot': ('''
+        SELECT * FROM parking_spots ps
+        WHERE lot_id = ? AND status = 'A' AND NOT EXISTS (
+            SELECT 1 FROM slot_bookings sb
+            WHERE sb.spot_id = ps.id AND sb.status != 'cancelled' AND sb.end_at > ? AND sb.start_at < ?
+        )
+        ORDER BY spot_number LIMIT 1
+    ''', (1, '2024-01-01 00:00:00', '2024-01-01 02:00:00')),
+    'slot_conflicts': ('''
+        SELECT 1 FROM slot_bookings
+        WHERE spot_id = ? AND status != 'cancelled' AND end_at > ? AND start_at < ?
+        LIMIT 1
+    ''', (1, '2024-01-01 00:00:00', '2024-01-01 02:00:00')),
+}
+
+# Tables that grow with traffic and must never be scanned on a hot path
+LARGE_TABLES = ('parking_spots', 'reservations', 'users', 'slot_bookings', 'ps', 'r', 'u')
+
+# Partial indexes only hold live rows, so scanning them is bounded by occupancy
+PARTIAL_INDEXES = ('uq_reservations_active_user', 'uq_reservations_active_spot')
+
+def find_scans(plan):
+    scans = []
+    for detail in plan:
+        words = detail.split()
+        if len(words) >= 2 and words[0] == 'SCAN' and words[1] in LARGE_TABLES:
+            if not any(index in words for index in PARTIAL_INDEXES):
+                scans.append(detail)
+    return scans
+
+def main():
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'plans.db'))
+        for name, (sql, params) in HOT_QUERIES.items():
+            plan = db.explain_query_plan(sql, params)
+            scans = find_scans(plan)
+            print(f"{'FAIL' if scans else 'ok  '} {name}")
+            for detail in plan:
+                print(f'       {detail}')
+            failed = failed or bool(scans)
+        db.pool.close_all()
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
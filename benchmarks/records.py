@@ -0,0 +1,126 @@
+# Row memory benchmark for the dashboard and spot-grid reads: each model call
+# is measured against the SELECT * / sqlite3.Row query it replaced (peak and
+# retained traced memory, time), then the two pages are rendered through the
+# test client with the new code.
+#
+#   python benchmarks/records.py --spots 2000 --users 20 --reservations 100000
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import datagen
+
+LEGACY = {
+    'history': '''
+        SELECT r.*, ps.spot_number, pl.prime_location_name, pl.address
+        FROM reservations r
+        JOIN parking_spots ps ON r.spot_id = ps.id
+        JOIN parking_lots pl ON ps.lot_id = pl.id
+        WHERE r.user_id = ?
+        ORDER BY r.parking_timestamp DESC
+    ''',
+    'spot_grid': '''
+        SELECT ps.*, r.user_id, u.username, r.parking_timestamp
+        FROM parking_spots ps
+        LEFT JOIN reservations r ON ps.id = r.spot_id AND r.status = 'active'
+        LEFT JOIN users u ON r.user_id = u.id
+        WHERE ps.lot_id = ?
+        ORDER BY ps.spot_number
+    ''',
+    'lots': 'SELECT * FROM parking_lots ORDER BY created_at DESC'
+}
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - started
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'rows': result if isinstance(result, int) else len(result),
+        'ms': round(seconds * 1000, 2),
+        'peak_kb': round(peak / 1024, 1),
+        'retained_kb': round(retained / 1024, 1)
+    }
+
+def legacy(db, sql, params=(), to_dict=False):
+    def run():
+        conn = db.get_connection()
+        rows = conn.execute(sql, params).fetchall()
+        conn.close()
+        return [dict(row) for row in rows] if to_dict else rows
+    return run
+
+def render(client, path):
+    def run():
+        return len(client.get(path).data)
+    return run
+
+def main():
+    parser = argparse.ArgumentParser(description='Record vs sqlite3.Row memory per endpoint')
+    datagen.add_arguments(parser)
+    parser.set_defaults(lots=200, spots=2000, users=20, reservations=100000, occupancy=0.5)
+    args = parser.parse_args()
+    cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # app.py opens parking_system.db in the working directory on import
+        os.chdir(tmp)
+        import app as parkeasy
+
+        db = parkeasy.db
+        dataset = datagen.generate(db, args.lots, args.spots, args.users,
+                                   args.reservations, args.occupancy, args.seed)
+        conn = db.get_connection()
+        lot_id = conn.execute('SELECT id FROM parking_lots ORDER BY id LIMIT 1').fetchone()[0]
+        user_id, username = conn.execute('''
+            SELECT u.id, u.username FROM users u JOIN reservations r ON r.user_id = u.id
+            WHERE u.role = 'user' GROUP BY u.id ORDER BY COUNT(*) DESC LIMIT 1
+        ''').fetchone()
+        conn.close()
+
+        lots = parkeasy.parking_lot_model
+        spots = parkeasy.parking_spot_model
+        reservations = parkeasy.reservation_model
+        report = {'dataset': dataset, 'models': {
+            'user_history': {
+                'legacy_rows': measure(legacy(db, LEGACY['history'], (user_id,))),
+                'records': measure(lambda: reservations.get_user_reservations(user_id)),
+                'records_streamed': measure(lambda: sum(1 for _ in reservations.iter_user_reservations(user_id)))
+            },
+            'spot_grid': {
+                'legacy_rows': measure(legacy(db, LEGACY['spot_grid'], (lot_id,))),
+                'records': measure(lambda: spots.get_spots_by_lot(lot_id))
+            },
+            'lots': {
+                'legacy_dicts': measure(legacy(db, LEGACY['lots'], to_dict=True)),
+                'records': measure(lots._load_all_lots)
+            }
+        }}
+
+        client = parkeasy.app.test_client()
+        with client.session_transaction() as sess:
+            sess.update(user_id=user_id, username=username, role='user')
+        user_page = measure(render(client, '/user/dashboard'))
+        with client.session_transaction() as sess:
+            sess.update(user_id=1, username='admin', role='admin')
+        parkeasy.fragment_cache.cache.clear()
+        spots_page = measure(render(client, f'/admin/lot/{lot_id}/spots'))
+        report['pages'] = {
+            '/user/dashboard': dict(user_page, html_bytes=user_page.pop('rows')),
+            '/admin/lot/<id>/spots (fragment miss)': dict(spots_page, html_bytes=spots_page.pop('rows'))
+        }
+        db.pool.close_all()
+        os.chdir(cwd)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# Dashboard rendering benchmark: times the spot section of the admin spot
+# view for one large lot three ways (rendered from scratch on every request,
+# a fragment-cache miss and a fragment-cache hit), then the cost of loading
+# every template into a fresh Jinja environment with and without a warm
+# bytecode cache.
+#
+#   python benchmarks/render.py --spots 2000 --occupancy 0.5
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import datagen
+
+def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 3),
+        'iterations': iterations
+    }
+
+def load_templates(app, bytecode_cache):
+    # A fresh environment per run, so only the bytecode cache can carry over
+    env = app.create_jinja_environment()
+    env.bytecode_cache = bytecode_cache
+    names = env.list_templates(extensions=['html'])
+    started = time.perf_counter()
+    for name in names:
+        env.get_template(name)
+    return len(names), (time.perf_counter() - started) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Fragment cache and template compile benchmark')
+    parser.add_argument('--iterations', type=int, default=200)
+    datagen.add_arguments(parser)
+    parser.set_defaults(lots=1, spots=2000, occupancy=0.5, users=2000, reservations=0)
+    args = parser.parse_args()
+    cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # app.py opens parking_system.db in the working directory on import
+        os.chdir(tmp)
+        os.environ['JINJA_BYTECODE_CACHE_DIR'] = tmp
+        import app as parkeasy
+        from flask import render_template
+        from jinja2 import FileSystemBytecodeCache
+
+        dataset = datagen.generate(parkeasy.db, args.lots, args.spots, args.users,
+                                   args.reservations, args.occupancy, args.seed)
+        conn = parkeasy.db.get_connection()
+        lot_id = conn.execute('SELECT id FROM parking_lots ORDER BY id LIMIT 1').fetchone()[0]
+        conn.close()
+        fragments = parkeasy.fragment_cache
+
+        with parkeasy.app.test_request_context():
+            lot = parkeasy.parking_lot_model.get_lot_by_id(lot_id)
+            load = lambda: {'spots': parkeasy.parking_spot_model.get_spots_by_lot(lot_id)}
+
+            def uncached():
+                render_template('admin/_spots.html', lot=lot, **load())
+
+            def miss():
+                fragments.cache.clear()
+                fragments.render('admin/_spots.html', lot, load=load)
+
+            def hit():
+                fragments.render('admin/_spots.html', lot, load=load)
+
+            report = {
+                'dataset': dataset,
+                'html_bytes': len(fragments.render('admin/_spots.html', lot, load=load)),
+                'uncached': timed(uncached, args.iterations),
+                'fragment_miss': timed(miss, args.iterations),
+                'fragment_hit': timed(hit, args.iterations)
+            }
+
+        templates, no_cache_ms = load_templates(parkeasy.app, None)
+        bytecode_cache = FileSystemBytecodeCache(tmp)
+        load_templates(parkeasy.app, bytecode_cache)
+        _, warm_ms = load_templates(parkeasy.app, bytecode_cache)
+        report['compile'] = {
+            'templates': templates,
+            'no_bytecode_cache_ms': round(no_cache_ms, 2),
+            'warm_bytecode_cache_ms': round(warm_ms, 2)
+        }
+        parkeasy.db.pool.close_all()
+        os.chdir(cwd)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# Serving-mode load test: the threaded WSGI dev server (app.run) against the
+# ASGI entry point in asgi.py under uvicorn. Both servers get a fresh database
+# in a temporary directory; each client thread logs in as the default admin
+# and hammers one endpoint over a keep-alive connection.
+#
+#   python benchmarks/serving_load.py --path /api/admin/stats --concurrency 64 --duration 10
+import argparse
+import http.client
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+SERVERS = {
+    'wsgi': [sys.executable, '-c',
+             'import app; app.app.run(host="127.0.0.1", port={port}, threaded=True)'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:application',
+             '--host', '127.0.0.1', '--port', '{port}', '--log-level', 'warning'],
+}
+
+def start_server(mode, port, workdir):
+    shutil.copytree(os.path.join(ROOT, 'templates'), os.path.join(workdir, 'templates'))
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    command = [part.replace('{port}', str(port)) for part in SERVERS[mode]]
+    process = subprocess.Popen(command, cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            conn.close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+def login(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    body = urllib.parse.urlencode({'username': 'admin', 'password': 'admin123'})
+    conn.request('POST', '/login', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    cookie = response.getheader('Set-Cookie').split(';', 1)[0]
+    conn.close()
+    return cookie
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def run_load(port, path, concurrency, duration):
+    cookie = login(port)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        failed = 0
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path, headers={'Cookie': cookie})
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            local.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='WSGI vs ASGI serving load test')
+    parser.add_argument('--path', default='/api/admin/stats')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--modes', default='wsgi,asgi')
+    parser.add_argument('--port', type=int, default=8790)
+    args = parser.parse_args()
+
+    results = {}
+    for offset, mode in enumerate(args.modes.split(',')):
+        port = args.port + offset
+        with tempfile.TemporaryDirectory() as workdir:
+            process = start_server(mode, port, workdir)
+            try:
+                results[mode] = run_load(port, args.path, args.concurrency, args.duration)
+            finally:
+                process.terminate()
+                process.wait()
+
+    print(json.dumps({'path': args.path, 'concurrency': args.concurrency, 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+# Session and user-state store benchmark: the booking pre-check and the
+# dashboard's active-reservation lookup from the database against each state
+# store backend, book_for_user with and without cached user state, and
+# loading + saving a session from the signed cookie against a server-side
+# store.
+#
+#   python benchmarks/sessions.py --users 50000 --reservations 500000 --iterations 500
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import datagen
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'p50_ms': round(statistics.median(samples), 4),
+        'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 4)
+    }
+
+def timed(fn, iterations):
+    samples = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description='Session and user-state store benchmark')
+    parser.add_argument('--iterations', type=int, default=500)
+    datagen.add_arguments(parser)
+    parser.set_defaults(lots=50, spots=200, users=50000, reservations=500000, occupancy=0.3)
+    args = parser.parse_args()
+    cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # app.py opens its database and state store in the working directory
+        os.chdir(tmp)
+        os.environ['JOBS_WORKERS'] = '0'
+        import app as parkeasy
+        from flask.sessions import SecureCookieSessionInterface
+        from sessions import ServerSessionInterface, UserState, create_store
+
+        flask_app = parkeasy.app
+        db = parkeasy.db
+        dataset = datagen.generate(db, args.lots, args.spots, args.users,
+                                   args.reservations, args.occupancy, args.seed)
+        conn = db.get_connection()
+        lot_ids = [row[0] for row in conn.execute('SELECT id FROM parking_lots ORDER BY id').fetchall()]
+        user_ids = [row[0] for row in conn.execute('''
+            SELECT id FROM users WHERE role = 'user'
+            AND id NOT IN (SELECT user_id FROM reservations WHERE status = 'active') LIMIT ?
+        ''', (args.iterations,)).fetchall()]
+        parked_ids = [row[0] for row in conn.execute('''
+            SELECT user_id FROM reservations WHERE status = 'active' LIMIT ?
+        ''', (args.iterations,)).fetchall()]
+        conn.close()
+
+        stores = {
+            'memory': create_store('memory'),
+            'sqlite': create_store('sqlite', path=os.path.join(tmp, 'state.db')),
+            'shared': create_store('shared')
+        }
+        report = {'dataset': dataset}
+
+        # The pre-check and dashboard lookup; the states are cached first
+        reservations = parkeasy.reservation_model
+        lookups = {
+            'database': timed(lambda i: reservations.get_active_reservation(parked_ids[i % len(parked_ids)]),
+                              args.iterations)
+        }
+        for name, store in stores.items():
+            state = UserState(store, reservations.get_user_state)
+            for user_id in parked_ids:
+                state.get(user_id)
+            lookups[name] = timed(lambda i, state=state: state.peek(parked_ids[i % len(parked_ids)]),
+                                  args.iterations)
+        report['active_reservation_lookup'] = lookups
+
+        # book_for_user after a dashboard view cached the user's state; the
+        # reservation is released again outside the timing
+        spots = parkeasy.parking_spot_model
+        booking = {}
+        for name, store in [('no_user_state', None)] + list(stores.items()):
+            state = UserState(store, reservations.get_user_state) if store is not None else None
+            parkeasy.user_state = spots.user_state = state
+
+            def cycle(i, state=state):
+                user_id = user_ids[i % len(user_ids)]
+                if state is not None:
+                    state.get(user_id)
+                started = time.perf_counter()
+                message, category = parkeasy.book_for_user(user_id, lot_ids[i % len(lot_ids)])
+                seconds = time.perf_counter() - started
+                spots.release_spot(reservations.get_active_reservation(user_id)['spot_id'], user_id)
+                return seconds * 1000
+
+            booking[name] = summarize(cycle(i) for i in range(args.iterations))
+        report['book_for_user'] = booking
+
+        # One request's session round trip: read the cookie's session, add a
+        # flash message, write it back
+        sessions = {}
+        with flask_app.test_request_context():
+            cookie = SecureCookieSessionInterface()
+            serializer = cookie.get_signing_serializer(flask_app)
+            value = serializer.dumps({'user_id': user_ids[0], 'username': 'user', 'role': 'user'})
+
+            def cookie_round_trip(i):
+                data = serializer.loads(value)
+                data['_flashes'] = [('success', 'Parking spot booked successfully!')]
+                serializer.dumps(data)
+
+            sessions['cookie'] = timed(cookie_round_trip, args.iterations)
+            for name, store in stores.items():
+                interface = ServerSessionInterface(store)
+                session = interface.load(flask_app, None)
+                session.update({'user_id': user_ids[0], 'username': 'user', 'role': 'user'})
+                sid = interface.save(flask_app, session)
+
+                def server_round_trip(i, interface=interface):
+                    session = interface.load(flask_app, sid)
+                    session['_flashes'] = [('success', 'Parking spot booked successfully!')]
+                    interface.save(flask_app, session)
+
+                sessions[name] = timed(server_round_trip, args.iterations)
+        report['session_round_trip'] = sessions
+
+        stores['sqlite'].pool.close_all()
+        db.pool.close_all()
+        os.chdir(cwd)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# Advance-booking benchmark: fills one lot with a large number of future
+# slot bookings, loads them into the SlotIndex, then times availability
+# counts and book_slot for random windows, with and without the index.
+#
+#   python benchmarks/slot_bookings.py --spots 200 --bookings 300000 --queries 2000
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from models import Database, ParkingLot, SlotBooking, User, to_timestamp
+from slots import SlotIndex
+
+HOUR = 3600
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def timed(fn, windows):
+    latencies = []
+    for start, end in windows:
+        started = time.perf_counter()
+        fn(start, end)
+        latencies.append(time.perf_counter() - started)
+    return {
+        'p50_us': round(percentile(latencies, 50) * 1e6, 1),
+        'p99_us': round(percentile(latencies, 99) * 1e6, 1),
+        'max_us': round(max(latencies) * 1e6, 1)
+    }
+
+def seed_bookings(db, lot_id, user_id, bookings, rng):
+    # Each spot gets a run of consecutive bookings with random gaps between them
+    conn = db.get_connection()
+    spot_ids = [row[0] for row in conn.execute(
+        'SELECT id FROM parking_spots WHERE lot_id = ? ORDER BY spot_number', (lot_id,)).fetchall()]
+    now = int(time.time()) + HOUR
+    rows = []
+    per_spot = bookings // len(spot_ids)
+    for spot_id in spot_ids:
+        cursor_ts = now
+        for _ in range(per_spot):
+            cursor_ts += rng.randrange(0, 2 * HOUR + 1, 300)
+            length = rng.randrange(HOUR // 2, 2 * HOUR + 1, 300)
+            rows.append((spot_id, lot_id, user_id, to_timestamp(cursor_ts), to_timestamp(cursor_ts + length)))
+            cursor_ts += length
+    conn.executemany('''
+        INSERT INTO slot_bookings (spot_id, lot_id, user_id, start_at, end_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+    return now, max(cursor_ts, now)
+
+def main():
+    parser = argparse.ArgumentParser(description='Advance slot booking benchmark')
+    parser.add_argument('--spots', type=int, default=200)
+    parser.add_argument('--bookings', type=int, default=300000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        User(db).create_user('bench', 'bench@example.com', 'x')
+        user_id = User(db).get_user_by_username('bench')['id']
+        lot_id = ParkingLot(db).create_lot('Bench', 'Bench Road', '560001', 10.0, args.spots)
+
+        started = time.perf_counter()
+        first, last = seed_bookings(db, lot_id, user_id, args.bookings, rng)
+        seed_seconds = time.perf_counter() - started
+
+        index = SlotIndex()
+        indexed = SlotBooking(db, index=index, walkin_buffer=0)
+        started = time.perf_counter()
+        index.load(indexed.load_upcoming())
+        load_seconds = time.perf_counter() - started
+        scanned = SlotBooking(db, walkin_buffer=0)
+
+        windows = []
+        for _ in range(args.queries):
+            start = rng.randrange(first, last, 900)
+            windows.append((start, start + rng.randrange(HOUR, 4 * HOUR + 1, 900)))
+
+        report = {
+            'spots': args.spots,
+            'bookings': args.bookings,
+            'horizon_days': round((last - first) / 86400, 1),
+            'index': index.stats(),
+            'seed_seconds': round(seed_seconds, 2),
+            'index_load_ms': round(load_seconds * 1000, 1),
+            'count_available_indexed': timed(lambda s, e: indexed.count_available(lot_id, s, e), windows),
+            'count_available_sql': timed(lambda s, e: scanned.count_available(lot_id, s, e), windows[:200]),
+            'book_slot_indexed': timed(lambda s, e: indexed.book_slot(lot_id, user_id, s, e), windows[:500])
+        }
+        mismatches = sum(1 for start, end in windows[:200]
+                         if indexed.count_available(lot_id, start, end) != scanned.count_available(lot_id, start, end))
+        report['mismatches_vs_sql'] = mismatches
+        db.pool.close_all()
+
+    print(json.dumps(report, indent=2))
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,283 @@
+# Mixed-workload benchmark: seeds a database with datagen.py, then worker
+# threads replay a weighted mix of booking, release and dashboard operations
+# either straight against the models used by the app ("models" driver) or
+# through the Flask test client ("client" driver). Every worker draws from its
+# own seeded RNG, so a given seed, mix and size replays the same operation
+# sequence on every commit. Results are JSON: overall throughput plus per
+# operation latency percentiles.
+#
+#   python benchmarks/workload.py --driver client --mix default --operations 20000 --workers 8
+#   python benchmarks/workload.py --database bench.db --output results/$(git rev-parse --short HEAD).json
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import datagen
+
+# Relative weights of each operation
+MIXES = {
+    'default': {'book': 25, 'release': 20, 'user_dashboard': 35, 'admin_dashboard': 5, 'admin_stats': 15},
+    'read_heavy': {'book': 5, 'release': 5, 'user_dashboard': 60, 'admin_dashboard': 10, 'admin_stats': 20},
+    'write_heavy': {'book': 45, 'release': 45, 'user_dashboard': 10, 'admin_dashboard': 0, 'admin_stats': 0},
+}
+
+class ModelDriver:
+    # Calls the model layer the same way the views do, minus templates and HTTP
+    def __init__(self, parkeasy):
+        self.app = parkeasy
+
+    def book(self, worker, user_id, lot_id):
+        spot = self.app.parking_spot_model.allocate_spot(lot_id, user_id)
+        return spot['id'] if spot else None
+
+    def release(self, worker, user_id, spot_id):
+        return self.app.parking_spot_model.release_spot(spot_id, user_id) is not False
+
+    def user_dashboard(self, worker, user_id):
+        self.app.parking_lot_model.get_all_lots()
+        self.app.reservation_model.get_user_reservations(user_id)
+        self.app.reservation_model.get_active_reservation(user_id)
+        return True
+
+    def admin_dashboard(self, worker):
+        self.app.parking_lot_model.get_all_lots()
+        self.app.user_model.get_users_page(limit=5, role='user')
+        self.app.reservation_model.get_reservations_page(limit=10)
+        self.app.user_model.count_users(role='user')
+        self.app.reservation_model.count_reservations(status='active')
+        return True
+
+    def admin_stats(self, worker):
+        self.app.admin_stats_payload()
+        return True
+
+class ClientDriver:
+    # Full request path through the Flask test client. Sessions are written
+    # directly so the mix isn't dominated by password hashing.
+    def __init__(self, parkeasy):
+        self.app = parkeasy
+        self.admin_id = parkeasy.user_model.get_user_by_username('admin')['id']
+
+    def _client(self, worker, user_id, username, role):
+        if 'client' not in worker:
+            worker['client'] = self.app.app.test_client()
+        client = worker['client']
+        with client.session_transaction() as sess:
+            sess.clear()
+            sess.update(user_id=user_id, username=username, role=role)
+        return client
+
+    def _get(self, client, url):
+        return client.get(url).status_code < 400
+
+    def _timed_get(self, worker, user_id, url):
+        client = self._client(worker, user_id, f'bench-user-{user_id}', 'user')
+        start = time.perf_counter()
+        ok = self._get(client, url)
+        return ok, time.perf_counter() - start
+
+    def book(self, worker, user_id, lot_id):
+        ok, elapsed = self._timed_get(worker, user_id, f'/user/book/{lot_id}')
+        worker['pending_elapsed'] = elapsed
+        if not ok:
+            return False
+        # Find out which spot was assigned; not part of the timed request
+        active = self.app.reservation_model.get_active_reservation(user_id)
+        return active['spot_id'] if active else None
+
+    def release(self, worker, user_id, spot_id):
+        ok, elapsed = self._timed_get(worker, user_id, f'/user/release/{spot_id}')
+        worker['pending_elapsed'] = elapsed
+        # The view redirects either way; check the reservation was closed
+        return ok and self.app.reservation_model.get_active_reservation(user_id) is None
+
+    def user_dashboard(self, worker, user_id):
+        ok, elapsed = self._timed_get(worker, user_id, '/user/dashboard')
+        worker['pending_elapsed'] = elapsed
+        return ok
+
+    def admin_dashboard(self, worker):
+        client = self._client(worker, self.admin_id, 'admin', 'admin')
+        start = time.perf_counter()
+        ok = self._get(client, '/admin/dashboard')
+        worker['pending_elapsed'] = time.perf_counter() - start
+        return ok
+
+    def admin_stats(self, worker):
+        client = self._client(worker, self.admin_id, 'admin', 'admin')
+        start = time.perf_counter()
+        ok = self._get(client, '/api/admin/stats')
+        worker['pending_elapsed'] = time.perf_counter() - start
+        return ok
+
+DRIVERS = {'models': ModelDriver, 'client': ClientDriver}
+
+def load_state(db):
+    conn = db.get_connection()
+    lot_ids = [row[0] for row in conn.execute('SELECT id FROM parking_lots ORDER BY id').fetchall()]
+    user_ids = [row[0] for row in conn.execute(
+        "SELECT id FROM users WHERE role = 'user' ORDER BY id").fetchall()]
+    active = dict(conn.execute(
+        "SELECT user_id, spot_id FROM reservations WHERE status = 'active'").fetchall())
+    conn.close()
+    return lot_ids, user_ids, active
+
+def run_worker(driver, index, seed, mix, operations, lot_ids, users, active, results):
+    # users: the user ids owned by this worker; active: user_id -> spot_id
+    rng = random.Random(seed * 1000003 + index)
+    names = [name for name, weight in mix.items() if weight]
+    weights = [mix[name] for name in names]
+    parked = [user_id for user_id in users if user_id in active]
+    free = [user_id for user_id in users if user_id not in active]
+    worker = {}
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+
+    for _ in range(operations):
+        op = rng.choices(names, weights)[0]
+        # Fall back to the opposite write when no user is in the right state
+        if op == 'book' and not free:
+            op = 'release' if 'release' in latencies else 'user_dashboard'
+        elif op == 'release' and not parked:
+            op = 'book' if 'book' in latencies else 'user_dashboard'
+        if op not in latencies:
+            latencies[op] = []
+            errors[op] = 0
+
+        worker.pop('pending_elapsed', None)
+        start = time.perf_counter()
+        if op == 'book':
+            user_id = free[rng.randrange(len(free))]
+            spot_id = driver.book(worker, user_id, rng.choice(lot_ids))
+            ok = spot_id is not False
+            if spot_id:
+                free.remove(user_id)
+                parked.append(user_id)
+                active[user_id] = spot_id
+        elif op == 'release':
+            user_id = parked[rng.randrange(len(parked))]
+            ok = driver.release(worker, user_id, active[user_id])
+            if ok:
+                parked.remove(user_id)
+                free.append(user_id)
+                del active[user_id]
+        elif op == 'user_dashboard':
+            ok = driver.user_dashboard(worker, rng.choice(users))
+        else:
+            ok = getattr(driver, op)(worker)
+        elapsed = worker.pop('pending_elapsed', time.perf_counter() - start)
+
+        latencies[op].append(elapsed)
+        if not ok:
+            errors[op] += 1
+
+    results[index] = (latencies, errors)
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def summarize(latencies):
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'mean_ms': round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p90_ms': round(percentile(values, 90) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3) if values else 0.0
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a seeded mixed parking workload')
+    parser.add_argument('--driver', choices=sorted(DRIVERS), default='client')
+    parser.add_argument('--mix', choices=sorted(MIXES), default='default')
+    parser.add_argument('--operations', type=int, default=10000, help='total operations across workers')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--database', help='copy this datagen.py database instead of generating one')
+    parser.add_argument('--output', help='also write the JSON result to this file')
+    datagen.add_arguments(parser)
+    args = parser.parse_args()
+    database = os.path.abspath(args.database) if args.database else None
+    output_path = os.path.abspath(args.output) if args.output else None
+    cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # app.py opens parking_system.db in the working directory on import
+        os.chdir(tmp)
+        if database:
+            shutil.copy(database, 'parking_system.db')
+        import app as parkeasy
+
+        dataset = None
+        if not database:
+            dataset = datagen.generate(parkeasy.db, args.lots, args.spots, args.users,
+                                       args.reservations, args.occupancy, args.seed)
+
+        lot_ids, user_ids, active = load_state(parkeasy.db)
+        driver = DRIVERS[args.driver](parkeasy)
+        results = [None] * args.workers
+        per_worker = args.operations // args.workers
+        threads = [threading.Thread(target=run_worker, args=(
+            driver, i, args.seed, MIXES[args.mix], per_worker, lot_ids,
+            user_ids[i::args.workers], active, results)) for i in range(args.workers)]
+
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        latencies, errors = {}, {}
+        for worker_latencies, worker_errors in results:
+            for op, values in worker_latencies.items():
+                latencies.setdefault(op, []).extend(values)
+                errors[op] = errors.get(op, 0) + worker_errors[op]
+
+        total = sum(len(values) for values in latencies.values())
+        report = {
+            'commit': git_commit(),
+            'driver': args.driver,
+            'mix': args.mix,
+            'workers': args.workers,
+            'seed': args.seed,
+            'dataset': dataset or {'database': args.database},
+            'operations': total,
+            'errors': sum(errors.values()),
+            'seconds': round(elapsed, 3),
+            'ops_per_second': round(total / elapsed, 1) if elapsed else 0,
+            'overall': summarize([v for values in latencies.values() for v in values]),
+            'per_operation': {op: dict(summarize(values), errors=errors[op])
+                              for op, values in sorted(latencies.items())},
+            'pool': parkeasy.db.pool_stats()
+        }
+        parkeasy.db.pool.close_all()
+        os.chdir(cwd)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if output_path:
+        with open(output_path, 'w') as f:
+            f.write(output + '\n')
+
+if __name__ == '__main__':
+    main()
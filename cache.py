@@ -0,0 +1,254 @@
+import fnmatch
+import math
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from storage import ConnectionPool
+
+class CacheBackend:
+    # Minimal interface the models rely on. Values must be plain Python data
+    # (dicts, lists, numbers, strings) so shared backends can serialize them.
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+class LocalCache(CacheBackend):
+    # In-process TTL + LRU cache
+    def __init__(self, max_entries=1024, default_ttl=30.0):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'local',
+                'entries': len(self._data),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+class SharedCache(CacheBackend):
+    # Adapter for a shared store (e.g. a redis.Redis client) so every worker
+    # sees the same entries and invalidations. The client only needs
+    # get/set(ex=)/delete/scan_iter(match=); LRU eviction is left to the
+    # store itself.
+    def __init__(self, client, prefix='parkeasy:', default_ttl=30.0):
+        self.client = client
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        # The store counts expiry in whole seconds, and 0 is rejected
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=max(1, math.ceil(ttl)) if ttl else None)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        # Only this cache's keys; the store may hold others
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        for i in range(0, len(keys), 500):
+            self.client.delete(*keys[i:i + 500])
+
+    def stats(self):
+        with self._lock:
+            return {'backend': 'shared', 'hits': self.hits, 'misses': self.misses}
+
+class DictStore:
+    # Local stand-in for a shared store client, used for tests and single-node runs
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def scan_iter(self, match='*'):
+        with self._lock:
+            return [key for key in self._data if fnmatch.fnmatchcase(key, match)]
+
+class SQLiteCache(CacheBackend):
+    # Entries in a SQLite file opened by every worker process on the host, so
+    # they all see the same entries and invalidations without a separate
+    # server. Expired rows are skipped on read and deleted by purge().
+    def __init__(self, path, default_ttl=30.0, pool_size=4, timeout=5.0):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.pool = ConnectionPool(path, size=pool_size, timeout=timeout, cache_size_kb=2048, mmap_size=0)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        conn = self.pool.acquire()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    expires_at REAL
+                ) WITHOUT ROWID
+            ''')
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+
+    def _write(self, sql, params=()):
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.execute(sql, params)
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            self.pool.release(conn)
+
+    def get(self, key):
+        conn = self.pool.acquire()
+        try:
+            row = conn.execute('''
+                SELECT value FROM cache_entries WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)
+            ''', (key, time.time())).fetchone()
+        finally:
+            self.pool.release(conn)
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self._write('''
+            INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)
+        ''', (key, pickle.dumps(value), time.time() + ttl if ttl else None))
+
+    def delete(self, *keys):
+        if keys:
+            self._write(f"DELETE FROM cache_entries WHERE key IN ({','.join('?' * len(keys))})", keys)
+
+    def clear(self):
+        self._write('DELETE FROM cache_entries')
+
+    def purge(self):
+        # Drop expired entries; returns how many went
+        return self._write('DELETE FROM cache_entries WHERE expires_at <= ?', (time.time(),))
+
+    def stats(self):
+        conn = self.pool.acquire()
+        try:
+            entries = conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+        finally:
+            self.pool.release(conn)
+
+        with self._lock:
+            return {'backend': 'sqlite', 'path': self.path, 'entries': entries,
+                    'hits': self.hits, 'misses': self.misses}
+
+# Keys for cached lot reads. Every lot write drops the listing, the derived
+# stats payload and the affected lot's own entry.
+LOTS_KEY = 'lots:all'
+LOT_STATS_KEY = 'lots:stats'
+
+def lot_key(lot_id):
+    return f'lot:{lot_id}'
+
+def invalidate_lots(cache, *lot_ids):
+    if cache is None:
+        return
+    cache.delete(LOTS_KEY, LOT_STATS_KEY, *[lot_key(lot_id) for lot_id in lot_ids])
+
+# Analytics summaries are expensive full-history scans; they are cached per
+# filter with a TTL rather than invalidated on every booking
+def analytics_key(since, until, lot_id):
+    return f'analytics:{since or ""}:{until or ""}:{lot_id or ""}'
@@ -2,5 +2,139 @@ import os
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'parking-app-secret-key-2024'
-    DATABASE_PATH = 'parking_system.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    DATABASE_PATH = os.environ.get('DATABASE_PATH', 'parking_system.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Storage backend: 'sqlite' (built-in pool) or 'sqlalchemy' (SQLAlchemy's
+    # QueuePool; DATABASE_PATH may then be a sqlite:// URL). Replicas are a
+    # comma-separated list of copies of the primary that serve admin
+    # listings, exports and analytics.
+    DATABASE_BACKEND = os.environ.get('DATABASE_BACKEND', 'sqlite')
+    DATABASE_REPLICAS = [path.strip() for path in os.environ.get('DATABASE_REPLICAS', '').split(',') if path.strip()]
+
+    # SQLite connection pool
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+    DB_CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', 16384))
+    DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 256 * 1024 * 1024))
+
+    # Lot/stats read cache. LOT_CACHE_BACKEND takes the same backends as
+    # STATE_STORE below: 'memory' caches per process, so with several workers
+    # one may serve lots another just changed until LOT_CACHE_TTL runs out;
+    # 'sqlite' (LOT_CACHE_PATH) and 'shared' (LOT_CACHE_URL, else
+    # STATE_STORE_URL) share entries and invalidations between workers.
+    LOT_CACHE_BACKEND = os.environ.get('LOT_CACHE_BACKEND', 'memory')
+    LOT_CACHE_TTL = float(os.environ.get('LOT_CACHE_TTL', 30))
+    LOT_CACHE_SIZE = int(os.environ.get('LOT_CACHE_SIZE', 1024))
+    LOT_CACHE_PATH = os.environ.get('LOT_CACHE_PATH') or os.path.join(
+        '' if '://' in DATABASE_PATH else os.path.dirname(DATABASE_PATH), 'parking_cache.db')
+    LOT_CACHE_URL = os.environ.get('LOT_CACHE_URL', '')
+
+    # Server-side state. SESSION_BACKEND 'server' keeps sessions in the state
+    # store with only a signed id in the cookie ('cookie': Flask's signed
+    # cookie). The store also caches each user's role and active reservation
+    # for USER_STATE_TTL seconds (0: off). STATE_STORE is 'memory' (one
+    # process), 'sqlite' (STATE_STORE_PATH, shared by a host's workers) or
+    # 'shared' (a network cache at STATE_STORE_URL, in-process without one).
+    # The sqlite store sits next to the database file unless placed elsewhere.
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'cookie')
+    STATE_STORE = os.environ.get('STATE_STORE', 'sqlite')
+    STATE_STORE_PATH = os.environ.get('STATE_STORE_PATH') or os.path.join(
+        '' if '://' in DATABASE_PATH else os.path.dirname(DATABASE_PATH), 'parking_state.db')
+    STATE_STORE_URL = os.environ.get('STATE_STORE_URL', '')
+    STATE_STORE_SIZE = int(os.environ.get('STATE_STORE_SIZE', 100000))
+    USER_STATE_TTL = float(os.environ.get('USER_STATE_TTL', 300))
+
+    # Server-sent events
+    SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+
+    # Async (ASGI) serving mode
+    ASYNC_DB_WORKERS = int(os.environ.get('ASYNC_DB_WORKERS', 16))
+    ASYNC_WSGI_WORKERS = int(os.environ.get('ASYNC_WSGI_WORKERS', 16))
+
+    # Password hashing (werkzeug method string, e.g. 'pbkdf2:sha256:600000' or
+    # 'scrypt:32768:8:1'); existing hashes are upgraded at the next login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_SALT_LENGTH = int(os.environ.get('PASSWORD_SALT_LENGTH', 16))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))
+
+    # Login throttling
+    LOGIN_MAX_USER_FAILURES = int(os.environ.get('LOGIN_MAX_USER_FAILURES', 5))
+    LOGIN_MAX_IP_FAILURES = int(os.environ.get('LOGIN_MAX_IP_FAILURES', 30))
+    LOGIN_THROTTLE_WINDOW = int(os.environ.get('LOGIN_THROTTLE_WINDOW', 300))
+
+    # Opt-in instrumentation: /metrics in Prometheus text format, plus sampled
+    # cProfile dumps of slow requests when METRICS_PROFILE_DIR is set
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+    METRICS_PROFILE_DIR = os.environ.get('METRICS_PROFILE_DIR', '')
+    METRICS_PROFILE_SAMPLE_RATE = float(os.environ.get('METRICS_PROFILE_SAMPLE_RATE', 0.05))
+    METRICS_SLOW_REQUEST_MS = float(os.environ.get('METRICS_SLOW_REQUEST_MS', 500))
+
+    # Reservation analytics: memory budget per scan batch and result cache TTL
+    ANALYTICS_MEMORY_MB = int(os.environ.get('ANALYTICS_MEMORY_MB', 64))
+    ANALYTICS_CACHE_TTL = float(os.environ.get('ANALYTICS_CACHE_TTL', 300))
+
+    # Nearby-lot search grid cell size
+    LOT_INDEX_CELL_KM = float(os.environ.get('LOT_INDEX_CELL_KM', 1.0))
+
+    # Advance (time-slot) bookings
+    SLOT_MAX_HOURS = float(os.environ.get('SLOT_MAX_HOURS', 24))
+    SLOT_MAX_DAYS_AHEAD = int(os.environ.get('SLOT_MAX_DAYS_AHEAD', 30))
+    SLOT_WALKIN_BUFFER_MINUTES = int(os.environ.get('SLOT_WALKIN_BUFFER_MINUTES', 120))
+    SLOT_CHECKIN_EARLY_MINUTES = int(os.environ.get('SLOT_CHECKIN_EARLY_MINUTES', 15))
+
+    # Streaming reservation export (admin endpoint and CLI)
+    EXPORT_BATCH_ROWS = int(os.environ.get('EXPORT_BATCH_ROWS', 1000))
+    EXPORT_GZIP_LEVEL = int(os.environ.get('EXPORT_GZIP_LEVEL', 6))
+
+    # Archiving of completed reservations out of the live table. With
+    # ARCHIVE_DATABASE_PATH set the archive is a separate attached file.
+    ARCHIVE_DATABASE_PATH = os.environ.get('ARCHIVE_DATABASE_PATH', '')
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+    ARCHIVE_BATCH_ROWS = int(os.environ.get('ARCHIVE_BATCH_ROWS', 500))
+    ARCHIVE_BATCH_PAUSE_MS = float(os.environ.get('ARCHIVE_BATCH_PAUSE_MS', 50))
+
+    # Gate batch API: bearer token for gate hardware (admin sessions work
+    # too), batch size cap and how long idempotency keys are remembered
+    GATE_API_TOKEN = os.environ.get('GATE_API_TOKEN', '')
+    GATE_BATCH_MAX_OPS = int(os.environ.get('GATE_BATCH_MAX_OPS', 1000))
+    GATE_IDEMPOTENCY_TTL_HOURS = float(os.environ.get('GATE_IDEMPOTENCY_TTL_HOURS', 24))
+
+    # Rendered dashboard fragments (per lot and occupancy version) and the
+    # on-disk Jinja bytecode cache (default directory: the system temp dir)
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 512))
+    FRAGMENT_CACHE_TTL = float(os.environ.get('FRAGMENT_CACHE_TTL', 3600))
+    JINJA_BYTECODE_CACHE = os.environ.get('JINJA_BYTECODE_CACHE', '1') == '1'
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR', '')
+
+    # Background jobs (jobs.py): worker threads per process (0 runs none here;
+    # `flask run-jobs` runs whatever is due), idle poll interval, how long a
+    # claimed run may take before another process takes it over, retries for
+    # one-shot jobs and how long finished ones are kept
+    JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 2))
+    JOBS_POLL_SECONDS = float(os.environ.get('JOBS_POLL_SECONDS', 1))
+    JOBS_LEASE_SECONDS = float(os.environ.get('JOBS_LEASE_SECONDS', 600))
+    JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', 3))
+    JOBS_KEEP_HOURS = float(os.environ.get('JOBS_KEEP_HOURS', 24))
+
+    # Periodic job intervals; 0 switches a job off. VACUUM holds the write
+    # lock while it rebuilds the file, so it is off unless asked for.
+    DASHBOARD_STATS_SECONDS = float(os.environ.get('DASHBOARD_STATS_SECONDS', 60))
+    ARCHIVE_INTERVAL_HOURS = float(os.environ.get('ARCHIVE_INTERVAL_HOURS', 24))
+    ANALYZE_INTERVAL_HOURS = float(os.environ.get('ANALYZE_INTERVAL_HOURS', 24))
+    VACUUM_INTERVAL_HOURS = float(os.environ.get('VACUUM_INTERVAL_HOURS', 0))
+    REPLICA_SYNC_SECONDS = float(os.environ.get('REPLICA_SYNC_SECONDS', 300))
+
+    # Receipts for released spots are written here as JSON by a deferred
+    # job (unset: no receipts)
+    RECEIPT_DIR = os.environ.get('RECEIPT_DIR', '')
+
+    # Occupancy forecasts (hour-of-week rollups, rebuilt incrementally by the
+    # occupancy-rollup job) and dynamic pricing. PRICING_RULES is a list of
+    # forecast-occupancy:multiplier pairs on price_per_hour, e.g.
+    # '0.9:1.5,0.75:1.25,0:0.9'; unset keeps the static price.
+    PRICING_RULES = os.environ.get('PRICING_RULES', '')
+    PRICING_HORIZON_HOURS = int(os.environ.get('PRICING_HORIZON_HOURS', 2))
+    FORECAST_HISTORY_WEEKS = float(os.environ.get('FORECAST_HISTORY_WEEKS', 8))
+    FORECAST_DECAY_HOURS = float(os.environ.get('FORECAST_DECAY_HOURS', 1.5))
+    FORECAST_REFRESH_SECONDS = float(os.environ.get('FORECAST_REFRESH_SECONDS', 300))
+    FORECAST_ROLLUP_SECONDS = float(os.environ.get('FORECAST_ROLLUP_SECONDS', 900))
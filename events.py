@@ -0,0 +1,77 @@
+import json
+import queue
+import threading
+
+class EventBus:
+    # In-process pub/sub. Each subscriber gets its own bounded queue; a
+    # subscriber that falls behind has its backlog replaced by a single
+    # 'resync' event so it can reload a snapshot instead of blocking writers.
+    # Events only reach subscribers in the same worker process.
+    def __init__(self, max_queue=256):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.published = 0
+        self.resyncs = 0
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def add_listener(self, callback):
+        # Callbacks run on the publishing thread and must not block
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            self._listeners.remove(callback)
+
+    def publish(self, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            listeners = list(self._listeners)
+            self.published += 1
+
+        for callback in listeners:
+            callback(event, data)
+
+        for q in subscribers:
+            try:
+                q.put_nowait((event, data))
+            except queue.Full:
+                self._resync(q)
+
+    def _resync(self, q):
+        try:
+            while True:
+                q.get_nowait()
+        except queue.Empty:
+            pass
+        q.put_nowait(('resync', None))
+        with self._lock:
+            self.resyncs += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'resyncs': self.resyncs
+            }
+
+def format_sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+def publish_occupancy(events, occupancies):
+    if events is None:
+        return
+    for occupancy in occupancies:
+        events.publish('occupancy', occupancy)
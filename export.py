@@ -0,0 +1,56 @@
+# Streaming reservation export. Rows arrive from Reservation.iter_reservations
+# in fetchmany batches and each batch is encoded (and optionally gzipped)
+# into one chunk before the next is fetched, so memory use depends on the
+# batch size, not on how many rows the export covers.
+import csv
+import io
+import json
+import zlib
+
+FIELDS = ('id', 'user_id', 'username', 'lot_id', 'prime_location_name', 'spot_id', 'spot_number',
+          'parking_timestamp', 'leaving_timestamp', 'parking_cost', 'status')
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson')
+}
+
+def csv_chunks(batches, header=True):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(FIELDS)
+    for batch in batches:
+        writer.writerows([row[field] for field in FIELDS] for row in batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def ndjson_chunks(batches):
+    for batch in batches:
+        yield ''.join(json.dumps({field: row[field] for field in FIELDS}) + '\n'
+                      for row in batch).encode('utf-8')
+
+def gzip_chunks(chunks, level=6):
+    # One gzip member across the whole stream; only complete deflate output
+    # is yielded, so chunks stay roughly batch-sized after compression
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_chunks(batches, fmt='csv', compress=False, level=6):
+    chunks = csv_chunks(batches) if fmt == 'csv' else ndjson_chunks(batches)
+    return gzip_chunks(chunks, level) if compress else chunks
+
+def export_filename(fmt, compress=False, since=None, until=None, lot_id=None):
+    parts = ['reservations']
+    if lot_id:
+        parts.append(f'lot{lot_id}')
+    if since or until:
+        parts.append(f"{(since or 'start')[:10]}_{(until or 'now')[:10]}")
+    return '-'.join(parts) + '.' + FORMATS[fmt][1] + ('.gz' if compress else '')
@@ -0,0 +1,30 @@
+# Rendered-HTML cache for the per-lot parts of the dashboards. Keys carry the
+# lot's occupancy_version, which triggers bump on every change to the lot or
+# its spots, so a stale fragment is simply never looked up again and no
+# invalidation is needed; old versions age out of the LRU.
+from flask import render_template
+from markupsafe import Markup
+
+def fragment_key(template_name, lot, context):
+    extra = ':'.join(f'{name}={context[name]}' for name in sorted(context))
+    return f"fragment:{template_name}:{lot['id']}:{lot['occupancy_version']}:{extra}"
+
+class FragmentCache:
+    def __init__(self, cache, ttl=None):
+        self.cache = cache
+        self.ttl = ttl
+
+    def render(self, template_name, lot, load=None, **context):
+        # context values become part of the key, so keep them small scalars;
+        # load() supplies the heavy context (e.g. spot rows) on a miss only
+        key = fragment_key(template_name, lot, context)
+        html = self.cache.get(key)
+        if html is None:
+            if load is not None:
+                context.update(load())
+            html = render_template(template_name, lot=lot, **context)
+            self.cache.set(key, html, self.ttl)
+        return Markup(html)
+
+    def stats(self):
+        return self.cache.stats()
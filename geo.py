@@ -0,0 +1,187 @@
+# In-memory lookup of lots by location and pin code. Lots with coordinates
+# are bucketed into a uniform grid of roughly cell_km square cells; nearest
+# queries walk rings of cells outwards from the query point and stop as soon
+# as no unvisited cell can hold anything closer than the k-th hit. Pin codes
+# are kept in a sorted list so prefix lookups are a bisect plus a short walk.
+#
+# ParkingLot upserts/removes lots after its writes commit, and availability
+# follows the 'occupancy' events published on the EventBus (see on_event).
+import bisect
+import heapq
+import math
+import threading
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+class LotIndex:
+    def __init__(self, cell_km=1.0):
+        self.cell_km = cell_km
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self._lots = {}
+        self._cells = {}
+        self._pins = []
+        self._bounds = None
+        self._lock = threading.Lock()
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def load(self, lots):
+        for lot in lots:
+            self.upsert(lot)
+
+    def upsert(self, lot):
+        entry = {
+            'lot_id': lot['id'],
+            'name': lot['prime_location_name'],
+            'address': lot['address'],
+            'pin_code': lot['pin_code'],
+            'price_per_hour': lot['price_per_hour'],
+            'latitude': lot['latitude'],
+            'longitude': lot['longitude'],
+            'total_spots': lot['total_spots'] or 0,
+            'available_spots': lot['available_spots'] or 0
+        }
+        with self._lock:
+            self._remove(entry['lot_id'])
+            self._lots[entry['lot_id']] = entry
+            bisect.insort(self._pins, (entry['pin_code'], entry['lot_id']))
+            if entry['latitude'] is not None and entry['longitude'] is not None:
+                cell = self._cell(entry['latitude'], entry['longitude'])
+                self._cells.setdefault(cell, set()).add(entry['lot_id'])
+                self._extend_bounds(cell)
+
+    def remove(self, lot_id):
+        with self._lock:
+            self._remove(lot_id)
+
+    def _remove(self, lot_id):
+        entry = self._lots.pop(lot_id, None)
+        if entry is None:
+            return
+        i = bisect.bisect_left(self._pins, (entry['pin_code'], lot_id))
+        if i < len(self._pins) and self._pins[i] == (entry['pin_code'], lot_id):
+            del self._pins[i]
+        if entry['latitude'] is not None and entry['longitude'] is not None:
+            cell = self._cell(entry['latitude'], entry['longitude'])
+            members = self._cells.get(cell)
+            if members is not None:
+                members.discard(lot_id)
+                if not members:
+                    del self._cells[cell]
+
+    def _extend_bounds(self, cell):
+        # Cell-index extent of every lot ever indexed; only used to stop ring
+        # walks, so it never needs shrinking
+        if self._bounds is None:
+            self._bounds = [cell[0], cell[0], cell[1], cell[1]]
+        else:
+            self._bounds[0] = min(self._bounds[0], cell[0])
+            self._bounds[1] = max(self._bounds[1], cell[0])
+            self._bounds[2] = min(self._bounds[2], cell[1])
+            self._bounds[3] = max(self._bounds[3], cell[1])
+
+    def on_event(self, event, data):
+        # EventBus listener: keep availability in step with bookings
+        if event == 'occupancy':
+            with self._lock:
+                entry = self._lots.get(data['lot_id'])
+                if entry is not None:
+                    entry['total_spots'] = data['total_spots']
+                    entry['available_spots'] = data['available_spots']
+        elif event == 'lot_deleted':
+            self.remove(data['lot_id'])
+
+    def nearest(self, lat, lon, k=5, radius_km=None, min_available=1, pin_prefix=None):
+        with self._lock:
+            if self._bounds is None:
+                return []
+            ci, cj = self._cell(lat, lon)
+            min_i, max_i, min_j, max_j = self._bounds
+            max_ring = max(ci - min_i, max_i - ci, cj - min_j, max_j - cj)
+
+            # Narrowest cell side anywhere in the indexed area: longitude cells
+            # shrink towards the poles
+            widest_lat = max(abs(lat), abs(min_i * self.cell_deg), abs((max_i + 1) * self.cell_deg))
+            ring_km = self.cell_km * max(math.cos(math.radians(min(widest_lat, 89))), 0.01)
+
+            hits = []
+
+            def consider(lot_id):
+                entry = self._lots[lot_id]
+                if entry['available_spots'] < min_available:
+                    return
+                if pin_prefix and not entry['pin_code'].startswith(pin_prefix):
+                    return
+                distance = haversine_km(lat, lon, entry['latitude'], entry['longitude'])
+                if radius_km is not None and distance > radius_km:
+                    return
+                if len(hits) < k:
+                    heapq.heappush(hits, (-distance, lot_id))
+                elif distance < -hits[0][0]:
+                    heapq.heapreplace(hits, (-distance, lot_id))
+
+            first_ring = max(min_i - ci, ci - max_i, min_j - cj, cj - max_j, 0)
+            for ring in range(first_ring, max_ring + 1):
+                if 8 * ring > len(self._cells):
+                    # Rings are now bigger than the populated part of the
+                    # grid: visit the remaining populated cells directly
+                    for (i, j), members in self._cells.items():
+                        if max(abs(i - ci), abs(j - cj)) >= ring:
+                            for lot_id in members:
+                                consider(lot_id)
+                    break
+
+                for cell in self._ring(ci, cj, ring):
+                    for lot_id in self._cells.get(cell, ()):
+                        consider(lot_id)
+
+                # Everything in rings > `ring` is at least ring * ring_km away
+                bound = ring * ring_km
+                if len(hits) >= k and -hits[0][0] <= bound:
+                    break
+                if radius_km is not None and bound > radius_km:
+                    break
+
+            return [dict(self._lots[lot_id], distance_km=round(-neg, 3))
+                    for neg, lot_id in sorted(hits, reverse=True)]
+
+    def _ring(self, ci, cj, ring):
+        if ring == 0:
+            yield (ci, cj)
+            return
+        for j in range(cj - ring, cj + ring + 1):
+            yield (ci - ring, j)
+            yield (ci + ring, j)
+        for i in range(ci - ring + 1, ci + ring):
+            yield (i, cj - ring)
+            yield (i, cj + ring)
+
+    def by_pin_prefix(self, prefix, k=5, min_available=1):
+        # Lots whose pin code starts with prefix, most free spots first
+        with self._lock:
+            i = bisect.bisect_left(self._pins, (prefix,))
+            matches = []
+            while i < len(self._pins) and self._pins[i][0].startswith(prefix):
+                entry = self._lots[self._pins[i][1]]
+                if entry['available_spots'] >= min_available:
+                    matches.append(entry)
+                i += 1
+            return [dict(entry) for entry in heapq.nlargest(k, matches, key=lambda e: e['available_spots'])]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'lots': len(self._lots),
+                'located': sum(len(members) for members in self._cells.values()),
+                'cells': len(self._cells),
+                'cell_km': self.cell_km
+            }
@@ -0,0 +1,329 @@
+# Background jobs with their state in SQLite (the jobs table, migration 8),
+# so schedules and deferred work survive restarts and every worker process
+# shares one queue. A run is claimed by moving the job to 'running' with a
+# lease in a single UPDATE, so each run happens in one process only; a job
+# whose process died mid-run is picked up again when its lease runs out.
+# Job functions must therefore be safe to run twice.
+#
+#   periodic  every(name, seconds, fn): one row per name, rescheduled
+#             `seconds` after each run; its last result is kept (last_result)
+#   one-shot  defer(name, **payload) / enqueue(cursor, ...): run once as
+#             fn(**payload), retried with backoff, pruned after they finish
+#
+# A process only claims jobs it has a function registered for.
+import json
+import threading
+import time
+import traceback
+
+class JobScheduler:
+    def __init__(self, db, workers=2, poll_interval=1.0, lease=600, max_attempts=3, retry_delay=30):
+        self.db = db
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._tasks = {}
+        self._periodic = {}
+        self._synced = False
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.failures = 0
+
+    def task(self, name, fn):
+        # One-shot job function, called as fn(**payload)
+        self._tasks[name] = fn
+
+    def every(self, name, seconds, fn, delay=None):
+        # Periodic job, first due `delay` seconds (default: `seconds`) after
+        # it is first scheduled. seconds <= 0 switches it off.
+        self._tasks[name] = fn
+        self._periodic[name] = (seconds, seconds if delay is None else delay)
+        self._synced = False
+
+    def _sync_periodic(self):
+        # Bring the periodic rows in line with every() calls, writing only
+        # what changed, so a restart with the same schedule is a single read
+        if self._synced:
+            return
+        now = time.time()
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            names = list(self._periodic)
+            cursor.execute(f'''
+                SELECT name, interval_seconds FROM jobs
+                WHERE interval_seconds IS NOT NULL AND name IN ({','.join('?' * len(names))})
+            ''', names)
+            current = {row['name']: row['interval_seconds'] for row in cursor.fetchall()}
+
+            for name, (seconds, delay) in self._periodic.items():
+                if seconds <= 0:
+                    if name in current:
+                        cursor.execute('DELETE FROM jobs WHERE name = ? AND interval_seconds IS NOT NULL', (name,))
+                elif name not in current:
+                    cursor.execute('''
+                        INSERT INTO jobs (name, interval_seconds, run_at, created_at) VALUES (?, ?, ?, ?)
+                    ''', (name, seconds, now + delay, now))
+                elif current[name] != seconds:
+                    # A shorter interval takes effect now, a longer one after the next run
+                    cursor.execute('''
+                        UPDATE jobs SET interval_seconds = ?, run_at = MIN(run_at, ?)
+                        WHERE name = ? AND interval_seconds IS NOT NULL
+                    ''', (seconds, now + seconds, name))
+
+            conn.commit()
+            self._synced = True
+        except Exception as e:
+            conn.rollback()
+        finally:
+            conn.close()
+
+    def enqueue(self, cursor, name, delay=0, **payload):
+        # Add a one-shot job inside the caller's transaction: it only exists
+        # if that transaction commits. Call wake() after the commit.
+        now = time.time()
+        cursor.execute('''
+            INSERT INTO jobs (name, payload, run_at, created_at) VALUES (?, ?, ?, ?)
+        ''', (name, json.dumps(payload), now + delay, now))
+        return cursor.lastrowid
+
+    def defer(self, name, delay=0, **payload):
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            job_id = self.enqueue(cursor, name, delay, **payload)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return None
+        finally:
+            conn.close()
+
+        self.wake()
+        return job_id
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _claim(self):
+        # Returns (job, seconds until the next job is due). The read comes
+        # first so idle polls never take the write lock.
+        names = [name for name in self._tasks if self._periodic.get(name, (1,))[0] > 0]
+        if not names:
+            return None, self.poll_interval
+        params = {f'name{i}': name for i, name in enumerate(names)}
+        in_names = ', '.join(':' + key for key in params)
+        now = time.time()
+        params['now'] = now
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(f'''
+                SELECT MIN(CASE status WHEN 'pending' THEN run_at ELSE locked_until END) FROM jobs
+                WHERE status IN ('pending', 'running') AND name IN ({in_names})
+            ''', params)
+            next_at = cursor.fetchone()[0]
+            if next_at is None or next_at > now:
+                return None, self.poll_interval if next_at is None else min(next_at - now, self.poll_interval)
+
+            params['locked_until'] = now + self.lease
+            cursor.execute(f'''
+                UPDATE jobs SET status = 'running', locked_until = :locked_until, attempts = attempts + 1
+                WHERE id = (
+                    SELECT id FROM jobs WHERE name IN ({in_names}) AND (
+                        status = 'pending' AND run_at <= :now OR status = 'running' AND locked_until <= :now)
+                    ORDER BY run_at LIMIT 1)
+                RETURNING id, name, payload, interval_seconds, attempts, locked_until
+            ''', params)
+            job = cursor.fetchone()
+            conn.commit()
+            return (dict(job) if job else None), 0
+        except Exception as e:
+            conn.rollback()
+            return None, self.poll_interval
+        finally:
+            conn.close()
+
+    def _run(self, job):
+        fn = self._tasks[job['name']]
+        payload = json.loads(job['payload']) if job['payload'] else {}
+        try:
+            result = fn(**payload)
+            error = None
+        except Exception:
+            result = None
+            error = traceback.format_exc()
+
+        with self._lock:
+            self.runs += 1
+            self.failures += error is not None
+        self._finish(job, result, error)
+        return error is None
+
+    def _finish(self, job, result, error):
+        now = time.time()
+        if job['interval_seconds'] is not None:
+            # Periodic: next run one interval from now, success or not;
+            # attempts counts consecutive failures
+            status, run_at = 'pending', now + job['interval_seconds']
+        elif error is None:
+            status, run_at = 'done', None
+        elif job['attempts'] < self.max_attempts:
+            status, run_at = 'pending', now + self.retry_delay * 2 ** (job['attempts'] - 1)
+        else:
+            status, run_at = 'failed', None
+
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            # Only while the lease is still ours; otherwise another process
+            # has taken the job over and will record its own run
+            cursor.execute(f'''
+                UPDATE jobs SET status = ?, run_at = COALESCE(?, run_at), locked_until = NULL,
+                    attempts = {'0' if error is None else 'attempts'},
+                    result = COALESCE(?, result), last_error = ?, finished_at = ?
+                WHERE id = ? AND status = 'running' AND locked_until = ?
+            ''', (status, run_at, None if error else json.dumps(result, default=str), error, now,
+                  job['id'], job['locked_until']))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+        finally:
+            conn.close()
+
+    def run_pending(self, max_jobs=None):
+        # Run due jobs in this thread until none are left (or max_jobs have
+        # run). Returns (succeeded, failed).
+        self._sync_periodic()
+        succeeded = failed = 0
+        while max_jobs is None or succeeded + failed < max_jobs:
+            job, _ = self._claim()
+            if job is None:
+                break
+            if self._run(job):
+                succeeded += 1
+            else:
+                failed += 1
+        return succeeded, failed
+
+    def trigger(self, name):
+        # Make a periodic job due now
+        self._sync_periodic()
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                UPDATE jobs SET run_at = ? WHERE name = ? AND interval_seconds IS NOT NULL AND status = 'pending'
+            ''', (time.time(), name))
+            conn.commit()
+            triggered = cursor.rowcount > 0
+        except Exception as e:
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+
+        self.wake()
+        return triggered
+
+    def last_result(self, name, max_age=None):
+        # Result of the last successful run of a periodic job, or None if it
+        # hasn't run yet (or not within max_age seconds)
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT result, finished_at FROM jobs WHERE name = ? AND interval_seconds IS NOT NULL
+            ''', (name,))
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+
+        if row is None or row['result'] is None:
+            return None
+        if max_age is not None and row['finished_at'] < time.time() - max_age:
+            return None
+        return json.loads(row['result'])
+
+    def prune(self, older_than=86400):
+        # Drop finished one-shot jobs; returns how many went
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                DELETE FROM jobs WHERE interval_seconds IS NULL AND status IN ('done', 'failed') AND finished_at < ?
+            ''', (time.time() - older_than,))
+            conn.commit()
+            return cursor.rowcount
+        except Exception as e:
+            conn.rollback()
+            return None
+        finally:
+            conn.close()
+
+    def _worker(self):
+        while not self._stopping.is_set():
+            job, wait = self._claim()
+            if job is not None:
+                self._run(job)
+                continue
+            if self._wakeup.wait(wait):
+                self._wakeup.clear()
+
+    def start(self):
+        # Safe to call on every request; only the first call starts workers
+        if self._threads or not self.workers:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            self._sync_periodic()
+            self._stopping.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'parkeasy-jobs-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        # Waits for running jobs to finish
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def stats(self):
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT status, COUNT(*) FROM jobs WHERE interval_seconds IS NULL GROUP BY status
+            ''')
+            queued = {row[0]: row[1] for row in cursor.fetchall()}
+            cursor.execute('''
+                SELECT name, interval_seconds, status, run_at, finished_at, attempts, last_error
+                FROM jobs WHERE interval_seconds IS NOT NULL ORDER BY name
+            ''')
+            periodic = [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+        with self._lock:
+            return {
+                'workers': len(self._threads),
+                'runs': self.runs,
+                'failures': self.failures,
+                'queued': queued,
+                'periodic': periodic
+            }
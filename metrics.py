@@ -0,0 +1,290 @@
+# Opt-in instrumentation (Config.METRICS_ENABLED). Nothing in this module is
+# wired into the request or query path unless install_metrics() is called, so
+# the disabled case costs nothing.
+import cProfile
+import datetime
+import functools
+import os
+import random
+import re
+import threading
+import time
+
+from flask import Response, g, request
+
+from storage import PooledConnection
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class Metrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, help_text):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name, labels=(), amount=1):
+        with self._lock:
+            key = (name, labels)
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            key = (name, labels)
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = entry[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def add_collector(self, collector):
+        # collector() returns [(name, labels, value)] read at scrape time
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        samples = counters + sorted(
+            ((name, labels), value) for collector in self._collectors
+            for name, labels, value in collector())
+
+        seen = set()
+
+        def header(name):
+            if name not in seen:
+                seen.add(name)
+                kind, help_text = self._help.get(name, ('untyped', name))
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in samples:
+            header(name)
+            lines.append(f'{name}{format_labels(labels)} {value}')
+
+        for (name, labels), (counts, total, count) in histograms:
+            header(name)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", repr(bound)),))} {cumulative}')
+            lines.append(f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = (f'{key}="{escape_label(value)}"' for key, value in labels)
+    return '{' + ','.join(pairs) + '}'
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# SQL instrumentation: connections handed out by the pool are wrapped so every
+# cursor records per-statement timings and rows fetched, attributed to the
+# model method currently running on this thread
+
+_current = threading.local()
+
+def current_method():
+    return getattr(_current, 'method', 'unknown')
+
+_VERB = re.compile(r'^\s*(\w+)')
+_TOKEN = re.compile(r"'(?:[^']|'')*'|\(|\)|\w+")
+_CTE_VERBS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE'}
+
+def statement_verb(sql):
+    match = _VERB.match(sql)
+    if not match:
+        return 'OTHER'
+    verb = match.group(1).upper()
+    if verb != 'WITH':
+        return verb
+    # WITH [RECURSIVE] name(cols) AS (...), ...: the statement's own verb is
+    # the first one outside every parenthesis
+    depth = 0
+    for token in _TOKEN.findall(sql, match.end()):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth == 0 and token.upper() in _CTE_VERBS:
+            return token.upper()
+    return 'OTHER'
+
+class InstrumentedCursor:
+    def __init__(self, cursor, metrics):
+        self._cursor = cursor
+        self._metrics = metrics
+        self._labels = ()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    @property
+    def row_factory(self):
+        return self._cursor.row_factory
+
+    @row_factory.setter
+    def row_factory(self, factory):
+        self._cursor.row_factory = factory
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._metrics.inc('parkeasy_sql_rows_total', self._labels)
+            yield row
+
+    def _timed(self, fn, sql, *args):
+        self._labels = (('method', current_method()), ('statement', statement_verb(sql)))
+        start = time.perf_counter()
+        try:
+            fn(sql, *args)
+        finally:
+            self._metrics.observe('parkeasy_sql_seconds', self._labels, time.perf_counter() - start)
+        return self
+
+    def execute(self, sql, params=()):
+        return self._timed(self._cursor.execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._timed(self._cursor.executemany, sql, seq_of_params)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._metrics.inc('parkeasy_sql_rows_total', self._labels)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._metrics.inc('parkeasy_sql_rows_total', self._labels, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._metrics.inc('parkeasy_sql_rows_total', self._labels, len(rows))
+        return rows
+
+class InstrumentedConnection(PooledConnection):
+    def __init__(self, pool, conn, metrics):
+        super().__init__(pool, conn)
+        self._metrics = metrics
+
+    def cursor(self):
+        return InstrumentedCursor(self._conn.cursor(), self._metrics)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+def instrument_database(db, metrics):
+    def get_connection():
+        return InstrumentedConnection(db.pool, db.pool.acquire(), metrics)
+
+    def get_read_connection():
+        pool = db.read_pool()
+        return InstrumentedConnection(pool, pool.acquire(), metrics)
+
+    db.get_connection = get_connection
+    db.get_read_connection = get_read_connection
+
+    def pool_samples():
+        stats = db.pool_stats()
+        return [
+            ('parkeasy_db_connections_opened_total', (), stats['misses']),
+            ('parkeasy_db_connection_reuses_total', (), stats['hits']),
+            ('parkeasy_db_connection_waits_total', (), stats['waits']),
+            ('parkeasy_db_connections_open', (), stats['open']),
+        ]
+
+    metrics.add_collector(pool_samples)
+
+def instrument_model(model, metrics):
+    # Wrap the public methods on this instance only; the class stays untouched
+    prefix = type(model).__name__
+    for name in dir(type(model)):
+        if name.startswith('_') or not callable(getattr(type(model), name)):
+            continue
+        setattr(model, name, _timed_method(getattr(model, name), f'{prefix}.{name}', metrics))
+
+def _timed_method(method, label, metrics):
+    labels = (('method', label),)
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_current, 'method', None)
+        _current.method = label
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            metrics.observe('parkeasy_model_call_seconds', labels, time.perf_counter() - start)
+            if previous is None:
+                del _current.method
+            else:
+                _current.method = previous
+
+    return wrapper
+
+# Flask hooks: per-route latency and sampled cProfile dumps of slow requests
+
+def install_metrics(app, db, models, metrics, profile_dir=None, profile_sample_rate=0.0,
+                    slow_request_ms=500):
+    metrics.describe('parkeasy_request_seconds', 'histogram', 'Request latency by endpoint and status')
+    metrics.describe('parkeasy_model_call_seconds', 'histogram', 'Model method latency')
+    metrics.describe('parkeasy_sql_seconds', 'histogram', 'SQL statement latency by model method and verb')
+    metrics.describe('parkeasy_sql_rows_total', 'counter', 'Rows fetched by model method and verb')
+    metrics.describe('parkeasy_slow_profiles_total', 'counter', 'cProfile dumps written for slow requests')
+    metrics.describe('parkeasy_db_connections_opened_total', 'counter', 'SQLite connections opened')
+    metrics.describe('parkeasy_db_connection_reuses_total', 'counter', 'Pooled connections reused')
+    metrics.describe('parkeasy_db_connection_waits_total', 'counter', 'Waits for a free pooled connection')
+    metrics.describe('parkeasy_db_connections_open', 'gauge', 'SQLite connections currently open')
+
+    instrument_database(db, metrics)
+    for model in models:
+        instrument_model(model, metrics)
+
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+        if profile_dir and random.random() < profile_sample_rate:
+            g.metrics_profiler = cProfile.Profile()
+            g.metrics_profiler.enable()
+
+    @app.after_request
+    def record_request(response):
+        elapsed = time.perf_counter() - g.pop('metrics_start', time.perf_counter())
+        labels = (('endpoint', request.endpoint or 'unmatched'), ('status', str(response.status_code)))
+        metrics.observe('parkeasy_request_seconds', labels, elapsed)
+
+        profiler = g.pop('metrics_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            if elapsed * 1000 >= slow_request_ms:
+                filename = f'{datetime.datetime.now():%Y%m%d-%H%M%S-%f}-{request.endpoint or "unmatched"}-{int(elapsed * 1000)}ms.prof'
+                profiler.dump_stats(os.path.join(profile_dir, filename))
+                metrics.inc('parkeasy_slow_profiles_total')
+        return response
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -1,98 +1,514 @@
 import sqlite3
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+import json
+from werkzeug.security import generate_password_hash
+from datetime import datetime, timezone
+from cache import LOTS_KEY, lot_key, invalidate_lots
+from events import publish_occupancy
+from occupancy import LotBitmap
+from records import LOT_COLUMNS, Lot, SpotCell, ReservationSummary, fetch_records
+from security import PasswordHasher
+from storage import PooledConnection, create_pool
+import itertools
+import time
 import os
 
-class Database:
-    def __init__(self, db_path='parking_system.db'):
-        self.db_path = db_path
-        self.init_db()
-
-    def get_connection(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
-
-    def init_db(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Create users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
+# Schema migrations, applied in order on top of the base tables created by
+# init_db. PRAGMA user_version records the last applied migration number.
+MIGRATIONS = [
+    # 1: indexes for the hot spot/reservation predicates
+    [
+        'CREATE INDEX IF NOT EXISTS idx_spots_lot_status_number ON parking_spots (lot_id, status, spot_number)',
+        'CREATE INDEX IF NOT EXISTS idx_spots_lot_number ON parking_spots (lot_id, spot_number)',
+        'CREATE INDEX IF NOT EXISTS idx_reservations_user_status ON reservations (user_id, status)',
+        'CREATE INDEX IF NOT EXISTS idx_reservations_user_parking ON reservations (user_id, parking_timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_reservations_spot_status ON reservations (spot_id, status)',
+        'CREATE INDEX IF NOT EXISTS idx_reservations_parking_timestamp ON reservations (parking_timestamp)',
+        # At most one active reservation per user and per spot
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_reservations_active_user ON reservations (user_id) WHERE status = 'active'",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_reservations_active_spot ON reservations (spot_id) WHERE status = 'active'",
+    ],
+    # 2: per-lot occupancy counters maintained by triggers on parking_spots
+    [
+        'ALTER TABLE parking_lots ADD COLUMN total_spots INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE parking_lots ADD COLUMN available_spots INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE parking_lots ADD COLUMN occupied_spots INTEGER NOT NULL DEFAULT 0',
+        '''
+            UPDATE parking_lots SET
+                total_spots = (SELECT COUNT(*) FROM parking_spots WHERE lot_id = parking_lots.id),
+                available_spots = (SELECT COUNT(*) FROM parking_spots WHERE lot_id = parking_lots.id AND status = 'A'),
+                occupied_spots = (SELECT COUNT(*) FROM parking_spots WHERE lot_id = parking_lots.id AND status = 'O')
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_spots_counters_insert AFTER INSERT ON parking_spots
+            BEGIN
+                UPDATE parking_lots SET
+                    total_spots = total_spots + 1,
+                    available_spots = available_spots + (NEW.status = 'A'),
+                    occupied_spots = occupied_spots + (NEW.status = 'O')
+                WHERE id = NEW.lot_id;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_spots_counters_delete AFTER DELETE ON parking_spots
+            BEGIN
+                UPDATE parking_lots SET
+                    total_spots = total_spots - 1,
+                    available_spots = available_spots - (OLD.status = 'A'),
+                    occupied_spots = occupied_spots - (OLD.status = 'O')
+                WHERE id = OLD.lot_id;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_spots_counters_update AFTER UPDATE OF status, lot_id ON parking_spots
+            WHEN OLD.status IS NOT NEW.status OR OLD.lot_id IS NOT NEW.lot_id
+            BEGIN
+                UPDATE parking_lots SET
+                    total_spots = total_spots - 1,
+                    available_spots = available_spots - (OLD.status = 'A'),
+                    occupied_spots = occupied_spots - (OLD.status = 'O')
+                WHERE id = OLD.lot_id;
+                UPDATE parking_lots SET
+                    total_spots = total_spots + 1,
+                    available_spots = available_spots + (NEW.status = 'A'),
+                    occupied_spots = occupied_spots + (NEW.status = 'O')
+                WHERE id = NEW.lot_id;
+            END
+        ''',
+    ],
+    # 3: keyset pagination orderings for admin listings
+    [
+        'CREATE INDEX IF NOT EXISTS idx_users_role_created ON users (role, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_users_created ON users (created_at)',
+    ],
+    # 4: lot coordinates for nearby search, and pin code lookups
+    [
+        'ALTER TABLE parking_lots ADD COLUMN latitude REAL',
+        'ALTER TABLE parking_lots ADD COLUMN longitude REAL',
+        'CREATE INDEX IF NOT EXISTS idx_lots_pin_code ON parking_lots (pin_code)',
+    ],
+    # 5: advance bookings of a spot for a time window (status booked,
+    # checked_in or cancelled)
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS slot_bookings (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                role TEXT NOT NULL DEFAULT 'user',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                spot_id INTEGER NOT NULL,
+                lot_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                start_at TIMESTAMP NOT NULL,
+                end_at TIMESTAMP NOT NULL,
+                status TEXT NOT NULL DEFAULT 'booked',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (spot_id) REFERENCES parking_spots (id) ON DELETE CASCADE,
+                FOREIGN KEY (lot_id) REFERENCES parking_lots (id) ON DELETE CASCADE,
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
             )
-        ''')
-        
-        # Create parking_lots table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS parking_lots (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                prime_location_name TEXT NOT NULL,
-                address TEXT NOT NULL,
-                pin_code TEXT NOT NULL,
-                price_per_hour REAL NOT NULL,
-                maximum_number_of_spots INTEGER NOT NULL,
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_slot_bookings_spot_end ON slot_bookings (spot_id, end_at) WHERE status != 'cancelled'",
+        'CREATE INDEX IF NOT EXISTS idx_slot_bookings_user_start ON slot_bookings (user_id, start_at)',
+    ],
+    # 6: results of gate batch operations by idempotency key, so a retried
+    # batch replays them instead of applying them twice
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS gate_operations (
+                key TEXT PRIMARY KEY,
+                lot_id INTEGER,
+                result TEXT NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
-        ''')
-        
-        # Create parking_spots table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS parking_spots (
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_gate_operations_created ON gate_operations (created_at)',
+    ],
+    # 7: per-lot version bumped whenever the lot or any of its spots changes,
+    # so rendered fragments can be cached by (lot, version)
+    [
+        'ALTER TABLE parking_lots ADD COLUMN occupancy_version INTEGER NOT NULL DEFAULT 0',
+        'DROP TRIGGER IF EXISTS trg_spots_counters_insert',
+        'DROP TRIGGER IF EXISTS trg_spots_counters_delete',
+        'DROP TRIGGER IF EXISTS trg_spots_counters_update',
+        '''
+            CREATE TRIGGER trg_spots_counters_insert AFTER INSERT ON parking_spots
+            BEGIN
+                UPDATE parking_lots SET
+                    total_spots = total_spots + 1,
+                    available_spots = available_spots + (NEW.status = 'A'),
+                    occupied_spots = occupied_spots + (NEW.status = 'O'),
+                    occupancy_version = occupancy_version + 1
+                WHERE id = NEW.lot_id;
+            END
+        ''',
+        '''
+            CREATE TRIGGER trg_spots_counters_delete AFTER DELETE ON parking_spots
+            BEGIN
+                UPDATE parking_lots SET
+                    total_spots = total_spots - 1,
+                    available_spots = available_spots - (OLD.status = 'A'),
+                    occupied_spots = occupied_spots - (OLD.status = 'O'),
+                    occupancy_version = occupancy_version + 1
+                WHERE id = OLD.lot_id;
+            END
+        ''',
+        '''
+            CREATE TRIGGER trg_spots_counters_update AFTER UPDATE OF status, lot_id ON parking_spots
+            WHEN OLD.status IS NOT NEW.status OR OLD.lot_id IS NOT NEW.lot_id
+            BEGIN
+                UPDATE parking_lots SET
+                    total_spots = total_spots - 1,
+                    available_spots = available_spots - (OLD.status = 'A'),
+                    occupied_spots = occupied_spots - (OLD.status = 'O'),
+                    occupancy_version = occupancy_version + 1
+                WHERE id = OLD.lot_id;
+                UPDATE parking_lots SET
+                    total_spots = total_spots + 1,
+                    available_spots = available_spots + (NEW.status = 'A'),
+                    occupied_spots = occupied_spots + (NEW.status = 'O'),
+                    occupancy_version = occupancy_version + 1
+                WHERE id = NEW.lot_id;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_lots_version AFTER UPDATE OF
+                prime_location_name, address, pin_code, price_per_hour, maximum_number_of_spots, latitude, longitude
+            ON parking_lots
+            BEGIN
+                UPDATE parking_lots SET occupancy_version = occupancy_version + 1 WHERE id = NEW.id;
+            END
+        ''',
+    ],
+    # 8: background job queue (jobs.py); times are epoch seconds. Periodic
+    # jobs have an interval and one row per name.
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS jobs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                payload TEXT,
+                interval_seconds REAL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                run_at REAL NOT NULL,
+                locked_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                finished_at REAL
+            )
+        ''',
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_jobs_periodic_name ON jobs (name) WHERE interval_seconds IS NOT NULL',
+        'CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs (status, run_at)',
+    ],
+    # 9: dynamic pricing (pricing.py): the hourly rate quoted at booking,
+    # and per-lot occupied hours by hour of the week with the rollup's
+    # watermark (epoch seconds)
+    [
+        'ALTER TABLE reservations ADD COLUMN hourly_rate REAL',
+        'CREATE INDEX IF NOT EXISTS idx_reservations_leaving_timestamp ON reservations (leaving_timestamp)',
+        '''
+            CREATE TABLE IF NOT EXISTS occupancy_rollups (
                 lot_id INTEGER NOT NULL,
-                spot_number INTEGER NOT NULL,
-                status TEXT NOT NULL DEFAULT 'A',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                hour_of_week INTEGER NOT NULL,
+                occupied_hours REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (lot_id, hour_of_week),
                 FOREIGN KEY (lot_id) REFERENCES parking_lots (id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS occupancy_rollup_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                since INTEGER NOT NULL,
+                watermark INTEGER NOT NULL
             )
-        ''')
-        
-        # Create reservations table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS reservations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                spot_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                parking_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                leaving_timestamp TIMESTAMP NULL,
-                parking_cost REAL DEFAULT 0,
-                status TEXT NOT NULL DEFAULT 'active',
-                FOREIGN KEY (spot_id) REFERENCES parking_spots (id) ON DELETE CASCADE,
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-            )
-        ''')
-        
-        conn.commit()
-        
-        # Create default admin user if not exists
-        cursor.execute('SELECT COUNT(*) FROM users WHERE role = "admin"')
-        admin_count = cursor.fetchone()[0]
+        ''',
+    ],
+]
+
+# Cold tier for completed reservations. Same columns as reservations and the
+# same ids, but no foreign keys so it can live in a separate attached file.
+ARCHIVE_SCHEMA = [
+    '''
+        CREATE TABLE IF NOT EXISTS {schema}.reservations_archive (
+            id INTEGER PRIMARY KEY,
+            spot_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            parking_timestamp TIMESTAMP,
+            leaving_timestamp TIMESTAMP,
+            parking_cost REAL DEFAULT 0,
+            status TEXT NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_reservations_archive_user_parking ON reservations_archive (user_id, parking_timestamp)',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_reservations_archive_parking_timestamp ON reservations_archive (parking_timestamp)',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_reservations_archive_leaving_timestamp ON reservations_archive (leaving_timestamp)',
+]
+
+class Database:
+    def __init__(self, db_path='parking_system.db', pool_size=8, cache_size_kb=16384, mmap_size=268435456,
+                 archive_path=None, backend='sqlite', replicas=None):
+        self.db_path = db_path
+        # Archived reservations go to a separate attached file when
+        # archive_path is set, otherwise to a table in the main file
+        self.archive_path = archive_path
+        self.archive_table = ('archive' if archive_path else 'main') + '.reservations_archive'
+        self.backend = backend
+        options = dict(size=pool_size, cache_size_kb=cache_size_kb, mmap_size=mmap_size,
+                       attach={'archive': archive_path} if archive_path else None)
+        self.pool = create_pool(backend, db_path, **options)
+        # Read replicas (paths or URLs of copies of db_path) take the reads
+        # that can lag behind the primary; see get_read_connection
+        self.replica_pools = [create_pool(backend, replica, read_only=True, **options) for replica in replicas or ()]
+        self._replica_turn = itertools.count()
+        self.init_db()
+        # Only replicas holding the current schema take reads; the others
+        # (never synced yet) are checked again every replica_recheck seconds
+        self.replica_recheck = 5.0
+        self.check_replicas()
+
+    def get_connection(self):
+        return PooledConnection(self.pool, self.pool.acquire())
+
+    def check_replicas(self):
+        self._replicas_checked_at = time.monotonic()
+        self.ready_replicas = [pool for pool in self.replica_pools if self.schema_current(pool)]
+        return len(self.ready_replicas)
+
+    def read_pool(self):
+        # Ready replicas in turn, or the primary when there are none
+        if (len(self.ready_replicas) < len(self.replica_pools)
+                and time.monotonic() - self._replicas_checked_at >= self.replica_recheck):
+            self.check_replicas()
+        ready = self.ready_replicas
+        if not ready:
+            return self.pool
+        return ready[next(self._replica_turn) % len(ready)]
+
+    def get_read_connection(self):
+        # For admin listings, exports and analytics, which can be a little
+        # behind. Anything a user has just changed (their booking, their
+        # history, lot occupancy) is read through get_connection.
+        pool = self.read_pool()
+        return PooledConnection(pool, pool.acquire())
+
+    def sync_replicas(self):
+        # Local stand-in for replication: copy the primary (and nothing
+        # else) into each replica file with SQLite's online backup API.
+        # Real replicas are kept current by the database server instead.
+        source = sqlite3.connect(self.pool.db_path)
+        try:
+            for pool in self.replica_pools:
+                target = sqlite3.connect(pool.db_path)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+        finally:
+            source.close()
+        self.check_replicas()
+        return len(self.replica_pools)
+
+    def pool_stats(self):
+        stats = dict(self.pool.stats(), backend=self.backend)
+        if self.replica_pools:
+            stats['replicas'] = [dict(pool.stats(), ready=pool in self.ready_replicas) for pool in self.replica_pools]
+        return stats
+
+    def schema_version(self):
+        conn = self.get_connection()
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+        finally:
+            conn.close()
+        return version
+
+    def migrate(self):
+        conn = self.get_connection()
+        cursor = conn.cursor()
         
-        if admin_count == 0:
-            admin_password = generate_password_hash('admin123')
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            version = cursor.execute('PRAGMA user_version').fetchone()[0]
+            
+            for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute(f'PRAGMA user_version = {number}')
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def schema_current(self, pool=None):
+        # True when every migration is applied and the archive table exists
+        # (its file may be new), i.e. init_db has nothing to do. With a
+        # replica's pool: whether that replica has been synced; one that
+        # can't be read counts as not synced.
+        schema, table = self.archive_table.split('.')
+        pool = pool or self.pool
+        try:
+            conn = PooledConnection(pool, pool.acquire())
+        except sqlite3.Error:
+            return False
+        cursor = conn.cursor()
+        try:
+            version = cursor.execute('PRAGMA user_version').fetchone()[0]
+            cursor.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (table,))
+            archived = cursor.fetchone() is not None
+        except sqlite3.Error:
+            return False
+        finally:
+            conn.close()
+        return version >= len(MIGRATIONS) and archived
+    
+    def analyze(self, analysis_limit=1000):
+        # Refresh planner statistics; analysis_limit caps the rows sampled
+        # per index so this stays quick on large tables
+        conn = self.get_connection()
+        try:
+            conn.execute(f'PRAGMA analysis_limit = {int(analysis_limit)}')
+            conn.execute('ANALYZE')
+            conn.commit()
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        finally:
+            conn.close()
+    
+    def vacuum(self):
+        # Rebuild the database files to return free pages to the OS. Holds
+        # the write lock for the whole rebuild.
+        conn = self.get_connection()
+        try:
+            conn.execute('VACUUM main')
+            if self.archive_path:
+                conn.execute('VACUUM archive')
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        finally:
+            conn.close()
+    
+    def explain_query_plan(self, sql, params=()):
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row['detail'] for row in cursor.fetchall()]
+        finally:
+            conn.close()
+        return plan
+
+    def init_db(self):
+        # An up-to-date database only costs the version check; the DDL and
+        # the default admin seeding run when the schema is new or behind
+        if not self.schema_current():
+            self.create_schema()
+    
+    def create_schema(self):
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            
+            # Create users table
             cursor.execute('''
-                INSERT INTO users (username, email, password_hash, role) 
-                VALUES (?, ?, ?, ?)
-            ''', ('admin', 'admin@parking.com', admin_password, 'admin'))
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    email TEXT UNIQUE NOT NULL,
+                    password_hash TEXT NOT NULL,
+                    role TEXT NOT NULL DEFAULT 'user',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Create parking_lots table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS parking_lots (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    prime_location_name TEXT NOT NULL,
+                    address TEXT NOT NULL,
+                    pin_code TEXT NOT NULL,
+                    price_per_hour REAL NOT NULL,
+                    maximum_number_of_spots INTEGER NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Create parking_spots table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS parking_spots (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    lot_id INTEGER NOT NULL,
+                    spot_number INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'A',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (lot_id) REFERENCES parking_lots (id) ON DELETE CASCADE
+                )
+            ''')
+            
+            # Create reservations table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS reservations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    spot_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    parking_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    leaving_timestamp TIMESTAMP NULL,
+                    parking_cost REAL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'active',
+                    FOREIGN KEY (spot_id) REFERENCES parking_spots (id) ON DELETE CASCADE,
+                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+                )
+            ''')
+            
+            conn.commit()
+            
+            # Create default admin user if not exists
+            cursor.execute('SELECT COUNT(*) FROM users WHERE role = "admin"')
+            admin_count = cursor.fetchone()[0]
+            
+            if admin_count == 0:
+                admin_password = generate_password_hash('admin123')
+                cursor.execute('''
+                    INSERT INTO users (username, email, password_hash, role) 
+                    VALUES (?, ?, ?, ?)
+                ''', ('admin', 'admin@parking.com', admin_password, 'admin'))
+                conn.commit()
+            
+            # Archive table, in whichever file holds it
+            schema = self.archive_table.split('.')[0]
+            for statement in ARCHIVE_SCHEMA:
+                cursor.execute(statement.format(schema=schema))
             conn.commit()
+            
+        finally:
+            conn.close()
         
-        conn.close()
+        self.migrate()
+
+def read_occupancy(cursor, events, *lot_ids):
+    # Read inside the write transaction so published counts match the commit
+    if events is None:
+        return []
+    occupancies = []
+    for lot_id in lot_ids:
+        cursor.execute('''
+            SELECT id as lot_id, total_spots, available_spots, occupied_spots
+            FROM parking_lots WHERE id = ?
+        ''', (lot_id,))
+        row = cursor.fetchone()
+        if row:
+            occupancies.append(dict(row))
+    return occupancies
 
 class User:
-    def __init__(self, db):
+    def __init__(self, db, hasher=None):
         self.db = db
+        self.hasher = hasher or PasswordHasher()
     
     def create_user(self, username, email, password, role='user'):
+        password_hash = self.hasher.hash(password)
         conn = self.db.get_connection()
         cursor = conn.cursor()
-        password_hash = generate_password_hash(password)
         
         try:
             cursor.execute('''
@@ -108,47 +524,174 @@ class User:
     
     def get_user_by_username(self, username):
         conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
-        user = cursor.fetchone()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
+            user = cursor.fetchone()
+        finally:
+            conn.close()
         return user
     
     def verify_password(self, user, password):
-        return check_password_hash(user['password_hash'], password)
+        if not self.hasher.verify(user['password_hash'], password):
+            return False
+        
+        # Upgrade hashes made with an older method or cost on the next login
+        if self.hasher.needs_rehash(user['password_hash']):
+            self.update_password_hash(user['id'], self.hasher.hash(password))
+        return True
     
-    def get_all_users(self):
+    def update_password_hash(self, user_id, password_hash):
         conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, username, email, role, created_at FROM users ORDER BY created_at DESC')
-        users = cursor.fetchall()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE users SET password_hash = ? WHERE id = ?', (password_hash, user_id))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def get_all_users(self):
+        conn = self.db.get_read_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, username, email, role, created_at FROM users ORDER BY created_at DESC')
+            users = cursor.fetchall()
+        finally:
+            conn.close()
         return users
+    
+    def get_users_page(self, limit=50, after=None, role=None):
+        # Keyset pagination over (created_at, id) descending; `after` is the
+        # (created_at, id) of the last row of the previous page
+        conditions = []
+        params = []
+        if role:
+            conditions.append('role = ?')
+            params.append(role)
+        if after:
+            conditions.append('(created_at, id) < (?, ?)')
+            params.extend(after)
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+        
+        conn = self.db.get_read_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT id, username, email, role, created_at FROM users
+                {where}
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            ''', (*params, limit + 1))
+            users = cursor.fetchall()
+        finally:
+            conn.close()
+        
+        next_after = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_after = (users[-1]['created_at'], users[-1]['id'])
+        return users, next_after
+    
+    def count_users(self, role=None):
+        conn = self.db.get_read_connection()
+        try:
+            cursor = conn.cursor()
+            if role:
+                cursor.execute('SELECT COUNT(*) FROM users WHERE role = ?', (role,))
+            else:
+                cursor.execute('SELECT COUNT(*) FROM users')
+            count = cursor.fetchone()[0]
+        finally:
+            conn.close()
+        return count
+
+def claim_spot(cursor, spot_id, user_id, hourly_rate=None):
+    # Only flip spots that are still available; a concurrent booking wins otherwise.
+    # hourly_rate is a quoted dynamic price; without one the release prices the stay.
+    cursor.execute('UPDATE parking_spots SET status = "O" WHERE id = ? AND status = "A"', (spot_id,))
+    if cursor.rowcount != 1:
+        return False
+    
+    cursor.execute('''
+        INSERT INTO reservations (spot_id, user_id, status, hourly_rate)
+        VALUES (?, ?, 'active', ?)
+    ''', (spot_id, user_id, hourly_rate))
+    return True
+
+def slot_conflict(cursor, spot_id, start_at, end_at):
+    # Whether an advance booking on the spot overlaps [start_at, end_at)
+    cursor.execute('''
+        SELECT 1 FROM slot_bookings
+        WHERE spot_id = ? AND status != 'cancelled' AND end_at > ? AND start_at < ?
+        LIMIT 1
+    ''', (spot_id, start_at, end_at))
+    return cursor.fetchone() is not None
+
+def lot_version(cursor, lot_id):
+    cursor.execute('SELECT occupancy_version FROM parking_lots WHERE id = ?', (lot_id,))
+    row = cursor.fetchone()
+    return row['occupancy_version'] if row else None
+
+def stamp_bitmap(cursor, lot_id, bitmap):
+    # Last step before commit: the working bitmap now matches the version the
+    # commit will carry
+    if bitmap is not None:
+        bitmap.version = lot_version(cursor, lot_id)
+
+def store_bitmap(occupancy, lot_id, bitmap):
+    if occupancy is not None and bitmap is not None:
+        occupancy.put(lot_id, bitmap)
+
+def read_lots(cursor, index, *lot_ids):
+    # Rows to refresh the in-memory lot index with once the write commits
+    if index is None:
+        return []
+    lots = []
+    for lot_id in lot_ids:
+        cursor.execute('SELECT * FROM parking_lots WHERE id = ?', (lot_id,))
+        lots.append(cursor.fetchone())
+    return lots
+
+def reindex_lots(index, lots):
+    if index is None:
+        return
+    for lot in lots:
+        index.upsert(lot)
+
+def optional_float(value):
+    # Blank form/CSV fields mean "not set"
+    if value is None or str(value).strip() == '':
+        return None
+    return float(value)
 
 class ParkingLot:
-    def __init__(self, db):
+    def __init__(self, db, cache=None, events=None, index=None):
         self.db = db
+        self.cache = cache
+        self.events = events
+        self.index = index
     
-    def create_lot(self, name, address, pin_code, price_per_hour, max_spots):
+    def create_lot(self, name, address, pin_code, price_per_hour, max_spots, latitude=None, longitude=None):
         conn = self.db.get_connection()
         cursor = conn.cursor()
         
         try:
             cursor.execute('''
-                INSERT INTO parking_lots (prime_location_name, address, pin_code, price_per_hour, maximum_number_of_spots)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (name, address, pin_code, price_per_hour, max_spots))
+                INSERT INTO parking_lots (prime_location_name, address, pin_code, price_per_hour, maximum_number_of_spots, latitude, longitude)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (name, address, pin_code, price_per_hour, max_spots, latitude, longitude))
             
             lot_id = cursor.lastrowid
             
             # Create parking spots for this lot
-            for i in range(1, max_spots + 1):
-                cursor.execute('''
-                    INSERT INTO parking_spots (lot_id, spot_number, status)
-                    VALUES (?, ?, 'A')
-                ''', (lot_id, i))
+            self._insert_spots(cursor, lot_id, 1, max_spots)
+            occupancy = read_occupancy(cursor, self.events, lot_id)
+            indexed = read_lots(cursor, self.index, lot_id)
             
             conn.commit()
+            invalidate_lots(self.cache, lot_id)
+            reindex_lots(self.index, indexed)
+            publish_occupancy(self.events, occupancy)
             return lot_id
         except Exception as e:
             conn.rollback()
@@ -156,32 +699,128 @@ class ParkingLot:
         finally:
             conn.close()
     
-    def get_all_lots(self):
+    def _insert_spots(self, cursor, lot_id, first, last):
+        # Generate spot numbers first..last inside SQLite in a single statement
+        if last < first:
+            return
+        cursor.execute('''
+            WITH RECURSIVE seq(n) AS (
+                SELECT ? UNION ALL SELECT n + 1 FROM seq WHERE n < ?
+            )
+            INSERT INTO parking_spots (lot_id, spot_number, status)
+            SELECT ?, n, 'A' FROM seq
+        ''', (first, last, lot_id))
+    
+    def bulk_create_lots(self, lots):
+        # Create many lots and all their spots in one transaction. Each lot is a
+        # dict with name, address, pin_code, price_per_hour and max_spots, and
+        # optionally latitude and longitude.
         conn = self.db.get_connection()
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT pl.*, 
-                   COUNT(ps.id) as total_spots,
-                   SUM(CASE WHEN ps.status = 'A' THEN 1 ELSE 0 END) as available_spots,
-                   SUM(CASE WHEN ps.status = 'O' THEN 1 ELSE 0 END) as occupied_spots
-            FROM parking_lots pl
-            LEFT JOIN parking_spots ps ON pl.id = ps.lot_id
-            GROUP BY pl.id
-            ORDER BY pl.created_at DESC
-        ''')
-        lots = cursor.fetchall()
-        conn.close()
+        
+        try:
+            lot_ids = []
+            for lot in lots:
+                cursor.execute('''
+                    INSERT INTO parking_lots (prime_location_name, address, pin_code, price_per_hour, maximum_number_of_spots, latitude, longitude)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (lot['name'], lot['address'], lot['pin_code'], float(lot['price_per_hour']), int(lot['max_spots']),
+                      optional_float(lot.get('latitude')), optional_float(lot.get('longitude'))))
+                lot_id = cursor.lastrowid
+                self._insert_spots(cursor, lot_id, 1, int(lot['max_spots']))
+                lot_ids.append(lot_id)
+            occupancy = read_occupancy(cursor, self.events, *lot_ids)
+            indexed = read_lots(cursor, self.index, *lot_ids)
+            
+            conn.commit()
+            invalidate_lots(self.cache, *lot_ids)
+            reindex_lots(self.index, indexed)
+            publish_occupancy(self.events, occupancy)
+            return lot_ids
+        except Exception as e:
+            conn.rollback()
+            return None
+        finally:
+            conn.close()
+    
+    def get_all_lots(self):
+        if self.cache is not None:
+            lots = self.cache.get(LOTS_KEY)
+            if lots is None:
+                lots = self._load_all_lots()
+                self.cache.set(LOTS_KEY, lots)
+            return lots
+        return self._load_all_lots()
+    
+    def _load_all_lots(self):
+        # Occupancy counters are kept current by triggers on parking_spots
+        conn = self.db.get_connection()
+        try:
+            cursor = fetch_records(conn.cursor(), Lot)
+            cursor.execute(f'SELECT {LOT_COLUMNS} FROM parking_lots ORDER BY created_at DESC')
+            lots = cursor.fetchall()
+        finally:
+            conn.close()
         return lots
     
-    def get_lot_by_id(self, lot_id):
+    def check_counters(self, repair=False):
         conn = self.db.get_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM parking_lots WHERE id = ?', (lot_id,))
-        lot = cursor.fetchone()
-        conn.close()
+        
+        try:
+            cursor.execute('''
+                SELECT pl.id, pl.total_spots, pl.available_spots, pl.occupied_spots,
+                       COUNT(ps.id) as actual_total,
+                       COALESCE(SUM(ps.status = 'A'), 0) as actual_available,
+                       COALESCE(SUM(ps.status = 'O'), 0) as actual_occupied
+                FROM parking_lots pl
+                LEFT JOIN parking_spots ps ON pl.id = ps.lot_id
+                GROUP BY pl.id
+                HAVING pl.total_spots != actual_total
+                    OR pl.available_spots != actual_available
+                    OR pl.occupied_spots != actual_occupied
+            ''')
+            drift = [dict(row) for row in cursor.fetchall()]
+            
+            if repair and drift:
+                cursor.executemany('''
+                    UPDATE parking_lots 
+                    SET total_spots = ?, available_spots = ?, occupied_spots = ?,
+                        occupancy_version = occupancy_version + 1
+                    WHERE id = ?
+                ''', [(d['actual_total'], d['actual_available'], d['actual_occupied'], d['id']) for d in drift])
+                conn.commit()
+                invalidate_lots(self.cache, *[d['id'] for d in drift])
+            
+            return drift
+        except Exception as e:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def get_lot_by_id(self, lot_id):
+        if self.cache is not None:
+            lot = self.cache.get(lot_key(lot_id))
+            if lot is None:
+                lot = self._load_lot(lot_id)
+                if lot is None:
+                    return None
+                self.cache.set(lot_key(lot_id), lot)
+            return lot
+        return self._load_lot(lot_id)
+    
+    def _load_lot(self, lot_id):
+        conn = self.db.get_connection()
+        try:
+            cursor = fetch_records(conn.cursor(), Lot)
+            cursor.execute(f'SELECT {LOT_COLUMNS} FROM parking_lots WHERE id = ?', (lot_id,))
+            lot = cursor.fetchone()
+        finally:
+            conn.close()
         return lot
     
-    def update_lot(self, lot_id, name, address, pin_code, price_per_hour, max_spots):
+    def update_lot(self, lot_id, name, address, pin_code, price_per_hour, max_spots, latitude=None, longitude=None):
         conn = self.db.get_connection()
         cursor = conn.cursor()
         
@@ -194,18 +833,15 @@ class ParkingLot:
             cursor.execute('''
                 UPDATE parking_lots 
                 SET prime_location_name = ?, address = ?, pin_code = ?, 
-                    price_per_hour = ?, maximum_number_of_spots = ?
+                    price_per_hour = ?, maximum_number_of_spots = ?,
+                    latitude = ?, longitude = ?
                 WHERE id = ?
-            ''', (name, address, pin_code, price_per_hour, max_spots, lot_id))
+            ''', (name, address, pin_code, price_per_hour, max_spots, latitude, longitude, lot_id))
             
             # Adjust parking spots if needed
             if max_spots > current_spots:
                 # Add more spots
-                for i in range(current_spots + 1, max_spots + 1):
-                    cursor.execute('''
-                        INSERT INTO parking_spots (lot_id, spot_number, status)
-                        VALUES (?, ?, 'A')
-                    ''', (lot_id, i))
+                self._insert_spots(cursor, lot_id, current_spots + 1, max_spots)
             elif max_spots < current_spots:
                 # Remove excess spots (only if they are available)
                 cursor.execute('''
@@ -213,7 +849,13 @@ class ParkingLot:
                     WHERE lot_id = ? AND spot_number > ? AND status = 'A'
                 ''', (lot_id, max_spots))
             
+            occupancy = read_occupancy(cursor, self.events, lot_id)
+            indexed = read_lots(cursor, self.index, lot_id)
+            
             conn.commit()
+            invalidate_lots(self.cache, lot_id)
+            reindex_lots(self.index, indexed)
+            publish_occupancy(self.events, occupancy)
             return True
         except Exception as e:
             conn.rollback()
@@ -239,6 +881,11 @@ class ParkingLot:
             
             cursor.execute('DELETE FROM parking_lots WHERE id = ?', (lot_id,))
             conn.commit()
+            invalidate_lots(self.cache, lot_id)
+            if self.index is not None:
+                self.index.remove(lot_id)
+            if self.events is not None:
+                self.events.publish('lot_deleted', {'lot_id': lot_id})
             return True
         except Exception as e:
             conn.rollback()
@@ -247,51 +894,126 @@ class ParkingLot:
             conn.close()
 
 class ParkingSpot:
-    def __init__(self, db):
+    def __init__(self, db, cache=None, events=None, slots=None, walkin_buffer=7200, occupancy=None, jobs=None,
+                 pricing=None, user_state=None):
         self.db = db
+        self.cache = cache
+        self.events = events
+        # Walk-ins skip spots with an advance booking in the next walkin_buffer seconds
+        self.slots = slots
+        self.walkin_buffer = walkin_buffer
+        # Per-lot occupancy bitmaps (occupancy.OccupancyIndex) for free-spot lookups
+        self.occupancy = occupancy
+        # jobs.JobScheduler: each release queues a 'receipt' job in its own transaction
+        self.jobs = jobs
+        # pricing.DynamicPricing: walk-ins get a quoted hourly rate instead of price_per_hour
+        self.pricing = pricing
+        # sessions.UserState: a user's cached entry is dropped after each booking or release
+        self.user_state = user_state
     
     def get_spots_by_lot(self, lot_id):
+        return list(self.iter_spots_by_lot(lot_id))
+    
+    def iter_spots_by_lot(self, lot_id):
+        # SpotCell records in spot_number order. The connection is held until
+        # the generator is exhausted or closed.
         conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT ps.*, r.user_id, u.username, r.parking_timestamp
-            FROM parking_spots ps
-            LEFT JOIN reservations r ON ps.id = r.spot_id AND r.status = 'active'
-            LEFT JOIN users u ON r.user_id = u.id
-            WHERE ps.lot_id = ?
-            ORDER BY ps.spot_number
-        ''', (lot_id,))
-        spots = cursor.fetchall()
-        conn.close()
-        return spots
+        try:
+            cursor = fetch_records(conn.cursor(), SpotCell)
+            cursor.execute('''
+                SELECT ps.id, ps.spot_number, ps.status, r.user_id, u.username, r.parking_timestamp
+                FROM parking_spots ps
+                LEFT JOIN reservations r ON ps.id = r.spot_id AND r.status = 'active'
+                LEFT JOIN users u ON r.user_id = u.id
+                WHERE ps.lot_id = ?
+                ORDER BY ps.spot_number
+            ''', (lot_id,))
+            yield from cursor
+        finally:
+            conn.close()
     
     def get_available_spot(self, lot_id):
         conn = self.db.get_connection()
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM parking_spots 
-            WHERE lot_id = ? AND status = 'A' 
-            ORDER BY spot_number LIMIT 1
-        ''', (lot_id,))
-        spot = cursor.fetchone()
-        conn.close()
-        return spot
+        
+        try:
+            # One read snapshot for the version check and the spot rows
+            cursor.execute('BEGIN')
+            bitmap = self._current_bitmap(cursor, lot_id)
+            if bitmap is not None:
+                spot_number, spot_id = next(bitmap.free_spots(), (None, None))
+                if spot_id is None:
+                    return None
+                cursor.execute('SELECT * FROM parking_spots WHERE id = ?', (spot_id,))
+                return cursor.fetchone()
+            
+            cursor.execute('''
+                SELECT * FROM parking_spots 
+                WHERE lot_id = ? AND status = 'A' 
+                ORDER BY spot_number LIMIT 1
+            ''', (lot_id,))
+            return cursor.fetchone()
+        finally:
+            conn.close()
+    
+    def get_bitmap(self, lot_id):
+        # The lot's current occupancy bitmap; None if there is no such lot or
+        # its spot numbers can't be represented
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('BEGIN')
+            if self.occupancy is not None:
+                return self._current_bitmap(cursor, lot_id)
+            version = lot_version(cursor, lot_id)
+            return self._load_bitmap(cursor, lot_id, version) if version is not None else None
+        finally:
+            conn.close()
+    
+    def _current_bitmap(self, cursor, lot_id, load=True):
+        # The shared bitmap for the version this transaction sees, loading it
+        # on a miss unless load=False. None if bitmaps are off or the lot
+        # can't be represented; callers then use SQL.
+        if self.occupancy is None:
+            return None
+        version = lot_version(cursor, lot_id)
+        if version is None:
+            return None
+        bitmap = self.occupancy.get(lot_id, version)
+        if bitmap is None and load:
+            # Nothing has been written yet in this transaction, so this is
+            # committed state and can be shared straight away
+            bitmap = self._load_bitmap(cursor, lot_id, version)
+            store_bitmap(self.occupancy, lot_id, bitmap)
+        return bitmap
+    
+    def _load_bitmap(self, cursor, lot_id, version):
+        cursor.execute('SELECT id, spot_number, status FROM parking_spots WHERE lot_id = ?', (lot_id,))
+        return LotBitmap.from_rows(version, cursor.fetchall())
+    
+    def _working_bitmap(self, cursor, lot_id, load=True):
+        # Private copy for a write transaction to mark its changes on
+        bitmap = self._current_bitmap(cursor, lot_id, load)
+        return bitmap.copy() if bitmap is not None else None
     
     def book_spot(self, spot_id, user_id):
         conn = self.db.get_connection()
         cursor = conn.cursor()
         
         try:
-            # Update spot status
-            cursor.execute('UPDATE parking_spots SET status = "O" WHERE id = ?', (spot_id,))
-            
-            # Create reservation
-            cursor.execute('''
-                INSERT INTO reservations (spot_id, user_id, status)
-                VALUES (?, ?, 'active')
-            ''', (spot_id, user_id))
+            if not claim_spot(cursor, spot_id, user_id):
+                conn.rollback()
+                return False
             
+            cursor.execute('SELECT lot_id FROM parking_spots WHERE id = ?', (spot_id,))
+            lot_id = cursor.fetchone()['lot_id']
+            occupancy = read_occupancy(cursor, self.events, lot_id)
             conn.commit()
+            invalidate_lots(self.cache, lot_id)
+            if self.user_state is not None:
+                self.user_state.invalidate(user_id)
+            publish_occupancy(self.events, occupancy)
             return True
         except Exception as e:
             conn.rollback()
@@ -299,94 +1021,917 @@ class ParkingSpot:
         finally:
             conn.close()
     
+    def allocate_spot(self, lot_id, user_id, max_retries=5):
+        # Claim the lowest free spot and create the reservation in one write transaction.
+        # Returns the booked spot, None if the lot is full or the user already parked,
+        # or False if the database stayed busy for every attempt.
+        for attempt in range(max_retries):
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                bitmap = self._working_bitmap(cursor, lot_id)
+                
+                spot = self._book(cursor, lot_id, user_id, bitmap)
+                if not spot:
+                    conn.rollback()
+                    return None
+                
+                occupancy = read_occupancy(cursor, self.events, lot_id)
+                stamp_bitmap(cursor, lot_id, bitmap)
+                conn.commit()
+                invalidate_lots(self.cache, lot_id)
+                store_bitmap(self.occupancy, lot_id, bitmap)
+                if self.user_state is not None:
+                    self.user_state.invalidate(user_id)
+                publish_occupancy(self.events, occupancy)
+                return spot
+            except sqlite3.OperationalError as e:
+                conn.rollback()
+                if 'locked' not in str(e) and 'busy' not in str(e):
+                    return False
+            except Exception as e:
+                conn.rollback()
+                return False
+            finally:
+                conn.close()
+            
+            time.sleep(min(0.5, 0.01 * (2 ** attempt)))
+        
+        return False
+    
+    def _book(self, cursor, lot_id, user_id, bitmap=None):
+        # Inside a write transaction: the claimed spot, or None if the user is
+        # already parked or the lot has no spot to give
+        cursor.execute('''
+            SELECT 1 FROM reservations 
+            WHERE user_id = ? AND status = 'active' LIMIT 1
+        ''', (user_id,))
+        if cursor.fetchone():
+            return None
+        
+        spot = self._first_walkin_spot(cursor, lot_id, bitmap)
+        if not spot:
+            return None
+        hourly_rate = self._hourly_rate(cursor, lot_id)
+        if not claim_spot(cursor, spot['id'], user_id, hourly_rate):
+            if bitmap is None:
+                return None
+            # The bitmap offered a spot the table has taken, so it is out of
+            # date: drop the shared one, bring this transaction's copy in line
+            # with the table and pick again through SQL
+            self.occupancy.remove(lot_id)
+            fresh = self._load_bitmap(cursor, lot_id, bitmap.version)
+            if fresh is not None:
+                bitmap.states[:] = fresh.states
+                bitmap.ids = fresh.ids
+            spot = self._book(cursor, lot_id, user_id)
+            if spot:
+                bitmap.mark(spot['spot_number'], True)
+            return spot
+        if bitmap is not None:
+            bitmap.mark(spot['spot_number'], True)
+        return dict(spot, hourly_rate=hourly_rate)
+    
+    def _hourly_rate(self, cursor, lot_id, lot=None):
+        # Dynamic rate from the lot's price and counters as of this
+        # transaction, or None without dynamic pricing
+        if self.pricing is None:
+            return None
+        if lot is None:
+            cursor.execute('''
+                SELECT price_per_hour, total_spots, occupied_spots FROM parking_lots WHERE id = ?
+            ''', (lot_id,))
+            lot = cursor.fetchone()
+        return self.pricing.hourly_rate(lot_id, lot, cursor=cursor)
+    
+    def _first_walkin_spot(self, cursor, lot_id, bitmap=None):
+        # With advance bookings on, spots booked within the next walkin_buffer
+        # seconds are skipped. The SlotIndex only filters cheaply; slot_bookings
+        # decides inside this write transaction, since another worker may have
+        # booked a slot this process's index hasn't seen.
+        now = int(time.time())
+        start_at, end_at = to_timestamp(now), to_timestamp(now + self.walkin_buffer)
+        if bitmap is not None:
+            for spot_number, spot_id in bitmap.free_spots():
+                if self.slots is None or (self.slots.is_free(spot_id, now, now + self.walkin_buffer)
+                                          and not slot_conflict(cursor, spot_id, start_at, end_at)):
+                    cursor.execute('SELECT * FROM parking_spots WHERE id = ?', (spot_id,))
+                    return cursor.fetchone()
+            return None
+        
+        if self.slots is None:
+            cursor.execute('''
+                SELECT * FROM parking_spots 
+                WHERE lot_id = ? AND status = 'A' 
+                ORDER BY spot_number LIMIT 1
+            ''', (lot_id,))
+            return cursor.fetchone()
+        
+        cursor.execute('''
+            SELECT * FROM parking_spots ps
+            WHERE lot_id = ? AND status = 'A' AND NOT EXISTS (
+                SELECT 1 FROM slot_bookings sb
+                WHERE sb.spot_id = ps.id AND sb.status != 'cancelled' AND sb.end_at > ? AND sb.start_at < ?
+            )
+            ORDER BY spot_number LIMIT 1
+        ''', (lot_id, start_at, end_at))
+        return cursor.fetchone()
+    
+    def _release(self, cursor, spot_id, user_id, bitmap=None):
+        # Close the user's active reservation on this spot and free the spot.
+        # Returns (lot_id, cost), or None if they aren't parked there.
+        cursor.execute('''
+            SELECT r.*, ps.lot_id, ps.spot_number, pl.price_per_hour, pl.total_spots, pl.occupied_spots
+            FROM reservations r
+            JOIN parking_spots ps ON r.spot_id = ps.id
+            JOIN parking_lots pl ON ps.lot_id = pl.id
+            WHERE r.spot_id = ? AND r.user_id = ? AND r.status = 'active'
+        ''', (spot_id, user_id))
+        
+        reservation = cursor.fetchone()
+        if not reservation:
+            return None
+        
+        # Calculate hours parked (minimum 1 hour)
+        parking_time = datetime.now()
+        start_time = datetime.fromisoformat(reservation['parking_timestamp'].replace('Z', ''))
+        hours_parked = max(1, (parking_time - start_time).total_seconds() / 3600)
+        # The rate quoted at booking, else the dynamic rate now, else the lot's price
+        hourly_rate = reservation['hourly_rate']
+        if hourly_rate is None:
+            hourly_rate = self._hourly_rate(cursor, reservation['lot_id'], reservation)
+        if hourly_rate is None:
+            hourly_rate = reservation['price_per_hour']
+        total_cost = hours_parked * hourly_rate
+        
+        # Update reservation
+        cursor.execute('''
+            UPDATE reservations 
+            SET leaving_timestamp = CURRENT_TIMESTAMP, 
+                parking_cost = ?, 
+                status = 'completed'
+            WHERE spot_id = ? AND user_id = ? AND status = 'active'
+        ''', (total_cost, spot_id, user_id))
+        
+        # Update spot status
+        cursor.execute('UPDATE parking_spots SET status = "A" WHERE id = ?', (spot_id,))
+        if bitmap is not None:
+            bitmap.mark(reservation['spot_number'], False)
+        if self.jobs is not None:
+            self.jobs.enqueue(cursor, 'receipt', reservation_id=reservation['id'])
+        return reservation['lot_id'], total_cost
+    
     def release_spot(self, spot_id, user_id):
         conn = self.db.get_connection()
         cursor = conn.cursor()
         
         try:
-            # Calculate parking cost
-            cursor.execute('''
-                SELECT r.*, pl.price_per_hour
-                FROM reservations r
-                JOIN parking_spots ps ON r.spot_id = ps.id
-                JOIN parking_lots pl ON ps.lot_id = pl.id
-                WHERE r.spot_id = ? AND r.user_id = ? AND r.status = 'active'
-            ''', (spot_id, user_id))
+            # The bitmap copy must come from inside the write transaction, or
+            # a booking committed in between is lost when it is stored
+            cursor.execute('BEGIN IMMEDIATE')
+            # Releases only keep an already loaded bitmap current
+            bitmap = None
+            if self.occupancy is not None:
+                cursor.execute('SELECT lot_id FROM parking_spots WHERE id = ?', (spot_id,))
+                spot = cursor.fetchone()
+                if spot:
+                    bitmap = self._working_bitmap(cursor, spot['lot_id'], load=False)
             
-            reservation = cursor.fetchone()
-            if not reservation:
+            released = self._release(cursor, spot_id, user_id, bitmap)
+            if not released:
                 return False
+            lot_id, total_cost = released
             
-            # Calculate hours parked (minimum 1 hour)
-            parking_time = datetime.now()
-            start_time = datetime.fromisoformat(reservation['parking_timestamp'].replace('Z', ''))
-            hours_parked = max(1, (parking_time - start_time).total_seconds() / 3600)
-            total_cost = hours_parked * reservation['price_per_hour']
-            
-            # Update reservation
-            cursor.execute('''
-                UPDATE reservations 
-                SET leaving_timestamp = CURRENT_TIMESTAMP, 
-                    parking_cost = ?, 
-                    status = 'completed'
-                WHERE spot_id = ? AND user_id = ? AND status = 'active'
-            ''', (total_cost, spot_id, user_id))
-            
-            # Update spot status
-            cursor.execute('UPDATE parking_spots SET status = "A" WHERE id = ?', (spot_id,))
+            occupancy = read_occupancy(cursor, self.events, lot_id)
+            stamp_bitmap(cursor, lot_id, bitmap)
             
             conn.commit()
+            invalidate_lots(self.cache, lot_id)
+            store_bitmap(self.occupancy, lot_id, bitmap)
+            if self.user_state is not None:
+                self.user_state.invalidate(user_id)
+            publish_occupancy(self.events, occupancy)
+            if self.jobs is not None:
+                self.jobs.wake()
             return total_cost
         except Exception as e:
             conn.rollback()
             return False
         finally:
             conn.close()
+    
+    def apply_batch(self, operations, key_ttl=86400, max_retries=5):
+        # Gate batches: operations are dicts with op ('book' or 'release'),
+        # user_id, lot_id (book) or spot_id (release) and an optional
+        # idempotency key. Operations are grouped by lot and each lot's share
+        # is applied in order in one write transaction. Returns one result
+        # per operation, in request order; a key seen before (in this batch
+        # or within key_ttl seconds) replays its stored result.
+        results = [None] * len(operations)
+        first_by_key = {}
+        repeats = []
+        pending = []
+        for i, operation in enumerate(operations):
+            key = operation.get('key')
+            if key is not None and key in first_by_key:
+                repeats.append((i, first_by_key[key]))
+                continue
+            if key is not None:
+                first_by_key[key] = i
+            pending.append(i)
+        
+        groups = self._group_by_lot(operations, pending, results)
+        prune_before = to_timestamp(time.time() - key_ttl)
+        for lot_id, indexes in groups.items():
+            self._apply_lot(lot_id, [(i, operations[i]) for i in indexes], results, prune_before, max_retries)
+            prune_before = None
+        
+        for i, first in repeats:
+            results[i] = dict(results[first], replayed=True)
+        return results
+    
+    def _group_by_lot(self, operations, pending, results):
+        # {lot_id: [operation index, ...]} in request order; operations on
+        # unknown lots or spots get their (rejected) result straight away
+        spot_ids = list({operations[i]['spot_id'] for i in pending if operations[i]['op'] == 'release'})
+        lot_ids = list({operations[i]['lot_id'] for i in pending if operations[i]['op'] == 'book'})
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            spot_lots = {}
+            if spot_ids:
+                cursor.execute(f"SELECT id, lot_id FROM parking_spots WHERE id IN ({','.join('?' * len(spot_ids))})",
+                               spot_ids)
+                spot_lots = {row['id']: row['lot_id'] for row in cursor.fetchall()}
+            known_lots = set()
+            if lot_ids:
+                cursor.execute(f"SELECT id FROM parking_lots WHERE id IN ({','.join('?' * len(lot_ids))})", lot_ids)
+                known_lots = {row['id'] for row in cursor.fetchall()}
+            user_ids = list({operations[i]['user_id'] for i in pending})
+            known_users = set()
+            if user_ids:
+                cursor.execute(f"SELECT id FROM users WHERE id IN ({','.join('?' * len(user_ids))})", user_ids)
+                known_users = {row['id'] for row in cursor.fetchall()}
+        finally:
+            conn.close()
+        
+        groups = {}
+        for i in pending:
+            operation = operations[i]
+            if operation['user_id'] not in known_users:
+                results[i] = gate_result(operation, 'rejected', reason='unknown_user')
+                continue
+            if operation['op'] == 'book':
+                lot_id = operation['lot_id'] if operation['lot_id'] in known_lots else None
+                reason = 'unknown_lot'
+            else:
+                lot_id = spot_lots.get(operation['spot_id'])
+                reason = 'unknown_spot'
+            if lot_id is None:
+                results[i] = gate_result(operation, 'rejected', reason=reason)
+            else:
+                groups.setdefault(lot_id, []).append(i)
+        return groups
+    
+    def _apply_lot(self, lot_id, operations, results, prune_before=None, max_retries=5):
+        keys = [operation['key'] for _, operation in operations if operation.get('key') is not None]
+        for attempt in range(max_retries):
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+        
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                if prune_before:
+                    cursor.execute('DELETE FROM gate_operations WHERE created_at < ?', (prune_before,))
+                bitmap = self._working_bitmap(cursor, lot_id)
+        
+                stored = {}
+                if keys:
+                    cursor.execute(f"SELECT key, result FROM gate_operations WHERE key IN ({','.join('?' * len(keys))})",
+                                   keys)
+                    stored = {row['key']: row['result'] for row in cursor.fetchall()}
+        
+                lot_results = {}
+                for i, operation in operations:
+                    key = operation.get('key')
+                    if key in stored:
+                        lot_results[i] = dict(json.loads(stored[key]), replayed=True)
+                        continue
+        
+                    # A failed operation is undone on its own; the rest of the lot goes ahead
+                    cursor.execute('SAVEPOINT gate_operation')
+                    try:
+                        result = self._apply_operation(cursor, lot_id, operation, bitmap)
+                        cursor.execute('RELEASE gate_operation')
+                    except sqlite3.IntegrityError as e:
+                        cursor.execute('ROLLBACK TO gate_operation')
+                        cursor.execute('RELEASE gate_operation')
+                        result = gate_result(operation, 'error', reason='conflict')
+        
+                    if key is not None and result['status'] != 'error':
+                        cursor.execute('INSERT INTO gate_operations (key, lot_id, result) VALUES (?, ?, ?)',
+                                       (key, lot_id, json.dumps(result)))
+                    lot_results[i] = result
+        
+                occupancy = read_occupancy(cursor, self.events, lot_id)
+                stamp_bitmap(cursor, lot_id, bitmap)
+                conn.commit()
+                invalidate_lots(self.cache, lot_id)
+                store_bitmap(self.occupancy, lot_id, bitmap)
+                if self.user_state is not None:
+                    self.user_state.invalidate(*{result['user_id'] for result in lot_results.values()
+                                                 if result['status'] == 'ok' and not result.get('replayed')})
+                publish_occupancy(self.events, occupancy)
+                if self.jobs is not None:
+                    self.jobs.wake()
+                for i, result in lot_results.items():
+                    results[i] = result
+                return True
+            except sqlite3.OperationalError as e:
+                conn.rollback()
+                if 'locked' not in str(e) and 'busy' not in str(e):
+                    break
+            except Exception as e:
+                conn.rollback()
+                break
+            finally:
+                conn.close()
+        
+            time.sleep(min(0.5, 0.01 * (2 ** attempt)))
+        
+        # Nothing from this lot was committed, so its operations can be retried as-is
+        for i, operation in operations:
+            results[i] = gate_result(operation, 'error', reason='database_error')
+        return False
+    
+    def _apply_operation(self, cursor, lot_id, operation, bitmap=None):
+        user_id = operation['user_id']
+        if operation['op'] == 'book':
+            spot = self._book(cursor, lot_id, user_id, bitmap)
+            if spot:
+                return gate_result(operation, 'ok', lot_id=lot_id, spot_id=spot['id'],
+                                   spot_number=spot['spot_number'], hourly_rate=spot['hourly_rate'])
+            cursor.execute('''
+                SELECT 1 FROM reservations
+                WHERE user_id = ? AND status = 'active' LIMIT 1
+            ''', (user_id,))
+            return gate_result(operation, 'rejected', lot_id=lot_id,
+                               reason='already_parked' if cursor.fetchone() else 'lot_full')
+        
+        released = self._release(cursor, operation['spot_id'], user_id, bitmap)
+        if released:
+            return gate_result(operation, 'ok', lot_id=lot_id, spot_id=operation['spot_id'],
+                               cost=round(released[1], 2))
+        return gate_result(operation, 'rejected', lot_id=lot_id, spot_id=operation['spot_id'],
+                           reason='not_parked')
+
+def gate_result(operation, status, **fields):
+    result = {'key': operation.get('key'), 'op': operation['op'], 'user_id': operation['user_id'], 'status': status}
+    result.update(fields)
+    return result
+
+# Reservation columns shared by the live and archive tables, aliased so an
+# ORDER BY on the compound can name them
+RESERVATION_COLUMNS = ('r.id AS id, r.spot_id AS spot_id, r.user_id AS user_id, '
+                       'r.parking_timestamp AS parking_timestamp, r.leaving_timestamp AS leaving_timestamp, '
+                       'r.parking_cost AS parking_cost, r.status AS status')
+
+def both_tiers(db, select, params=()):
+    # `select` names its reservations table as {reservations}; returns the
+    # UNION ALL of it over the live and archived rows, with params repeated
+    # for each arm. An ORDER BY appended to the result applies to the whole
+    # compound and SQLite merges the two index-ordered arms without a sort.
+    live = select.format(reservations='main.reservations')
+    archived = select.format(reservations=db.archive_table)
+    return f'{live} UNION ALL {archived}', (*params, *params)
 
 class Reservation:
     def __init__(self, db):
         self.db = db
     
     def get_user_reservations(self, user_id):
+        return list(self.iter_user_reservations(user_id))
+    
+    def iter_user_reservations(self, user_id):
+        # ReservationSummary records, newest first, from both tiers. The
+        # connection is held until the generator is exhausted or closed.
         conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT r.*, ps.spot_number, pl.prime_location_name, pl.address
-            FROM reservations r
-            JOIN parking_spots ps ON r.spot_id = ps.id
-            JOIN parking_lots pl ON ps.lot_id = pl.id
-            WHERE r.user_id = ?
-            ORDER BY r.parking_timestamp DESC
-        ''', (user_id,))
-        reservations = cursor.fetchall()
-        conn.close()
-        return reservations
+        try:
+            cursor = fetch_records(conn.cursor(), ReservationSummary)
+            sql, params = both_tiers(self.db, '''
+                SELECT r.id AS id, r.spot_id AS spot_id, ps.spot_number AS spot_number,
+                       pl.prime_location_name AS prime_location_name, pl.address AS address,
+                       r.parking_timestamp AS parking_timestamp, r.leaving_timestamp AS leaving_timestamp,
+                       r.parking_cost AS parking_cost, r.status AS status
+                FROM {reservations} r
+                JOIN parking_spots ps ON r.spot_id = ps.id
+                JOIN parking_lots pl ON ps.lot_id = pl.id
+                WHERE r.user_id = ?
+            ''', (user_id,))
+            cursor.execute(sql + ' ORDER BY parking_timestamp DESC', params)
+            yield from cursor
+        finally:
+            conn.close()
     
     def get_active_reservation(self, user_id):
         conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT r.*, ps.spot_number, pl.prime_location_name, pl.address, pl.price_per_hour
-            FROM reservations r
-            JOIN parking_spots ps ON r.spot_id = ps.id
-            JOIN parking_lots pl ON ps.lot_id = pl.id
-            WHERE r.user_id = ? AND r.status = 'active'
-        ''', (user_id,))
-        reservation = cursor.fetchone()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT r.*, ps.spot_number, pl.prime_location_name, pl.address, pl.price_per_hour
+                FROM reservations r
+                JOIN parking_spots ps ON r.spot_id = ps.id
+                JOIN parking_lots pl ON ps.lot_id = pl.id
+                WHERE r.user_id = ? AND r.status = 'active'
+            ''', (user_id,))
+            reservation = cursor.fetchone()
+        finally:
+            conn.close()
         return reservation
     
-    def get_all_reservations(self):
+    def get_user_state(self, user_id):
+        # The user's role and active reservation (as get_active_reservation
+        # returns it, or None) in one query; None for an unknown user
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT u.role AS user_role, r.*, ps.spot_number, pl.prime_location_name, pl.address, pl.price_per_hour
+                FROM users u
+                LEFT JOIN reservations r ON r.user_id = u.id AND r.status = 'active'
+                LEFT JOIN parking_spots ps ON r.spot_id = ps.id
+                LEFT JOIN parking_lots pl ON ps.lot_id = pl.id
+                WHERE u.id = ?
+            ''', (user_id,))
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+        
+        if row is None:
+            return None
+        reservation = None
+        if row['id'] is not None:
+            reservation = {key: row[key] for key in row.keys() if key != 'user_role'}
+        return {'role': row['user_role'], 'active_reservation': reservation}
+    
+    def get_receipt(self, reservation_id):
+        # A completed reservation with everything its receipt shows
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT r.id, r.user_id, u.username, u.email, pl.prime_location_name, pl.address, ps.spot_number,
+                       pl.price_per_hour, r.parking_timestamp, r.leaving_timestamp, r.parking_cost
+                FROM reservations r
+                JOIN users u ON r.user_id = u.id
+                JOIN parking_spots ps ON r.spot_id = ps.id
+                JOIN parking_lots pl ON ps.lot_id = pl.id
+                WHERE r.id = ? AND r.status = 'completed'
+            ''', (reservation_id,))
+            receipt = cursor.fetchone()
+        finally:
+            conn.close()
+        return dict(receipt) if receipt else None
+    
+    def get_user_totals(self, user_id):
         conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            sql, params = both_tiers(self.db, '''
+                SELECT parking_cost, status FROM {reservations} WHERE user_id = ?
+            ''', (user_id,))
+            cursor.execute(f'''
+                SELECT COUNT(*) as total_reservations,
+                       COALESCE(SUM(parking_cost), 0) as total_cost,
+                       COUNT(CASE WHEN status = 'active' THEN 1 END) as active_reservations
+                FROM ({sql})
+            ''', params)
+            totals = dict(cursor.fetchone())
+        finally:
+            conn.close()
+        return totals
+    
+    def get_all_reservations(self):
+        conn = self.db.get_read_connection()
+        try:
+            cursor = conn.cursor()
+            sql, params = both_tiers(self.db, f'''
+                SELECT {RESERVATION_COLUMNS}, ps.spot_number, pl.prime_location_name, u.username
+                FROM {{reservations}} r
+                JOIN parking_spots ps ON r.spot_id = ps.id
+                JOIN parking_lots pl ON ps.lot_id = pl.id
+                JOIN users u ON r.user_id = u.id
+            ''')
+            cursor.execute(sql + ' ORDER BY parking_timestamp DESC', params)
+            reservations = cursor.fetchall()
+        finally:
+            conn.close()
+        return reservations
+    
+    def iter_reservations(self, since=None, until=None, lot_id=None, batch_size=1000):
+        # Yields lists of at most batch_size rows, oldest first. The connection
+        # (and its read snapshot) is held until the generator is exhausted or
+        # closed, so callers streaming to a client should close it on abort.
+        conditions = []
+        params = []
+        if since:
+            conditions.append('r.parking_timestamp >= ?')
+            params.append(since)
+        if until:
+            conditions.append('r.parking_timestamp < ?')
+            params.append(until)
+        if lot_id:
+            # Unary + keeps the planner on the parking_timestamp index; going
+            # through the lot's spots instead would sort every matching row
+            # in a temp b-tree before the first one comes back
+            conditions.append('+ps.lot_id = ?')
+            params.append(lot_id)
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+        
+        conn = self.db.get_read_connection()
         cursor = conn.cursor()
+        try:
+            # One read transaction, so rows moving to the archive mid-export
+            # are seen in exactly one tier
+            cursor.execute('BEGIN')
+            sql, params = both_tiers(self.db, f'''
+                SELECT {RESERVATION_COLUMNS}, ps.lot_id, ps.spot_number, pl.prime_location_name, u.username
+                FROM {{reservations}} r
+                JOIN parking_spots ps ON r.spot_id = ps.id
+                JOIN parking_lots pl ON ps.lot_id = pl.id
+                JOIN users u ON r.user_id = u.id
+                {where}
+            ''', params)
+            cursor.execute(sql + ' ORDER BY parking_timestamp, id', params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+    
+    def get_reservations_page(self, limit=50, after=None, status=None):
+        # Keyset pagination over (parking_timestamp, id) descending; `after` is
+        # the (parking_timestamp, id) of the last row of the previous page
+        conditions = []
+        params = []
+        if status:
+            conditions.append('r.status = ?')
+            params.append(status)
+        if after:
+            conditions.append('(r.parking_timestamp, r.id) < (?, ?)')
+            params.extend(after)
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+        
+        conn = self.db.get_read_connection()
+        try:
+            cursor = conn.cursor()
+            if status == 'active':
+                # Active reservations are never archived
+                sql = f'''
+                    SELECT r.*, ps.spot_number, pl.prime_location_name, u.username
+                    FROM reservations r
+                    JOIN parking_spots ps ON r.spot_id = ps.id
+                    JOIN parking_lots pl ON ps.lot_id = pl.id
+                    JOIN users u ON r.user_id = u.id
+                    {where}
+                '''
+            else:
+                sql, params = both_tiers(self.db, f'''
+                    SELECT {RESERVATION_COLUMNS}, ps.spot_number, pl.prime_location_name, u.username
+                    FROM {{reservations}} r
+                    JOIN parking_spots ps ON r.spot_id = ps.id
+                    JOIN parking_lots pl ON ps.lot_id = pl.id
+                    JOIN users u ON r.user_id = u.id
+                    {where}
+                ''', params)
+            cursor.execute(sql + ' ORDER BY parking_timestamp DESC, id DESC LIMIT ?', (*params, limit + 1))
+            reservations = cursor.fetchall()
+        finally:
+            conn.close()
+        
+        next_after = None
+        if len(reservations) > limit:
+            reservations = reservations[:limit]
+            next_after = (reservations[-1]['parking_timestamp'], reservations[-1]['id'])
+        return reservations, next_after
+    
+    def count_reservations(self, status=None):
+        conn = self.db.get_read_connection()
+        try:
+            cursor = conn.cursor()
+            if status == 'active':
+                cursor.execute('SELECT COUNT(*) FROM reservations WHERE status = ?', (status,))
+                count = cursor.fetchone()[0]
+            elif status:
+                sql, params = both_tiers(self.db, 'SELECT COUNT(*) FROM {reservations} WHERE status = ?', (status,))
+                count = sum(row[0] for row in cursor.execute(sql, params).fetchall())
+            else:
+                sql, params = both_tiers(self.db, 'SELECT COUNT(*) FROM {reservations}')
+                count = sum(row[0] for row in cursor.execute(sql, params).fetchall())
+        finally:
+            conn.close()
+        return count
+    
+    def archive_completed(self, older_than_days=90, batch_size=500, pause=0.05, max_batches=None):
+        # Move completed reservations that ended more than older_than_days ago
+        # into the archive, batch_size rows per write transaction with a short
+        # pause between batches so bookings waiting on the write lock get in.
+        # Returns the number of rows moved, or None if a batch failed.
+        cutoff = to_timestamp(time.time() - older_than_days * 86400)
+        moved = batches = 0
+        while max_batches is None or batches < max_batches:
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+        
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                # Oldest rows have the lowest ids, so walking the rowid stops
+                # after the first batch_size matches
+                cursor.execute('''
+                    SELECT id FROM reservations
+                    WHERE status = 'completed' AND leaving_timestamp < ?
+                    ORDER BY id LIMIT ?
+                ''', (cutoff, batch_size))
+                ids = [row['id'] for row in cursor.fetchall()]
+                if not ids:
+                    conn.rollback()
+                    break
+        
+                placeholders = ','.join('?' * len(ids))
+                # With an attached archive file the two tables commit
+                # separately; OR IGNORE makes re-running a half-moved batch safe
+                cursor.execute(f'''
+                    INSERT OR IGNORE INTO {self.db.archive_table}
+                        (id, spot_id, user_id, parking_timestamp, leaving_timestamp, parking_cost, status)
+                    SELECT id, spot_id, user_id, parking_timestamp, leaving_timestamp, parking_cost, status
+                    FROM reservations WHERE id IN ({placeholders})
+                ''', ids)
+                cursor.execute(f'DELETE FROM reservations WHERE id IN ({placeholders})', ids)
+                conn.commit()
+                moved += len(ids)
+                batches += 1
+            except Exception as e:
+                conn.rollback()
+                return None
+            finally:
+                conn.close()
+        
+            if len(ids) < batch_size:
+                break
+            time.sleep(pause)
+        
+        return moved
+    
+    def tier_counts(self):
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM reservations')
+            live = cursor.fetchone()[0]
+            cursor.execute(f'SELECT COUNT(*) FROM {self.db.archive_table}')
+            archived = cursor.fetchone()[0]
+        finally:
+            conn.close()
+        return {'live': live, 'archived': archived}
+
+def to_timestamp(epoch):
+    # Same UTC text format SQLite's CURRENT_TIMESTAMP produces
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+class SlotBooking:
+    # Advance bookings for a time window. Conflicts are answered by the
+    # in-memory SlotIndex and confirmed against slot_bookings inside the
+    # write transaction before anything is inserted.
+    def __init__(self, db, index=None, cache=None, events=None, walkin_buffer=7200, user_state=None):
+        self.db = db
+        self.index = index
+        self.cache = cache
+        self.events = events
+        # Windows starting this soon also avoid spots that are occupied right now
+        self.walkin_buffer = walkin_buffer
+        # sessions.UserState: check-ins drop the user's cached entry
+        self.user_state = user_state
+    
+    def load_upcoming(self):
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, spot_id,
+                       CAST(strftime('%s', start_at) AS INTEGER) as start_ts,
+                       CAST(strftime('%s', end_at) AS INTEGER) as end_ts
+                FROM slot_bookings
+                WHERE status != 'cancelled' AND end_at > CURRENT_TIMESTAMP
+            ''')
+            bookings = cursor.fetchall()
+        finally:
+            conn.close()
+        return bookings
+    
+    def _spot_bookings(self, cursor, spot_id):
         cursor.execute('''
-            SELECT r.*, ps.spot_number, pl.prime_location_name, u.username
-            FROM reservations r
-            JOIN parking_spots ps ON r.spot_id = ps.id
-            JOIN parking_lots pl ON ps.lot_id = pl.id
-            JOIN users u ON r.user_id = u.id
-            ORDER BY r.parking_timestamp DESC
-        ''')
-        reservations = cursor.fetchall()
-        conn.close()
-        return reservations
\ No newline at end of file
+            SELECT id, spot_id,
+                   CAST(strftime('%s', start_at) AS INTEGER) as start_ts,
+                   CAST(strftime('%s', end_at) AS INTEGER) as end_ts
+            FROM slot_bookings
+            WHERE spot_id = ? AND status != 'cancelled' AND end_at > CURRENT_TIMESTAMP
+        ''', (spot_id,))
+        return cursor.fetchall()
+    
+    def _candidate_spots(self, cursor, lot_id, start):
+        cursor.execute('''
+            SELECT id, status FROM parking_spots
+            WHERE lot_id = ?
+            ORDER BY spot_number
+        ''', (lot_id,))
+        near = start < time.time() + self.walkin_buffer
+        return [spot['id'] for spot in cursor.fetchall() if not (near and spot['status'] == 'O')]
+    
+    def _free_spots(self, cursor, spot_ids, start, end):
+        # Spots free for [start, end), in spot_number order
+        if self.index is not None:
+            return (spot_id for spot_id in spot_ids if self.index.is_free(spot_id, start, end))
+        start_at, end_at = to_timestamp(start), to_timestamp(end)
+        return (spot_id for spot_id in spot_ids if not slot_conflict(cursor, spot_id, start_at, end_at))
+    
+    def user_has_overlap(self, user_id, start, end):
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT 1 FROM slot_bookings
+                WHERE user_id = ? AND status != 'cancelled' AND start_at < ? AND end_at > ?
+                LIMIT 1
+            ''', (user_id, to_timestamp(end), to_timestamp(start)))
+            overlap = cursor.fetchone() is not None
+        finally:
+            conn.close()
+        return overlap
+    
+    def count_available(self, lot_id, start, end):
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            spot_ids = self._candidate_spots(cursor, lot_id, start)
+            if self.index is not None:
+                count = self.index.count_free(spot_ids, start, end)
+            else:
+                count = sum(1 for _ in self._free_spots(cursor, spot_ids, start, end))
+        finally:
+            conn.close()
+        return count
+    
+    def book_slot(self, lot_id, user_id, start, end, max_retries=5):
+        # start/end are epoch seconds. Returns the booking, None if no spot is
+        # free for the whole window, or False on error / persistent contention.
+        start_at, end_at = to_timestamp(start), to_timestamp(end)
+        for attempt in range(max_retries):
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                
+                booked_spot = None
+                for spot_id in self._free_spots(cursor, self._candidate_spots(cursor, lot_id, start), start, end):
+                    if self.index is not None and slot_conflict(cursor, spot_id, start_at, end_at):
+                        # Another worker booked it; resync this spot and move on
+                        self.index.reload_spot(spot_id, self._spot_bookings(cursor, spot_id))
+                        continue
+                    booked_spot = spot_id
+                    break
+                
+                if booked_spot is None:
+                    conn.rollback()
+                    return None
+                
+                cursor.execute('''
+                    INSERT INTO slot_bookings (spot_id, lot_id, user_id, start_at, end_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (booked_spot, lot_id, user_id, start_at, end_at))
+                booking_id = cursor.lastrowid
+                # Read back on this connection: a second one from the pool
+                # while this is held can wait on every other booker
+                booking = self._read_booking(cursor, booking_id)
+                conn.commit()
+                
+                if self.index is not None:
+                    self.index.add(booked_spot, start, end, booking_id)
+                return booking
+            except sqlite3.OperationalError as e:
+                conn.rollback()
+                if 'locked' not in str(e) and 'busy' not in str(e):
+                    return False
+            except Exception as e:
+                conn.rollback()
+                return False
+            finally:
+                conn.close()
+            
+            time.sleep(min(0.5, 0.01 * (2 ** attempt)))
+        
+        return False
+    
+    def get_booking(self, booking_id):
+        conn = self.db.get_connection()
+        try:
+            booking = self._read_booking(conn.cursor(), booking_id)
+        finally:
+            conn.close()
+        return booking
+    
+    def _read_booking(self, cursor, booking_id):
+        cursor.execute('''
+            SELECT sb.*, ps.spot_number, pl.prime_location_name
+            FROM slot_bookings sb
+            JOIN parking_spots ps ON sb.spot_id = ps.id
+            JOIN parking_lots pl ON sb.lot_id = pl.id
+            WHERE sb.id = ?
+        ''', (booking_id,))
+        return cursor.fetchone()
+    
+    def get_user_bookings(self, user_id):
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT sb.*, ps.spot_number, pl.prime_location_name
+                FROM slot_bookings sb
+                JOIN parking_spots ps ON sb.spot_id = ps.id
+                JOIN parking_lots pl ON sb.lot_id = pl.id
+                WHERE sb.user_id = ? AND sb.status = 'booked' AND sb.end_at > CURRENT_TIMESTAMP
+                ORDER BY sb.start_at
+            ''', (user_id,))
+            bookings = cursor.fetchall()
+        finally:
+            conn.close()
+        return bookings
+    
+    def cancel_slot(self, booking_id, user_id):
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                UPDATE slot_bookings SET status = 'cancelled'
+                WHERE id = ? AND user_id = ? AND status = 'booked'
+            ''', (booking_id, user_id))
+            if cursor.rowcount != 1:
+                return False
+            conn.commit()
+            if self.index is not None:
+                self.index.remove(booking_id)
+            return True
+        except Exception as e:
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+    
+    def check_in(self, booking_id, user_id, early=900):
+        # Turn a booking into an active reservation on its spot, from `early`
+        # seconds before the window starts until it ends. Returns the booking,
+        # None if it can't be used now (wrong time, already parked, spot still
+        # occupied), or False on error.
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+                SELECT *, CAST(strftime('%s', start_at) AS INTEGER) as start_ts,
+                       CAST(strftime('%s', end_at) AS INTEGER) as end_ts
+                FROM slot_bookings
+                WHERE id = ? AND user_id = ? AND status = 'booked'
+            ''', (booking_id, user_id))
+            booking = cursor.fetchone()
+            now = time.time()
+            if not booking or not booking['start_ts'] - early <= now < booking['end_ts']:
+                conn.rollback()
+                return None
+            
+            cursor.execute('''
+                SELECT 1 FROM reservations 
+                WHERE user_id = ? AND status = 'active' LIMIT 1
+            ''', (user_id,))
+            if cursor.fetchone() or not claim_spot(cursor, booking['spot_id'], user_id):
+                conn.rollback()
+                return None
+            
+            cursor.execute("UPDATE slot_bookings SET status = 'checked_in' WHERE id = ?", (booking_id,))
+            occupancy = read_occupancy(cursor, self.events, booking['lot_id'])
+            conn.commit()
+            invalidate_lots(self.cache, booking['lot_id'])
+            if self.user_state is not None:
+                self.user_state.invalidate(user_id)
+            publish_occupancy(self.events, occupancy)
+            return booking
+        except Exception as e:
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
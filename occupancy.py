@@ -0,0 +1,110 @@
+# In-memory spot occupancy per lot: one byte per spot number (FREE, TAKEN,
+# or NONE where the lot has no spot with that number) plus the matching spot
+# ids, so "first free spot" is a bytearray.find (memchr) instead of an index
+# walk. Every bitmap is stamped with the lot's occupancy_version, which the
+# parking_spots triggers bump on each change; a bitmap is only handed out for
+# the version the caller just read, so it is exact whenever it is used, even
+# with several worker processes writing.
+#
+# Stored bitmaps are never mutated. Writers take a copy inside their write
+# transaction, mark their own changes on it and put it back after commit.
+from array import array
+import threading
+
+FREE = 0
+TAKEN = 1
+NONE = 2
+
+# Packed form: one bit per spot number, most significant bit first,
+# 1 = not bookable (taken, or no such spot)
+PACKED_BITS = bytes.maketrans(bytes([FREE, TAKEN, NONE]), b'011')
+
+class LotBitmap:
+    __slots__ = ('version', 'states', 'ids')
+
+    def __init__(self, version, states, ids):
+        self.version = version
+        self.states = states
+        self.ids = ids
+
+    @classmethod
+    def from_rows(cls, version, spots):
+        # spots: rows with id, spot_number and status. Returns None for lots
+        # the bitmap can't represent (spot numbers below 1 or repeated).
+        spots = list(spots)
+        size = max((spot['spot_number'] for spot in spots), default=0)
+        states = bytearray([NONE]) * size
+        ids = array('q', [0]) * size
+        for spot in spots:
+            i = spot['spot_number'] - 1
+            if i < 0 or ids[i]:
+                return None
+            ids[i] = spot['id']
+            states[i] = FREE if spot['status'] == 'A' else TAKEN
+        return cls(version, states, ids)
+
+    def copy(self):
+        # Spot ids only change with inserts/deletes, which bump the version
+        # and force a reload, so copies share them
+        return LotBitmap(self.version, bytearray(self.states), self.ids)
+
+    def free_spots(self):
+        # (spot_number, spot_id) of free spots in spot_number order
+        i = self.states.find(FREE)
+        while i != -1:
+            yield i + 1, self.ids[i]
+            i = self.states.find(FREE, i + 1)
+
+    def mark(self, spot_number, taken):
+        self.states[spot_number - 1] = TAKEN if taken else FREE
+
+    def available(self):
+        return self.states.count(FREE)
+
+    def packed(self):
+        bits = self.states.translate(PACKED_BITS)
+        if not bits:
+            return b''
+        padding = -len(bits) % 8
+        return int(bits + b'0' * padding, 2).to_bytes((len(bits) + padding) // 8, 'big')
+
+    def __len__(self):
+        return len(self.states)
+
+class OccupancyIndex:
+    def __init__(self):
+        self._lots = {}
+        self._lock = threading.Lock()
+
+    def get(self, lot_id, version):
+        with self._lock:
+            bitmap = self._lots.get(lot_id)
+        if bitmap is None or bitmap.version != version:
+            return None
+        return bitmap
+
+    def put(self, lot_id, bitmap):
+        # Versions only grow, so the newest bitmap wins whatever order
+        # concurrent writers get here in
+        with self._lock:
+            current = self._lots.get(lot_id)
+            if current is None or current.version < bitmap.version:
+                self._lots[lot_id] = bitmap
+
+    def remove(self, lot_id):
+        with self._lock:
+            self._lots.pop(lot_id, None)
+
+    def on_event(self, event, data):
+        # EventBus listener: drop bitmaps of deleted lots
+        if event == 'lot_deleted':
+            self.remove(data['lot_id'])
+
+    def stats(self):
+        with self._lock:
+            bitmaps = list(self._lots.values())
+        return {
+            'lots': len(bitmaps),
+            'spots': sum(len(bitmap) for bitmap in bitmaps),
+            'bytes': sum(len(bitmap.states) + bitmap.ids.itemsize * len(bitmap.ids) for bitmap in bitmaps)
+        }
@@ -0,0 +1,232 @@
+# Occupancy forecasting and dynamic pricing on top of price_per_hour.
+#
+# OccupancyForecaster keeps a per-lot histogram of occupied spot-hours by
+# hour of the week (168 buckets, UTC, Monday 00:00 = 0) in the
+# occupancy_rollups table. update_rollups() only reads reservations that
+# overlap the time since its last watermark, so it is cheap to run often
+# (the occupancy-rollup job). Forecasts come from per-lot rate arrays built
+# from those rollups and refreshed every `refresh` seconds, so a forecast is
+# a couple of array lookups per lot and never touches reservation history.
+#
+# The near-term forecast blends the lot's current occupancy with the
+# historical rate for each coming hour, trusting the current value less the
+# further ahead the hour is (weight exp(-hours ahead / decay_hours)).
+#
+# DynamicPricing turns the forecast into an hourly rate with PricingRules.
+from array import array
+import math
+import threading
+import time
+
+from models import both_tiers, to_timestamp
+
+HOURS_PER_WEEK = 168
+WEEK = HOURS_PER_WEEK * 3600
+# The Unix epoch fell on a Thursday, 72 hours into its week
+EPOCH_HOUR_OF_WEEK = 72
+
+def hour_of_week(epoch):
+    return (int(epoch // 3600) + EPOCH_HOUR_OF_WEEK) % HOURS_PER_WEEK
+
+def split_by_hour(start, end):
+    # (hour_of_week, hours) pieces of [start, end), cut at hour boundaries
+    while start < end:
+        boundary = min(end, (start // 3600 + 1) * 3600)
+        yield hour_of_week(start), (boundary - start) / 3600
+        start = boundary
+
+def observed_hours(start, end):
+    # How many hours of each hour-of-week bucket [start, end) covers
+    weeks, rest = divmod(max(0, end - start), WEEK)
+    hours = [float(weeks)] * HOURS_PER_WEEK
+    for bucket, length in split_by_hour(end - rest, end):
+        hours[bucket] += length
+    return hours
+
+class PricingRules:
+    # (threshold, multiplier) pairs on forecast occupancy (0..1): the
+    # highest threshold the forecast reaches sets the multiplier, 1.0 below
+    # all of them. Parsed from e.g. '0.9:1.5,0.75:1.25,0:0.9'.
+    def __init__(self, rules=()):
+        self.rules = sorted(rules, reverse=True)
+
+    @classmethod
+    def parse(cls, spec):
+        rules = []
+        for part in spec.split(','):
+            if not part.strip():
+                continue
+            threshold, multiplier = part.split(':')
+            rules.append((float(threshold), float(multiplier)))
+        return cls(rules)
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def multiplier(self, occupancy):
+        for threshold, multiplier in self.rules:
+            if occupancy >= threshold:
+                return multiplier
+        return 1.0
+
+class OccupancyForecaster:
+    def __init__(self, db, history_weeks=8, decay_hours=1.5, refresh=300, lag=60):
+        self.db = db
+        # A first rollup starts this far back
+        self.history_weeks = history_weeks
+        self.decay_hours = decay_hours
+        self.refresh = refresh
+        # Rollups stop this many seconds short of now, so reservations
+        # committed just after their parking_timestamp aren't missed
+        self.lag = lag
+        self._rates = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def update_rollups(self):
+        # Add the occupied hours between the watermark and now to the
+        # histograms. History is read outside the write lock; the write
+        # moves the watermark only if nobody else did meanwhile. Returns the
+        # hours of wall-clock time rolled up, or None on error.
+        until = int(time.time()) - self.lag
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                INSERT OR IGNORE INTO occupancy_rollup_state (id, since, watermark) VALUES (1, ?, ?)
+            ''', (until - int(self.history_weeks * WEEK),) * 2)
+            conn.commit()
+            start = cursor.execute('SELECT watermark FROM occupancy_rollup_state WHERE id = 1').fetchone()[0]
+            if until <= start:
+                return 0.0
+            hours = self._occupied_hours(cursor, start, until)
+
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('UPDATE occupancy_rollup_state SET watermark = ? WHERE id = 1 AND watermark = ?',
+                           (until, start))
+            if cursor.rowcount != 1:
+                conn.rollback()
+                return 0.0
+            cursor.executemany('''
+                INSERT INTO occupancy_rollups (lot_id, hour_of_week, occupied_hours) VALUES (?, ?, ?)
+                ON CONFLICT (lot_id, hour_of_week) DO UPDATE SET occupied_hours = occupied_hours + excluded.occupied_hours
+            ''', [(lot_id, bucket, length) for (lot_id, bucket), length in hours.items()])
+            conn.commit()
+            return round((until - start) / 3600, 2)
+        except Exception as e:
+            conn.rollback()
+            return None
+        finally:
+            conn.close()
+
+    def _occupied_hours(self, cursor, start, end):
+        # {(lot_id, hour_of_week): occupied hours} over [start, end) from the
+        # reservations parked at some point in that window: still
+        # parked, or left after start. Both come off the leaving_timestamp
+        # index; the unary + keeps the planner off the parking_timestamp one,
+        # whose range covers nearly the whole table.
+        select = '''
+            SELECT ps.lot_id, CAST(strftime('%s', r.parking_timestamp) AS INTEGER) as parked,
+                   CAST(strftime('%s', r.leaving_timestamp) AS INTEGER) as left_at
+            FROM {reservations} r JOIN parking_spots ps ON r.spot_id = ps.id
+            WHERE (r.leaving_timestamp IS NULL OR r.leaving_timestamp > ?) AND +r.parking_timestamp < ?
+        '''
+        sql, params = both_tiers(self.db, select, (to_timestamp(start), to_timestamp(end)))
+        hours = {}
+        for lot_id, parked, left_at in cursor.execute(sql, params):
+            if parked is None:
+                continue
+            for bucket, length in split_by_hour(max(parked, start), min(left_at or end, end)):
+                hours[lot_id, bucket] = hours.get((lot_id, bucket), 0) + length
+        return hours
+
+    def _load(self, cursor=None):
+        # Per lot: historical occupancy rate for each hour of the week, or
+        # NaN where the lot wasn't observed at that hour yet. Callers inside
+        # a write transaction pass its cursor: a second pool connection taken
+        # while holding the write lock can wait on connections whose owners
+        # are waiting on that lock.
+        if cursor is None:
+            conn = self.db.get_connection()
+            try:
+                return self._load(conn.cursor())
+            finally:
+                conn.close()
+        cursor.execute('SELECT since, watermark FROM occupancy_rollup_state WHERE id = 1')
+        state = cursor.fetchone()
+        rates = {}
+        if state is not None:
+            cursor.execute('''
+                SELECT id, total_spots, CAST(strftime('%s', created_at) AS INTEGER) as created FROM parking_lots
+            ''')
+            lots = cursor.fetchall()
+            cursor.execute('SELECT lot_id, hour_of_week, occupied_hours FROM occupancy_rollups')
+            occupied = {}
+            for lot_id, bucket, hours in cursor.fetchall():
+                occupied.setdefault(lot_id, {})[bucket] = hours
+
+            for lot in lots:
+                observed = observed_hours(max(state['since'], lot['created'] or 0), state['watermark'])
+                spots = lot['total_spots'] or 0
+                lot_occupied = occupied.get(lot['id'], {})
+                rates[lot['id']] = array('d', (
+                    min(1.0, lot_occupied.get(bucket, 0.0) / (observed[bucket] * spots))
+                    if observed[bucket] and spots else math.nan
+                    for bucket in range(HOURS_PER_WEEK)))
+        return rates
+
+    def rates(self, lot_id, cursor=None):
+        with self._lock:
+            stale = self._loaded_at is None or time.time() - self._loaded_at > self.refresh
+        if stale:
+            rates = self._load(cursor)
+            with self._lock:
+                self._rates = rates
+                self._loaded_at = time.time()
+        return self._rates.get(lot_id)
+
+    def invalidate(self):
+        # Reload on the next forecast (after update_rollups in this process)
+        with self._lock:
+            self._loaded_at = None
+
+    def forecast(self, lot_id, current, hours_ahead, now=None, cursor=None):
+        # Expected occupancy hours_ahead hours from now, given the current
+        # occupancy (0..1)
+        rates = self.rates(lot_id, cursor)
+        if rates is None:
+            return current
+        historical = rates[hour_of_week((now or time.time()) + hours_ahead * 3600)]
+        if math.isnan(historical):
+            return current
+        weight = math.exp(-hours_ahead / self.decay_hours)
+        return weight * current + (1 - weight) * historical
+
+    def expected(self, lot_id, current, horizon_hours, now=None, cursor=None):
+        # Mean forecast over the next horizon_hours hours
+        now = now or time.time()
+        hours = max(1, int(horizon_hours))
+        return sum(self.forecast(lot_id, current, hour, now, cursor) for hour in range(hours)) / hours
+
+class DynamicPricing:
+    def __init__(self, forecaster, rules, horizon_hours=2):
+        self.forecaster = forecaster
+        self.rules = rules
+        self.horizon_hours = horizon_hours
+
+    def quote(self, lot_id, lot, now=None, cursor=None):
+        # lot: row with price_per_hour, total_spots and occupied_spots;
+        # cursor: the caller's transaction, if it is in one
+        total = lot['total_spots'] or 0
+        current = (lot['occupied_spots'] or 0) / total if total else 0.0
+        occupancy = self.forecaster.expected(lot_id, current, self.horizon_hours, now, cursor)
+        multiplier = self.rules.multiplier(occupancy)
+        return {
+            'forecast_occupancy': round(occupancy, 4),
+            'multiplier': multiplier,
+            'hourly_rate': round(lot['price_per_hour'] * multiplier, 2)
+        }
+
+    def hourly_rate(self, lot_id, lot, now=None, cursor=None):
+        return self.quote(lot_id, lot, now, cursor)['hourly_rate']
@@ -0,0 +1,92 @@
+# Slotted row records for the hot read paths. Each class names exactly the
+# columns its queries select, in SELECT order, and is built straight from the
+# sqlite3 tuple by a per-cursor row factory, so no sqlite3.Row (or dict) is
+# made per row. Records read like rows: record.name, record['name'],
+# record[0] and dict(record) all work.
+
+class Record:
+    # Subclasses list their columns in __slots__ and take them positionally
+    # in __init__, in the same order
+    __slots__ = ()
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        # sqlite3 row_factory signature
+        return cls(*row)
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            key = self.__slots__[key]
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self.__slots__
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+def fetch_records(cursor, record):
+    # Build `record` objects for whatever the cursor executes next
+    cursor.row_factory = record.from_row
+    return cursor
+
+class Lot(Record):
+    # parking_lots without created_at, which nothing reads
+    __slots__ = ('id', 'prime_location_name', 'address', 'pin_code', 'price_per_hour', 'maximum_number_of_spots',
+                 'latitude', 'longitude', 'total_spots', 'available_spots', 'occupied_spots', 'occupancy_version')
+
+    def __init__(self, id, prime_location_name, address, pin_code, price_per_hour, maximum_number_of_spots,
+                 latitude, longitude, total_spots, available_spots, occupied_spots, occupancy_version):
+        self.id = id
+        self.prime_location_name = prime_location_name
+        self.address = address
+        self.pin_code = pin_code
+        self.price_per_hour = price_per_hour
+        self.maximum_number_of_spots = maximum_number_of_spots
+        self.latitude = latitude
+        self.longitude = longitude
+        self.total_spots = total_spots
+        self.available_spots = available_spots
+        self.occupied_spots = occupied_spots
+        self.occupancy_version = occupancy_version
+
+class SpotCell(Record):
+    # One spot of the admin grid, with its current parker if any
+    __slots__ = ('id', 'spot_number', 'status', 'user_id', 'username', 'parking_timestamp')
+
+    def __init__(self, id, spot_number, status, user_id, username, parking_timestamp):
+        self.id = id
+        self.spot_number = spot_number
+        self.status = status
+        self.user_id = user_id
+        self.username = username
+        self.parking_timestamp = parking_timestamp
+
+class ReservationSummary(Record):
+    # One line of a user's parking history
+    __slots__ = ('id', 'spot_id', 'spot_number', 'prime_location_name', 'address', 'parking_timestamp',
+                 'leaving_timestamp', 'parking_cost', 'status')
+
+    def __init__(self, id, spot_id, spot_number, prime_location_name, address, parking_timestamp,
+                 leaving_timestamp, parking_cost, status):
+        self.id = id
+        self.spot_id = spot_id
+        self.spot_number = spot_number
+        self.prime_location_name = prime_location_name
+        self.address = address
+        self.parking_timestamp = parking_timestamp
+        self.leaving_timestamp = leaving_timestamp
+        self.parking_cost = parking_cost
+        self.status = status
+
+LOT_COLUMNS = ', '.join(Lot.__slots__)
@@ -0,0 +1,116 @@
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+def _hash(password, method, salt_length):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+def _check(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+class PasswordHasher:
+    # Werkzeug hashing with a configurable method/cost. With workers > 0 the
+    # hashing runs in a process pool so a login surge doesn't hold the GIL
+    # for every other request in the worker.
+    def __init__(self, method='pbkdf2:sha256:600000', salt_length=16, workers=0):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = workers
+        self._pool = None
+        if workers:
+            # Create the pool while the process is still single threaded: with
+            # fork, all workers are started by the first submit below
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+            self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        # Werkzeug fills in default parameters (e.g. iterations), so take the
+        # canonical "method$" prefix from a real hash
+        self.prefix = self._run(_hash, '', method, 1).split('$', 1)[0]
+
+    def _run(self, fn, *args):
+        if self._pool is None:
+            return fn(*args)
+        return self._pool.submit(fn, *args).result()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        return self._run(_check, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.prefix
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+class LoginThrottle:
+    # Sliding-window limits on failed attempts, checked before any password
+    # hashing is done: per username, and per client IP so one source can't
+    # spray many usernames. Successful logins never count, so users behind a
+    # shared NAT or proxy aren't locked out by a login surge.
+    def __init__(self, max_user_failures=5, max_ip_failures=30, window=300):
+        self.max_user_failures = max_user_failures
+        self.max_ip_failures = max_ip_failures
+        self.window = window
+        self._user_failures = {}
+        self._ip_failures = {}
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _prune(self, events, now):
+        while events and events[0] <= now - self.window:
+            events.popleft()
+
+    def _retry_after(self, events, limit, now):
+        self._prune(events, now)
+        if len(events) >= limit:
+            return max(1, int(events[0] + self.window - now) + 1)
+        return 0
+
+    def check(self, username, ip):
+        # Returns seconds to wait, or 0 if the attempt may proceed
+        now = time.monotonic()
+        with self._lock:
+            user_events = self._user_failures.get(username, deque())
+            ip_events = self._ip_failures.get(ip, deque())
+            retry_after = max(self._retry_after(user_events, self.max_user_failures, now),
+                              self._retry_after(ip_events, self.max_ip_failures, now))
+            if retry_after:
+                self.rejected += 1
+            return retry_after
+
+    def failure(self, username, ip):
+        now = time.monotonic()
+        with self._lock:
+            self._user_failures.setdefault(username, deque()).append(now)
+            self._ip_failures.setdefault(ip, deque()).append(now)
+            self._evict(now)
+
+    def success(self, username):
+        with self._lock:
+            self._user_failures.pop(username, None)
+
+    def _evict(self, now):
+        # Keep memory bounded under a spray of distinct usernames/IPs
+        if len(self._ip_failures) + len(self._user_failures) < 10000:
+            return
+        for table in (self._ip_failures, self._user_failures):
+            for key in list(table):
+                self._prune(table[key], now)
+                if not table[key]:
+                    del table[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tracked_users': len(self._user_failures),
+                'tracked_ips': len(self._ip_failures),
+                'rejected': self.rejected
+            }
@@ -0,0 +1,153 @@
+# Server-side sessions and cached per-user state, kept in a CacheBackend so
+# every worker process (and, with a network cache, every node) sees the same
+# logins and the same answers:
+#
+#   memory  LocalCache, this process only; for a single worker
+#   sqlite  SQLiteCache, one file shared by the workers on a host
+#   shared  SharedCache on a network cache (a redis:// URL), or on DictStore
+#           standing in for one when no URL is given
+#
+# With server-side sessions the cookie only carries a signed random session
+# id. The id changes whenever the logged-in user does, so an id planted
+# before login is useless afterwards.
+import secrets
+
+from flask.sessions import SecureCookieSession, SessionInterface
+from itsdangerous import BadSignature, Signer
+
+from cache import DictStore, LocalCache, SharedCache, SQLiteCache
+
+STORES = ('memory', 'sqlite', 'shared')
+
+def create_store(backend, path=None, url=None, max_entries=100000, default_ttl=None, prefix='parkeasy:'):
+    if backend == 'memory':
+        return LocalCache(max_entries=max_entries, default_ttl=default_ttl)
+    if backend == 'sqlite':
+        return SQLiteCache(path, default_ttl=default_ttl)
+    if backend == 'shared':
+        if not url:
+            return SharedCache(DictStore(), prefix=prefix, default_ttl=default_ttl)
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('The shared store needs the redis package installed')
+        return SharedCache(redis.Redis.from_url(url), prefix=prefix, default_ttl=default_ttl)
+    raise ValueError(f'Unknown store {backend!r}; expected one of {", ".join(STORES)}')
+
+def session_key(sid):
+    return f'session:{sid}'
+
+def user_key(user_id):
+    return f'user:{user_id}'
+
+def generation_key(user_id):
+    return f'user-generation:{user_id}'
+
+class ServerSession(SecureCookieSession):
+    def __init__(self, sid, data=None, new=False):
+        super().__init__(data)
+        self.sid = sid
+        self.new = new
+        # Whose session this was when loaded; a different user_id on save
+        # means a login or logout and gets a fresh id
+        self.loaded_user_id = self.get('user_id')
+        self.accessed = False
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='parkeasy-session', key_derivation='hmac')
+
+    def load(self, app, cookie_value):
+        # The session a cookie value points at, or a new empty one
+        if cookie_value and app.secret_key:
+            try:
+                sid = self._signer(app).unsign(cookie_value).decode('ascii')
+            except BadSignature:
+                sid = None
+            data = self.store.get(session_key(sid)) if sid else None
+            if data is not None:
+                return ServerSession(sid, data)
+        return ServerSession(secrets.token_urlsafe(32), new=True)
+
+    def save(self, app, session):
+        # Store the session if it changed. Returns the cookie value to send,
+        # '' to delete the cookie, or None to leave it as it is.
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session_key(session.sid))
+                return ''
+            return None
+
+        if session.get('user_id') != session.loaded_user_id and not session.new:
+            self.store.delete(session_key(session.sid))
+            session.sid = secrets.token_urlsafe(32)
+            session.new = True
+        if session.modified or session.new:
+            ttl = int(app.permanent_session_lifetime.total_seconds())
+            self.store.set(session_key(session.sid), dict(session), ttl=ttl)
+            session.loaded_user_id = session.get('user_id')
+        if session.new:
+            session.new = False
+            return self._signer(app).sign(session.sid.encode('ascii')).decode('ascii')
+        return None
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+        return self.load(app, request.cookies.get(self.get_cookie_name(app)))
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+        value = self.save(app, session)
+        if value == '':
+            response.delete_cookie(name, domain=domain, path=path, secure=secure, samesite=samesite,
+                                   httponly=httponly)
+        elif value is not None:
+            response.set_cookie(name, value, expires=self.get_expiration_time(app, session), httponly=httponly,
+                                domain=domain, path=path, secure=secure, samesite=samesite)
+
+class UserState:
+    # What the hot routes ask about a user on every request, cached as
+    # {'role': ..., 'active_reservation': dict or None}. ParkingSpot and
+    # SlotBooking drop a user's entry after each commit that books or releases
+    # for them; the TTL bounds anything written behind their back.
+    def __init__(self, store, load, ttl=300):
+        self.store = store
+        # load(user_id) -> state dict, or None for an unknown user
+        self.load = load
+        self.ttl = ttl
+
+    def get(self, user_id):
+        state = self.store.get(user_key(user_id))
+        if state is None:
+            # A book or release can invalidate between the load and the set,
+            # leaving what was loaded out of date. Every invalidate writes a
+            # new generation first, so a changed one afterwards means the
+            # entry just written may be stale and goes again.
+            generation = self.store.get(generation_key(user_id))
+            state = self.load(user_id)
+            if state is not None:
+                self.store.set(user_key(user_id), state, ttl=self.ttl)
+                if self.store.get(generation_key(user_id)) != generation:
+                    self.store.delete(user_key(user_id))
+        return state
+
+    def peek(self, user_id):
+        # Cached state only, never a database read
+        return self.store.get(user_key(user_id))
+
+    def invalidate(self, *user_ids):
+        for user_id in user_ids:
+            self.store.set(generation_key(user_id), secrets.token_hex(8), ttl=self.ttl)
+        self.store.delete(*[user_key(user_id) for user_id in user_ids])
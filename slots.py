@@ -0,0 +1,108 @@
+# In-memory schedule of advance (time-slot) bookings. Each spot keeps its
+# booked intervals as parallel sorted lists; bookings on one spot never
+# overlap, so ends are sorted too and "is this spot free for [start, end)"
+# is a single bisect. Times are epoch seconds (UTC).
+#
+# The index is a per-process fast path: SlotBooking and walk-in allocation
+# (ParkingSpot) re-check the chosen spot against slot_bookings inside their
+# write transaction, so a stale index in one worker can cost a retry or a
+# skipped spot but never a double booking.
+import bisect
+import threading
+import time
+
+class SpotSchedule:
+    __slots__ = ('starts', 'ends', 'ids')
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+
+    def is_free(self, start, end):
+        i = bisect.bisect_left(self.starts, end) - 1
+        return i < 0 or self.ends[i] <= start
+
+    def add(self, start, end, booking_id):
+        i = bisect.bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.ids.insert(i, booking_id)
+
+    def remove(self, booking_id):
+        try:
+            i = self.ids.index(booking_id)
+        except ValueError:
+            return False
+        del self.starts[i], self.ends[i], self.ids[i]
+        return True
+
+    def prune(self, before):
+        # Drop bookings that ended by `before`; returns their ids
+        i = bisect.bisect_right(self.ends, before)
+        expired = self.ids[:i]
+        del self.starts[:i], self.ends[:i], self.ids[:i]
+        return expired
+
+    def __len__(self):
+        return len(self.ids)
+
+class SlotIndex:
+    def __init__(self):
+        self._spots = {}
+        self._booking_spot = {}
+        self._lock = threading.Lock()
+
+    def load(self, bookings):
+        # bookings: rows with id, spot_id, start_ts and end_ts
+        with self._lock:
+            for booking in bookings:
+                self._add(booking['spot_id'], booking['start_ts'], booking['end_ts'], booking['id'])
+
+    def _add(self, spot_id, start, end, booking_id):
+        schedule = self._spots.get(spot_id)
+        if schedule is None:
+            schedule = self._spots[spot_id] = SpotSchedule()
+        schedule.add(start, end, booking_id)
+        self._booking_spot[booking_id] = spot_id
+
+    def add(self, spot_id, start, end, booking_id):
+        with self._lock:
+            schedule = self._spots.get(spot_id)
+            if schedule is not None:
+                for expired in schedule.prune(time.time()):
+                    self._booking_spot.pop(expired, None)
+            self._add(spot_id, start, end, booking_id)
+
+    def remove(self, booking_id):
+        with self._lock:
+            spot_id = self._booking_spot.pop(booking_id, None)
+            if spot_id is not None and spot_id in self._spots:
+                self._spots[spot_id].remove(booking_id)
+
+    def reload_spot(self, spot_id, bookings):
+        # Replace one spot's schedule with what the database holds
+        with self._lock:
+            old = self._spots.pop(spot_id, None)
+            if old is not None:
+                for booking_id in old.ids:
+                    self._booking_spot.pop(booking_id, None)
+            for booking in bookings:
+                self._add(spot_id, booking['start_ts'], booking['end_ts'], booking['id'])
+
+    def is_free(self, spot_id, start, end):
+        with self._lock:
+            schedule = self._spots.get(spot_id)
+            return schedule is None or schedule.is_free(start, end)
+
+    def count_free(self, spot_ids, start, end):
+        with self._lock:
+            return sum(1 for spot_id in spot_ids
+                       if spot_id not in self._spots or self._spots[spot_id].is_free(start, end))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'spots': len(self._spots),
+                'bookings': len(self._booking_spot)
+            }
@@ -0,0 +1,199 @@
+# Connection pools behind Database. Every backend hands out DB-API
+# connections set up the same way (sqlite3.Row rows, WAL, the same PRAGMAs
+# and attached files) through acquire/release/close_all/stats, so the models
+# don't know which one they run on:
+#
+#   sqlite      ConnectionPool, the built-in pool
+#   sqlalchemy  SQLAlchemyPool, SQLAlchemy's QueuePool; DATABASE_PATH may be
+#               a sqlite:// URL
+#
+# The models' SQL is SQLite's dialect (PRAGMAs, triggers, ? placeholders,
+# BEGIN IMMEDIATE), so both backends only open SQLite databases for now.
+# Read-only pools (read_only=True) serve as replicas.
+import sqlite3
+import threading
+
+class PooledConnection:
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        # Hand the connection back to the pool instead of closing it
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+def configure_connection(conn, cache_size_kb, mmap_size, attach, read_only=False):
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute(f'PRAGMA cache_size = -{int(cache_size_kb)}')
+    conn.execute(f'PRAGMA mmap_size = {int(mmap_size)}')
+    for schema, path in attach.items():
+        conn.execute('ATTACH DATABASE ? AS ' + schema, (path,))
+        conn.execute(f'PRAGMA {schema}.journal_mode = WAL')
+    if read_only:
+        # Replica connections refuse writes instead of silently diverging
+        conn.execute('PRAGMA query_only = 1')
+
+class ConnectionPool:
+    def __init__(self, db_path, size=8, timeout=30.0, cache_size_kb=16384, mmap_size=268435456, attach=None,
+                 read_only=False):
+        self.db_path = db_path
+        # Extra database files attached to every connection: {schema: path}
+        self.attach = attach or {}
+        self.read_only = read_only
+        self.size = size
+        self.timeout = timeout
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        configure_connection(conn, self.cache_size_kb, self.mmap_size, self.attach, self.read_only)
+        return conn
+
+    def acquire(self):
+        with self._cond:
+            if not self._idle and self._created >= self.size:
+                self.waits += 1
+                # A slot also frees up when a broken connection is dropped
+                if not self._cond.wait_for(lambda: self._idle or self._created < self.size, timeout=self.timeout):
+                    raise sqlite3.OperationalError('Timed out waiting for a database connection')
+            if self._idle:
+                self.hits += 1
+                return self._idle.pop()
+            self._created += 1
+            self.misses += 1
+
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Broken connection, drop it and free its slot
+            conn.close()
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            for conn in self._idle:
+                conn.close()
+            self._created -= len(self._idle)
+            self._idle = []
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': self._created,
+                'idle': len(self._idle),
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits
+            }
+
+class SQLAlchemyPool:
+    # The same interface on SQLAlchemy's QueuePool, which adds pre-ping,
+    # connection recycling and overflow connections on top of pooling.
+    # Connections come back as SQLAlchemy's proxies around sqlite3
+    # connections; they forward everything the models use.
+    def __init__(self, db_path, size=8, timeout=30.0, cache_size_kb=16384, mmap_size=268435456, attach=None,
+                 read_only=False, max_overflow=0, recycle=-1, pre_ping=False):
+        try:
+            import sqlalchemy
+        except ImportError:
+            raise RuntimeError('The sqlalchemy storage backend needs SQLAlchemy installed')
+
+        url = sqlalchemy.engine.make_url(db_path if '://' in db_path else f'sqlite:///{db_path}')
+        if url.get_backend_name() != 'sqlite':
+            raise ValueError(f'Unsupported database {url.render_as_string()!r}: the models use SQLite SQL')
+        self.engine = sqlalchemy.create_engine(url, poolclass=sqlalchemy.pool.QueuePool, pool_size=size,
+                                               max_overflow=max_overflow, pool_timeout=timeout,
+                                               pool_recycle=recycle, pool_pre_ping=pre_ping,
+                                               connect_args={'timeout': timeout, 'check_same_thread': False})
+
+        self.db_path = self.engine.url.database
+        self.size = size
+        self._pool_timeout = sqlalchemy.exc.TimeoutError
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self._lock = threading.Lock()
+
+        attach = attach or {}
+
+        @sqlalchemy.event.listens_for(self.engine, 'connect')
+        def on_connect(conn, record):
+            configure_connection(conn, cache_size_kb, mmap_size, attach, read_only)
+            with self._lock:
+                self.misses += 1
+
+    def acquire(self):
+        pool = self.engine.pool
+        with self._lock:
+            if pool.checkedin() == 0 and pool.checkedout() >= self.size:
+                self.waits += 1
+        try:
+            conn = self.engine.raw_connection()
+        except self._pool_timeout:
+            raise sqlite3.OperationalError('Timed out waiting for a database connection')
+        with self._lock:
+            self.hits += 1
+        return conn
+
+    def release(self, conn):
+        # The pool rolls back anything left open and keeps the connection
+        conn.close()
+
+    def close_all(self):
+        self.engine.dispose()
+
+    def stats(self):
+        pool = self.engine.pool
+        with self._lock:
+            return {
+                'size': self.size,
+                'open': pool.checkedin() + pool.checkedout(),
+                'idle': pool.checkedin(),
+                'hits': self.hits - self.misses,
+                'misses': self.misses,
+                'waits': self.waits,
+                'overflow': max(0, pool.overflow())
+            }
+
+BACKENDS = {
+    'sqlite': ConnectionPool,
+    'sqlalchemy': SQLAlchemyPool
+}
+
+def create_pool(backend, db_path, **options):
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown storage backend {backend!r}; expected one of {", ".join(BACKENDS)}')
+    return BACKENDS[backend](db_path, **options)